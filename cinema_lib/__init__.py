@@ -3,11 +3,23 @@ Utility library for Cinema databases.
 
 The various submodules are:
     cinema.cl: command line utility for library functions
+    cinema.commands: registry of the image and computer vision commands
+    cinema.profile: stage-level profiling of row function commands
+    cinema.trace: Chrome traces of the stages of row function commands
+    cinema.progress: progress of long passes over the rows of databases
     cinema.spec: utilities for specifications
     cinema.spec.a: utilities for Spec A
     cinema.spec.d: utilities for Spec D
+    cinema.spec.d.table: NumPy columns of Spec D and row selection
+    cinema.spec.d.aggregate: group-by aggregation of Spec D columns
+    cinema.spec.d.stats: streaming statistics of Spec D columns
+    cinema.spec.d.nearest: nearest row queries over Spec D parameters
+    cinema.spec.d.merge: merging Spec D databases
+    cinema.spec.d.diff: comparing the rows of Spec D databases
+    cinema.spec.d.watch: adding columns to growing Spec D databases
     cinema.test: unit and regression testing
     cinema.image: utilities for processing image columns
+    cinema.bench: performance benchmarks
 """
 
 def version():
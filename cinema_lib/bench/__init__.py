@@ -0,0 +1,10 @@
+"""
+Performance benchmarks for cinema_lib.
+
+The various submodules are:
+    cinema_lib.bench.startup: start up time of the command line utility
+    cinema_lib.bench.nearest: nearest row queries against a linear scan
+    cinema_lib.bench.generate: synthetic Spec A and Spec D databases
+    cinema_lib.bench.suite: reading, checking, converting, and commands,
+        with JSON results that can be compared between versions
+"""
@@ -0,0 +1,219 @@
+"""
+Generate synthetic Cinema databases for benchmarks. The databases are
+deterministic for a seed, so benchmarks of different versions of
+cinema_lib read the same rows and images. Writing the images requires
+numpy and scikit-image.
+"""
+
+from ..spec import a
+from ..spec import d
+
+import os
+import json
+import random
+import itertools
+
+# the types of the columns, if they aren't given
+COLUMN_TYPES = (d.TYPE_INTEGER, d.TYPE_FLOAT, d.TYPE_STRING)
+
+# the characters of the string values, and the quoted string values
+STRING_CHARACTERS = "abcdefghijklmnopqrstuvwxyz"
+QUOTED_CHARACTERS = ",\""
+
+def column_names(types):
+    """
+    Return the names of generated columns, the first letter of the type
+    and the column number, i.e., "i0", "f1", and "s2".
+
+    arguments:
+        types : iterator of strings
+            the types of the columns, d.TYPE_INTEGER, d.TYPE_FLOAT, or
+            d.TYPE_STRING
+
+    returns:
+        a tuple of strings
+    """
+
+    return tuple([t[0].lower() + str(i) for i, t in enumerate(types)])
+
+def write_images(directory, n_images, image_shape=(64, 64), n_components=3,
+                 seed=0):
+    """
+    Write random images, "0.png", "1.png", ..., to a directory.
+
+    arguments:
+        directory : string
+            POSIX path to the directory, which is created if it doesn't
+            exist
+        n_images : integer
+            the number of images
+        image_shape : (integer, integer) = (64, 64)
+            the height and width of the images
+        n_components : integer = 3
+            the number of components of the pixels, or 1 for greyscale
+            images
+        seed : integer = 0
+            the seed of the pixels
+
+    returns:
+        a list of the file names of the images
+
+    side effects:
+        writes the images
+    """
+
+    import numpy as np
+    from skimage import io
+
+    os.makedirs(directory, exist_ok=True)
+    shape = tuple(image_shape) + ((n_components,) if n_components > 1
+                                  else ())
+    pixels = np.random.RandomState(seed)
+    names = []
+    for i in range(0, n_images):
+        name = str(i) + ".png"
+        io.imsave(os.path.join(directory, name),
+                  pixels.randint(0, 256, shape).astype(np.uint8))
+        names.append(name)
+    return names
+
+def generate_d(db_path, n_rows=1000, n_columns=4, types=None, quoted=0.0,
+               n_images=0, image_shape=(64, 64), n_components=3, seed=0):
+    """
+    Generate a Spec D database of random values, and optionally, a FILE
+    column of random images. The images are in the "images" directory of
+    the database, and row i has image i modulo the number of images.
+
+    arguments:
+        db_path : string
+            POSIX path to the new Cinema database, which must not exist
+        n_rows : integer = 1000
+            the number of rows
+        n_columns : integer = 4
+            the number of columns of values, not counting the FILE column
+        types : iterator of strings = None
+            the types of the columns of values, d.TYPE_INTEGER,
+            d.TYPE_FLOAT, or d.TYPE_STRING, or None to repeat COLUMN_TYPES
+        quoted : number = 0.0
+            the fraction of the string values that have a comma or a
+            double quote, and are quoted in the CSV
+        n_images : integer = 0
+            the number of images, or 0 for no FILE column
+        image_shape : (integer, integer) = (64, 64)
+            the height and width of the images
+        n_components : integer = 3
+            the number of components of the pixels, or 1 for greyscale
+        seed : integer = 0
+            the seed of the values and images
+
+    returns:
+        the header of the database, as a tuple of strings
+
+    raises:
+        ValueError if db_path exists, or a type is unknown
+
+    side effects:
+        creates the database
+    """
+
+    if types is None:
+        types = [COLUMN_TYPES[i % len(COLUMN_TYPES)]
+                 for i in range(0, n_columns)]
+    types = list(types)
+    for t in types:
+        if t not in COLUMN_TYPES:
+            raise ValueError("Unknown column type \"{0}\".".format(t))
+    if os.path.exists(db_path):
+        raise ValueError("\"{0}\" exists.".format(db_path))
+    os.makedirs(db_path)
+
+    header = column_names(types)
+    images = []
+    if n_images > 0:
+        header = header + (d.FILE_HEADER_KEYWORD,)
+        images = ["images/" + fn for fn in write_images(
+            os.path.join(db_path, "images"), n_images, image_shape,
+            n_components, seed)]
+
+    values = random.Random(seed)
+    def string():
+        # prefixed, so it is never a number, i.e., "nan" or "inf"
+        s = "s" + "".join([values.choice(STRING_CHARACTERS)
+                           for i in range(0, values.randint(0, 11))])
+        if quoted > 0 and values.random() < quoted:
+            i = values.randint(1, len(s))
+            s = s[:i] + values.choice(QUOTED_CHARACTERS) + s[i:]
+        return s
+    generators = {d.TYPE_INTEGER: lambda: values.randint(-1000000, 1000000),
+                  d.TYPE_FLOAT: lambda: round(values.gauss(0, 1000), 6),
+                  d.TYPE_STRING: string}
+    generators = [generators[t] for t in types]
+
+    def rows():
+        for i in range(0, n_rows):
+            row = [g() for g in generators]
+            if n_images > 0:
+                row.append(images[i % n_images])
+            yield row
+
+    with d.Writer(db_path, header) as w:
+        w.write_rows(rows())
+    return header
+
+def generate_a(db_path, shape=(10, 10), image_shape=(64, 64),
+               n_components=3, seed=0):
+    """
+    Generate a Spec A database of random images, with an argument per
+    dimension of the shape, "p0", "p1", ..., whose values are 0, 1, ...,
+    and an image per combination of the values. The name pattern is
+    "{p0}/.../{pn}.png".
+
+    arguments:
+        db_path : string
+            POSIX path to the new Cinema database, which must not exist
+        shape : tuple of integers = (10, 10)
+            the number of values of each argument
+        image_shape : (integer, integer) = (64, 64)
+            the height and width of the images
+        n_components : integer = 3
+            the number of components of the pixels, or 1 for greyscale
+        seed : integer = 0
+            the seed of the images
+
+    returns:
+        the number of images
+
+    raises:
+        ValueError if db_path exists
+
+    side effects:
+        creates the database
+    """
+
+    if os.path.exists(db_path):
+        raise ValueError("\"{0}\" exists.".format(db_path))
+    names = ["p" + str(i) for i in range(0, len(shape))]
+    info = {a.KEY_ARGUMENTS: {n: {a.KEY_ARG_DEFAULT: 0,
+                                  a.KEY_ARG_VALUES: list(range(0, s)),
+                                  a.KEY_ARG_TYPE: "range",
+                                  a.KEY_ARG_LABEL: n}
+                              for n, s in zip(names, shape)},
+            a.KEY_NAME_PATTERN: "/".join(["{" + n + "}" for n in names]) +
+                                ".png",
+            a.KEY_METADATA: {a.KEY_METADATA_TYPE: a.VALUE_METADATA_TYPE},
+            a.KEY_TYPE: a.VALUE_TYPE,
+            a.KEY_VERSION: a.VALUE_VERSION}
+
+    # the images are written flat, then moved into the name pattern
+    combinations = list(itertools.product(*[range(0, s) for s in shape]))
+    flat = os.path.join(db_path, "images")
+    for fn, values in zip(write_images(flat, len(combinations), image_shape,
+                                       n_components, seed), combinations):
+        path = os.path.join(db_path, *[str(v) for v in values]) + ".png"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(os.path.join(flat, fn), path)
+    os.rmdir(flat)
+
+    with open(os.path.join(db_path, a.SPEC_A_JSON_FILENAME), "w") as f:
+        json.dump(info, f, indent=2)
+    return len(combinations)
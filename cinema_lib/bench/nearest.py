@@ -0,0 +1,98 @@
+"""
+Benchmark nearest row queries (cinema_lib.spec.d.nearest) against a
+linear scan, on a synthetic table of parameters. Execute with
+"python -m cinema_lib.bench.nearest [ROWS]"
+"""
+
+from ..spec.d import nearest
+
+import numpy as np
+import sys
+import time
+import json
+
+def synthetic(n_rows, seed=0):
+    """
+    Return the columns of a synthetic table of parameters, a regular
+    theta and phi grid per time step, with some jitter.
+
+    arguments:
+        n_rows : integer
+            the approximate number of rows
+        seed : integer = 0
+            the seed of the jitter
+
+    returns:
+        a tuple of (tuple of column names, list of numpy arrays)
+    """
+
+    side = max(1, int(round((n_rows / 10.0) ** 0.5)))
+    theta, phi, t = np.meshgrid(np.linspace(0, 180, side),
+                                np.linspace(-180, 180, side),
+                                np.arange(0, 10), indexing="ij")
+    jitter = np.random.RandomState(seed)
+    return (("theta", "phi", "time"),
+            [theta.ravel() + jitter.uniform(-0.1, 0.1, theta.size),
+             phi.ravel() + jitter.uniform(-0.1, 0.1, phi.size),
+             t.ravel().astype(np.float64)])
+
+def linear_nearest(columns, low, scale, point):
+    # the nearest row by a linear scan, vectorized
+    dd = sum([((c - l) / s - (x - l) / s) ** 2
+              for c, l, s, x in zip(columns, low, scale, point)])
+    return int(np.argmin(dd))
+
+def benchmark(n_rows=1000000, n_queries=1000, k=10, seed=0):
+    """
+    Benchmark building an index, and nearest and k-nearest queries with
+    it, and nearest queries with a linear scan.
+
+    arguments:
+        n_rows : integer = 1000000
+            the approximate number of rows
+        n_queries : integer = 1000
+            the number of random queries
+        k : integer = 10
+            the number of rows of k-nearest queries
+        seed : integer = 0
+            the seed of the table and queries
+
+    returns:
+        a dictionary of the number of "rows", the "build" time in seconds,
+        the mean "nearest", "k_nearest", and "linear" query times in
+        seconds, and the number of "mismatches" between the nearest rows
+        of the index and the linear scan
+    """
+
+    names, columns = synthetic(n_rows, seed)
+    start = time.perf_counter()
+    index = nearest.Index(names, columns)
+    build = time.perf_counter() - start
+
+    random = np.random.RandomState(seed + 1)
+    queries = np.column_stack([random.uniform(c.min(), c.max(), n_queries)
+                               for c in columns]).tolist()
+
+    start = time.perf_counter()
+    found = [index.nearest(q)[0] for q in queries]
+    nearest_time = (time.perf_counter() - start) / n_queries
+
+    start = time.perf_counter()
+    for q in queries:
+        index.k_nearest(q, k)
+    k_nearest_time = (time.perf_counter() - start) / n_queries
+
+    # the linear scan is slow, so only time some of the queries
+    n_linear = min(n_queries, 20)
+    start = time.perf_counter()
+    linear = [linear_nearest(columns, index.low, index.scale, q)
+              for q in queries[:n_linear]]
+    linear_time = (time.perf_counter() - start) / n_linear
+
+    return {"rows": len(index), "build": build, "nearest": nearest_time,
+            "k_nearest": k_nearest_time, "linear": linear_time,
+            "mismatches": sum([f != l for f, l in zip(found, linear)])}
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print(json.dumps(benchmark(n_rows), indent=2, sort_keys=True))
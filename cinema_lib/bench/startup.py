@@ -0,0 +1,97 @@
+"""
+Benchmark the start up time of the command line utility. Execute with 
+"python -m cinema_lib.bench.startup [DB]"
+"""
+
+import subprocess
+import sys
+import time
+import json
+import os
+
+# arguments to benchmark, DB is replaced by the database path
+ARGUMENTS = (
+    ("--info", "-i", "-d", "DB"),
+    ("--test", "-t", "-q", "-d", "DB"),
+    )
+
+def time_command(arguments, repeat=10):
+    """
+    Time the command line utility, run in a new Python interpreter.
+
+    arguments:
+        arguments : tuple of strings
+            the command line arguments
+        repeat : integer = 10
+            the number of times to run the command
+
+    returns:
+        a dictionary with the "min", "mean", and "max" wall clock time in
+        seconds, and the number of "failures" (non-zero exit codes)
+    """
+
+    times = []
+    failures = 0
+    for i in range(0, repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-m", "cinema_lib.cl"] + list(arguments),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            failures = failures + 1
+    return {"min": min(times), "mean": sum(times) / len(times),
+            "max": max(times), "failures": failures}
+
+def imported_modules(arguments):
+    """
+    Return the modules imported by running the command line utility.
+
+    arguments:
+        arguments : tuple of strings
+            the command line arguments
+
+    returns:
+        a set of module names imported by the new Python interpreter 
+        running the command
+    """
+
+    program = ("import sys\n"
+               "from cinema_lib import cl\n"
+               "sys.argv = ['cl.py'] + sys.argv[1:]\n"
+               "try:\n"
+               "    cl.main()\n"
+               "except SystemExit:\n"
+               "    pass\n"
+               "sys.stderr.write('\\n'.join(sys.modules.keys()))\n")
+    result = subprocess.run([sys.executable, "-c", program] + list(arguments),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    return set(result.stderr.split("\n"))
+
+def benchmark(db_path, repeat=10):
+    """
+    Benchmark the start up time of the command line utility for each of
+    the ARGUMENTS.
+
+    arguments:
+        db_path : string
+            POSIX path to a Spec D database
+        repeat : integer = 10
+            the number of times to run each command
+
+    returns:
+        a dictionary of the name of the arguments to the timings from
+        time_command
+    """
+
+    results = {}
+    for arguments in ARGUMENTS:
+        results[arguments[0]] = time_command(
+            [db_path if i == "DB" else i for i in arguments[1:]], repeat)
+    return results
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else \
+              os.path.join("cinema_lib", "test", "data", "sphere.cdb")
+    print(json.dumps(benchmark(db_path), indent=2, sort_keys=True))
@@ -0,0 +1,366 @@
+"""
+Benchmark suite of reading, checking, and converting databases, and of
+the image and computer vision commands, on synthetic databases (see
+cinema_lib.bench.generate). The results are written as JSON, so the
+results of different versions of cinema_lib can be compared. Execute with
+"python -m cinema_lib.bench.suite [-o RESULTS] [-c BASELINE]"
+"""
+
+from .. import version
+from .. import commands
+from .. import spec
+from ..spec import d
+from . import generate
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import logging as log
+
+# the relative slow down of a benchmark that is a regression
+THRESHOLD = 0.1
+
+def time_function(function, repeat=3, setup=None):
+    """
+    Time a function.
+
+    arguments:
+        function : function()
+            the function to time
+        repeat : integer = 3
+            the number of times to run the function
+        setup : function() = None
+            a function that is run, but not timed, before each run
+
+    returns:
+        a dictionary with the "min", "mean", and "max" wall clock time in
+        seconds
+    """
+
+    times = []
+    for i in range(0, repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "mean": sum(times) / len(times),
+            "max": max(times)}
+
+def __result(timing, rows):
+    timing["rows"] = rows
+    timing["rows_per_second"] = rows / timing["min"] \
+                                if timing["min"] > 0 else None
+    return timing
+
+def __consume(iterator):
+    for row in iterator:
+        pass
+
+def benchmark_d(db_path, repeat=3):
+    """
+    Benchmark reading, checking, and converting a Spec D database to and
+    from SQLite.
+
+    arguments:
+        db_path : string
+            POSIX path to a Spec D database, i.e., from generate.generate_d
+        repeat : integer = 3
+            the number of times to run each benchmark
+
+    returns:
+        a dictionary of the name of the benchmark to the timings from
+        time_function, and the number of "rows" and "rows_per_second" of
+        the fastest time
+
+    side effects:
+        writes "sqlite.cdb" next to db_path
+    """
+
+    rows = sum([1 for row in d.get_iterator(db_path)]) - 1
+    results = {}
+    results["d.get_iterator"] = time_function(
+        lambda: __consume(d.get_iterator(db_path)), repeat)
+    results["d.check_database quick"] = time_function(
+        lambda: d.check_database(db_path, quick=True), repeat)
+    results["d.check_database"] = time_function(
+        lambda: d.check_database(db_path), repeat)
+    results["d.get_sqlite3"] = time_function(
+        lambda: d.get_sqlite3(db_path).close(), repeat)
+
+    connection = d.get_sqlite3(db_path)
+    table = os.path.splitext(os.path.basename(os.path.normpath(db_path)))[0]
+    out_path = os.path.join(os.path.dirname(os.path.normpath(db_path)),
+                            "sqlite.cdb")
+    def clean():
+        shutil.rmtree(out_path, ignore_errors=True)
+        os.makedirs(out_path)
+    try:
+        results["d.get_sqlite3_to_csv"] = time_function(
+            lambda: d.get_sqlite3_to_csv(connection, table, out_path),
+            repeat, clean)
+    finally:
+        connection.close()
+        shutil.rmtree(out_path, ignore_errors=True)
+
+    return {k: __result(v, rows) for k, v in results.items()}
+
+def benchmark_a(db_path, repeat=3):
+    """
+    Benchmark converting a Spec A database to Spec D.
+
+    arguments:
+        db_path : string
+            POSIX path to a Spec A database, i.e., from generate.generate_a
+        repeat : integer = 3
+            the number of times to run the benchmark
+
+    returns:
+        a dictionary of "spec.convert_a_to_d" to the timings (see
+        benchmark_d)
+
+    side effects:
+        writes and removes the Spec D CSV of db_path
+    """
+
+    csv_fn = os.path.join(db_path, d.SPEC_D_CSV_FILENAME)
+    def clean():
+        if os.path.exists(csv_fn):
+            os.remove(csv_fn)
+    try:
+        timing = time_function(lambda: spec.convert_a_to_d(db_path), repeat,
+                               clean)
+        rows = sum([1 for row in d.get_iterator(db_path)]) - 1
+    finally:
+        clean()
+    return {"spec.convert_a_to_d": __result(timing, rows)}
+
+class __ErrorCount(log.Handler):
+    # counts the errors that are logged
+    def __init__(self):
+        super().__init__(log.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+def benchmark_commands(db_path, repeat=3, selected=None):
+    """
+    Benchmark the row functions of the image and computer vision commands
+    on each row of a Spec D database of images. The commands that write
+    images write them into the database.
+
+    arguments:
+        db_path : string
+            POSIX path to a Spec D database with a FILE column of images,
+            i.e., from generate.generate_d
+        repeat : integer = 3
+            the number of times to run each benchmark
+        selected : iterator of commands.Command = None
+            the commands to benchmark, or the available commands if None
+
+    returns:
+        a dictionary of the flag of each command to the timings (see
+        benchmark_d). the commands that are unable to process the images,
+        or log errors processing them, are not included
+
+    side effects:
+        whatever the commands write to the database
+    """
+
+    rows = d.get_iterator(db_path)
+    header = next(rows)
+    rows = list(rows)
+    column_number = header.index(d.FILE_HEADER_KEYWORD)
+    if selected is None:
+        selected = commands.available()
+
+    results = {}
+    for command in selected:
+        columns = commands.get_columns(command, db_path, column_number,
+                                       command.label)
+        if columns is None:
+            log.error("Unable to benchmark \"{0}\".".format(command.flag))
+            continue
+        names, function = columns
+        def run():
+            for row in rows:
+                function(row)
+
+        # the row functions log the errors, and return fill values
+        errors = __ErrorCount()
+        log.getLogger().addHandler(errors)
+        try:
+            run()
+        finally:
+            log.getLogger().removeHandler(errors)
+        if errors.count > 0:
+            log.error("Unable to benchmark \"{0}\", there were {1} "
+                      "errors.".format(command.flag, errors.count))
+            continue
+        results[command.flag] = __result(time_function(run, repeat),
+                                         len(rows))
+    return results
+
+def benchmark(directory, repeat=3, n_rows=100000, n_columns=8, quoted=0.1,
+              shape=(20, 20), n_images=20, image_shape=(128, 128),
+              n_components=3, seed=0, selected=None):
+    """
+    Generate the synthetic databases and run all of the benchmarks.
+
+    arguments:
+        directory : string
+            POSIX path to an empty directory for the databases
+        repeat : integer = 3
+            the number of times to run each benchmark
+        n_rows : integer = 100000
+            the number of rows of the Spec D database
+        n_columns : integer = 8
+            the number of columns of the Spec D database
+        quoted : number = 0.1
+            the fraction of the string values that are quoted
+        shape : tuple of integers = (20, 20)
+            the number of values of each argument of the Spec A database
+        n_images : integer = 20
+            the number of images (rows) of the database of the commands,
+            or 0 to not benchmark the commands
+        image_shape : (integer, integer) = (128, 128)
+            the height and width of the images
+        n_components : integer = 3
+            the number of components of the pixels
+        seed : integer = 0
+            the seed of the databases
+        selected : iterator of commands.Command = None
+            the commands to benchmark, or the available commands if None
+
+    returns:
+        a dictionary of the cinema_lib "version", the "python" version,
+        the "parameters" of the databases, and the "results" of each
+        benchmark (see benchmark_d)
+
+    side effects:
+        writes the databases to directory
+    """
+
+    parameters = {"repeat": repeat, "rows": n_rows, "columns": n_columns,
+                  "quoted": quoted, "shape": list(shape),
+                  "images": n_images, "image_shape": list(image_shape),
+                  "components": n_components, "seed": seed}
+    results = {}
+
+    db_path = os.path.join(directory, "d.cdb")
+    generate.generate_d(db_path, n_rows, n_columns, quoted=quoted, seed=seed)
+    results.update(benchmark_d(db_path, repeat))
+
+    db_path = os.path.join(directory, "a.cdb")
+    generate.generate_a(db_path, shape, (8, 8), 1, seed)
+    results.update(benchmark_a(db_path, repeat))
+
+    if n_images > 0:
+        db_path = os.path.join(directory, "images.cdb")
+        generate.generate_d(db_path, n_images, 2, n_images=n_images,
+                            image_shape=image_shape,
+                            n_components=n_components, seed=seed)
+        results.update(benchmark_commands(db_path, repeat, selected))
+
+    return {"version": version(), "python": platform.python_version(),
+            "parameters": parameters, "results": results}
+
+def compare(baseline, results, threshold=THRESHOLD):
+    """
+    Compare benchmark results to the results of a baseline, i.e., another
+    version, by the fastest time of each benchmark.
+
+    arguments:
+        baseline : dictionary
+            the results of the baseline (see benchmark)
+        results : dictionary
+            the results to compare
+        threshold : number = THRESHOLD
+            the relative slow down that is a regression
+
+    returns:
+        a dictionary of the name of each benchmark in both results to a
+        dictionary of the "baseline" and "min" time, the "ratio" of the
+        times, and if it is a "regression"
+    """
+
+    comparison = {}
+    for name, result in sorted(results["results"].items()):
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["min"]
+        ratio = result["min"] / before if before > 0 else None
+        comparison[name] = {"baseline": before, "min": result["min"],
+                            "ratio": ratio,
+                            "regression": ratio is not None and
+                                          ratio > 1 + threshold}
+    return comparison
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark cinema_lib on synthetic databases.")
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="write the results as JSON to FILE")
+    parser.add_argument("-c", "--compare", metavar="FILE",
+                        help="compare the results to the JSON results in "
+                             "FILE, and exit with 1 if there is a "
+                             "regression")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="the relative slow down that is a regression "
+                             "(default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="the number of times to run each benchmark "
+                             "(default: %(default)s)")
+    parser.add_argument("--rows", type=int, default=100000,
+                        help="the number of rows of the Spec D database "
+                             "(default: %(default)s)")
+    parser.add_argument("--columns", type=int, default=8,
+                        help="the number of columns of the Spec D database "
+                             "(default: %(default)s)")
+    parser.add_argument("--quoted", type=float, default=0.1,
+                        help="the fraction of quoted string values "
+                             "(default: %(default)s)")
+    parser.add_argument("--images", type=int, default=20,
+                        help="the number of images of the commands, or 0 "
+                             "to skip them (default: %(default)s)")
+    parser.add_argument("--image-size", type=int, default=128,
+                        help="the width and height of the images "
+                             "(default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="the seed of the databases "
+                             "(default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    try:
+        results = benchmark(directory, args.repeat, args.rows, args.columns,
+                            args.quoted, n_images=args.images,
+                            image_shape=(args.image_size, args.image_size),
+                            seed=args.seed)
+    finally:
+        shutil.rmtree(directory)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare is None:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return 0
+
+    with open(args.compare, "r") as f:
+        baseline = json.load(f)
+    comparison = compare(baseline, results, args.threshold)
+    for name, c in comparison.items():
+        print("{0:<32}{1:>12.6f}{2:>12.6f}{3:>8.2f}{4}".format(name,
+              c["baseline"], c["min"], c["ratio"] or 0,
+              "  REGRESSION" if c["regression"] else ""))
+    return 1 if any([c["regression"] for c in comparison.values()]) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -45,6 +45,28 @@ class ERROR_CODES:
   NO_INPUT_DATABASE_FOR_CV_COMMAND = 34
   CONVERSION_FROM_SQLITE_TO_D_FAILED = 35
   NO_OUTPUT_DATABASE_FOR_SQLITE_TO_D_CONVERSION = 36
+  IMAGE_DESCRIBE_FAILED = 37
+  LABEL_WITH_MULTIPLE_COMMANDS = 38
+  MULTIPLE_COMMANDS_FAILED = 39
+  COMPACTION_FAILED = 40
+  NO_INPUT_DATABASE_FOR_COMPACTION = 41
+  INVALID_SELECTOR = 42
+  SPEC_D_EXISTS_IN_SPEC_A = 43
+  SIDECAR_WITH_SPEC_A = 44
+  CONVERSION_FROM_D_TO_A_FAILED = 45
+  NO_INPUT_DATABASE_FOR_D_TO_A_CONVERSION = 46
+  INVALID_WHERE = 47
+  AGGREGATION_FAILED = 48
+  NO_INPUT_DATABASE_FOR_AGGREGATION = 49
+  COLUMN_STATS_FAILED = 50
+  NO_INPUT_DATABASE_FOR_COLUMN_STATS = 51
+  BATCH_FAILED = 52
+  NO_DATABASES_FOR_BATCH = 53
+  INPUT_DATABASE_WITH_BATCH = 54
+  MERGE_FAILED = 55
+  DIFF_FAILED = 56
+  DATABASES_DIFFER = 57
+  WATCH_FAILED = 58
 
 # if the user provides a new label, override the default
 def relabel(default, user, is_file=False):
@@ -69,15 +91,99 @@ def check_n(header, n):
         log.error("N ({0}) is not a FILE column.".format(n))
         exit(ERROR_CODES.N_IS_NOT_A_FILE_COLUMN)
 
-def main():
+def __batch_run(arguments):
+    # run the command line utility on one database of a batch, in a worker
+    # process, returning (database, exit code, seconds, start, process id)
+    import time
+    import os
+
+    argv, db_path = arguments
+    is_d = os.path.isfile(os.path.join(db_path, d.SPEC_D_CSV_FILENAME))
+    start = time.perf_counter()
+    try:
+        main(argv + ["-d" if is_d else "-a", db_path])
+        code = 0
+    except SystemExit as e:
+        code = 0 if e.code is None else e.code
+    except Exception as e:
+        log.error("Unexpected error for \"{0}\": {1}".format(db_path, e))
+        code = ERROR_CODES.BATCH_FAILED
+    return (db_path, code, time.perf_counter() - start, start, os.getpid())
+
+def run_batch(databases, argv, jobs=None, trace=None):
+    """
+    Run the command line utility on each of a list of databases, in a
+    process pool. A database is given as the Spec D database (-d) if it
+    has a Spec D CSV, otherwise as the Spec A database (-a).
+
+    arguments:
+        databases : iterator of strings
+            POSIX paths to the Cinema databases
+        argv : list of strings
+            the command line arguments, without the input database
+        jobs : integer = None
+            the number of processes, or the number of CPUs if None. if it
+            is 1, the databases are run in this process
+        trace : cinema_lib.trace.Trace = None
+            if not None, a span is recorded for each database, in the
+            process that ran it
+
+    returns:
+        a list of (database, exit code, seconds) tuples, in the order of
+        the databases
+    """
+
+    work = [(list(argv), db_path) for db_path in databases]
+    if jobs == 1 or len(work) <= 1:
+        results = [__batch_run(w) for w in work]
+    else:
+        import multiprocessing
+
+        with multiprocessing.Pool(jobs) as pool:
+            results = pool.map(__batch_run, work, chunksize=1)
+
+    if trace is not None:
+        for db_path, code, seconds, start, pid in results:
+            trace.span(db_path, start, seconds, pid)
+    return [r[:3] for r in results]
+
+def __write_trace(t, path):
+    # write a trace, logging an error if it can't be written
+    try:
+        t.write(path)
+    except OSError as e:
+        log.error("Unable to write \"{0}\": {1}.".format(path, e))
+
+def main(argv=None):
+    """
+    Run the command line utility.
+
+    arguments:
+        argv : list of strings = None
+            the command line arguments, or sys.argv[1:] if None
+
+    side effects:
+        exits with 0, or one of the ERROR_CODES
+    """
+
     from . import spec
     from .spec import a
+    from .spec.d import aggregate
+    from .spec.d import stats
+    from .spec.d import watch
+    from . import profile
+    from . import trace
+    from . import progress
     from . import version
-    from . import change
+    from . import commands
     import argparse
     import configparser
     import textwrap
     import os
+    import itertools
+    import json
+    import sys
+    import contextlib
 
     CL_VERSION = version()
 
@@ -86,21 +192,32 @@ def main():
         add_help=False
         )
 
-    args, remaining_argv = conf_parser.parse_known_args()
+    conf_parser.add_argument("--batch", metavar="GLOB", type=str,
+            help="INPUT: run the VALIDATE and COMMAND arguments on every database matching the quoted pattern GLOB (i.e., 'runs/*.cdb') in a process pool, instead of -a or -d. a database is used as -d if it has a {0}, otherwise as -a. reports the result and time per database, and exits with 0 if all succeeded, the error code if all failures have the same one, or {1}".format(d.SPEC_D_CSV_FILENAME, ERROR_CODES.BATCH_FAILED))
+    conf_parser.add_argument("--jobs", metavar="N", type=int,
+            help="FLAG: the number of processes for --batch (default: the number of CPUs)")
+    conf_parser.add_argument("--trace", metavar="FILE", type=str,
+            help="FLAG: write a Chrome trace (JSON) to FILE of the stages of image and computer vision COMMANDs (parsing the CSV, decoding images, computing, encoding images, and writing the CSV) per process and thread, or of each database of --batch per worker process, to open in chrome://tracing or Perfetto. the most recent {0} spans are kept".format(trace.CAPACITY))
+
+    args, remaining_argv = conf_parser.parse_known_args(argv)
+    batch, jobs, trace_path = args.batch, args.jobs, args.trace
 
     epilog_text = textwrap.dedent(
 """
 - Column numbers, N, are 0-indexed, i.e., 0, 1, 2, etc.
-- Only one COMMAND can be run at a time.
+- Only one COMMAND can be run at a time, except for image and computer 
+  vision COMMANDs, which can be combined and are computed in one pass over
+  the database. --label can only be used with one COMMAND.
 - VALIDATE and FLAG can be run in conjunction with COMMAND or independently.\n\n
 """)
 
-    # try image
-    image_ok = False
-    try:
-        from . import image
-        image_ok = True
+    # check which command groups are installed, without importing them
+    missing = {g: commands.missing_requirements(g) for g in
+               (commands.GROUP_IMAGE, commands.GROUP_CV)}
+    image_ok = len(missing[commands.GROUP_IMAGE]) == 0
+    cv_ok = len(missing[commands.GROUP_CV]) == 0
 
+    if image_ok:
         epilog_text += textwrap.dedent(
 """
 - Image functions require that the input database is Spec D. The database 
@@ -113,43 +230,28 @@ def main():
   returning the result per component, except for --image-unique and 
   --image-joint.\n\n
 """)
-    except Exception as e:
+    else:
         epilog_text += textwrap.dedent(
         """
         Image functionality unavailable. scikit-image and numpy required: 
-        """ + str(e) + "\n\n")
+        """ + "missing " + ", ".join(missing[commands.GROUP_IMAGE]) + "\n\n")
 
-    # try cv
-    cv_ok = False
-    try:
-        from . import cv
-        cv_ok = True
+    if cv_ok:
         epilog_text += textwrap.dedent(
 """
 - Computer vision functions require that the input database is Spec D. The 
   database (data.csv) will be backed up prior to running the command. Backup 
   files can be found in the database directory as "data_csv.<timestamp>.<md5 
   hash>".
+- Computer vision contrib commands (--cv-sift-draw, --cv-surf-draw) require
+  opencv-contrib-python.
 """)
-    except Exception as e:
+    else:
         epilog_text += textwrap.dedent(
         """
         Computer vision functionality unavailable. opencv-python and numpy 
         required: 
-        """ + str(e) + "\n\n")
-
-    # try cv contrib
-    cv_contrib_ok = False
-    if cv_ok:
-        try:
-            from .cv import contrib
-            cv_contrib_ok = True
-        except Exception as e:
-            epilog_text += textwrap.dedent(
-            """
-            Computer vision contrib extras unavailable. opencv-contrib-python 
-            and numpy required: 
-            """ + str(e) + "\n\n")
+        """ + "missing " + ", ".join(missing[commands.GROUP_CV]) + "\n\n")
 
     # examples
     epilog_text += textwrap.dedent(
@@ -162,7 +264,30 @@ $ cinema -i -d cinema_lib/test/data/sphere.cdb
 $ cinema -itvq -d cinema_lib/test/data/sphere.cdb
     quickly validate a Spec D database and report the header, verbosely
 $ cinema -t --a2d -a cinema_lib/test/data/sphere.cdb
-    validate a Spec A database and convert it to a Spec D database\n\n
+    validate a Spec A database and convert it to a Spec D database
+$ cinema --a2d -a cinema_lib/test/data/sphere.cdb --select phi=-180:0
+    convert the rows of a Spec A database where phi is from -180 to 0 to a
+    Spec D database
+$ cinema --d2a -d cinema_lib/test/data/sphere.cdb
+    convert a Spec D database that is a regular parameter grid to a Spec A
+    database
+$ cinema -d db.cdb --groupby time --agg "image shannon entropy:mean"
+    calculate the mean image entropy per time step, writing a new Spec D CSV
+    to db.cdb/aggregate.csv
+$ cinema -d db.cdb --groupby phi --agg "image canny count:max" -o max.csv
+    calculate the max Canny edge count per camera angle, writing ./max.csv
+$ cinema -d db.cdb --column-stats --processes 4
+    report the count, nulls, min, max, mean, variance, and approximate
+    quantiles of every column as JSON, reading the CSV with 4 processes
+$ cinema --merge all.cdb run_0.cdb run_1.cdb --sort-by time
+    merge two Spec D databases sorted by time into a new one, sorted by time,
+    hard linking their files into all.cdb/run_0 and all.cdb/run_1
+$ cinema --diff old.cdb new.cdb --key theta,phi --compare-files
+    report the rows added, removed, and changed by a re-run as JSON, matching
+    rows by theta and phi, and comparing the contents of FILE columns
+$ cinema --batch 'runs/*.cdb' -t -q --jobs 8
+    quickly validate every database in runs, 8 databases at a time, reporting
+    the result of each\n\n
 """)
 
     if image_ok:
@@ -174,6 +299,19 @@ $ cinema -d cinema_lib/test/data/sphere.cdb --image-grey 2
 $ cinema -d cinema_lib/test/data/sphere.cdb --image-mean 2 --label average
     calculate the average color per component in images, naming the column
     "average"
+$ cinema -d cinema_lib/test/data/sphere.cdb --image-mean 2 --where "phi >= 0"
+    calculate the average color per component in the images of the rows
+    where phi is 0 or greater, leaving the column empty in the other rows
+$ cinema -a spec_a.cdb --image-mean 2 --select phi=0:90
+    calculate the average color per component in the images of a Spec A
+    database where phi is from 0 to 90, writing a new Spec D CSV with the
+    rows and the new columns, without converting it first (--a2d)
+$ cinema -d cinema_lib/test/data/sphere.cdb --image-grey 2 --profile
+    convert RGB images to greyscale images, and report the time spent
+    parsing the CSV, decoding, computing, encoding, and writing the CSV
+$ cinema -d cinema_lib/test/data/sphere.cdb --image-mean 2 --trace mean.json
+    calculate the average color per component in images, and write a trace
+    of the stages of each row to open in chrome://tracing or Perfetto
 """)
 
     if cv_ok:
@@ -184,6 +322,32 @@ $ cinema -d cinema_lib/test/data/sphere.cdb --cv-gaussian-blur 2
     convert apply a Gaussian blur to images
 $ cinema -d cinema_lib/test/data/sphere.cdb --cv-fast-draw 2 --label FAST
     draw locations of FAST features in images, naming the column "FILE FAST"
+$ cinema -d cinema_lib/test/data/sphere.cdb --cv-canny 2 --checkpoint 1000
+    apply the Canny edge detector to images, journaling every 1000 rows, so
+    running it again after an interruption resumes where it stopped
+""")
+
+    if image_ok:
+        epilog_text += textwrap.dedent(
+"""
+Sidecar examples:
+$ cinema -d cinema_lib/test/data/sphere.cdb --image-mean 2 --sidecar
+    calculate the average color per component in images, storing the columns
+    next to the CSV instead of rewriting it
+$ cinema -d cinema_lib/test/data/sphere.cdb --compact
+    fold the sidecar columns into the CSV
+$ cinema -d running.cdb --image-entropy 2 --watch --watch-idle 600
+    calculate the image entropy of the rows as a simulation appends them,
+    until no rows are added for 10 minutes
+""")
+
+    if image_ok and cv_ok:
+        epilog_text += textwrap.dedent(
+"""
+Combined examples:
+$ cinema -d cinema_lib/test/data/sphere.cdb --image-mean 2 --cv-canny 2
+    calculate the average color and apply the Canny edge detector to images,
+    reading and writing the database once
 """)
 
     # Don't surpress add_help here so it will handle -h
@@ -202,10 +366,37 @@ $ cinema -d cinema_lib/test/data/sphere.cdb --cv-fast-draw 2 --label FAST
             help="FLAG: report verbosely")
     parser.add_argument("-q", "--quick", action="store_true", default=False,
             help="FLAG: do not validate row data, if validating (--test)")
+    parser.add_argument("--progress", dest="progress", action="store_const",
+            const=True, default=None,
+            help="FLAG: report the progress of passes over the rows (validating, COMMANDs, and conversions) to standard error, with the rows per second, bytes per second, and the estimated time remaining (default: if standard error is a terminal)")
+    parser.add_argument("--no-progress", dest="progress",
+            action="store_const", const=False,
+            help="FLAG: do not report progress")
     parser.add_argument("-a", "--astaire", metavar="DB", type=str,
             help="INPUT: specify an input Spec A database")
     parser.add_argument("-d", "--dietrich", metavar="DB", type=str,
             help="INPUT: specify an input Spec D database")
+    parser.add_argument("--select", metavar="ARG=VALUES", type=str,
+            action="append", default=[],
+            help="INPUT: only use the rows of a Spec A database where argument ARG has one of the comma separated VALUES (i.e., phi=0,90) or is in the closed range LOW:HIGH (i.e., phi=-180:0, or phi=90: for no upper bound). can be given more than once")
+    parser.add_argument("--where", metavar="EXPR", type=str,
+            help="INPUT: only use the rows of a Spec D database where the expression EXPR is true, for image and computer vision COMMANDs (the new columns are empty in the other rows) and --d2s, i.e., \"theta >= 30 and phi == -180\". EXPR can use column names (quoted with backticks if they are not identifiers, i.e., `image mean 0`), numbers, strings, comparisons, in, arithmetic, and, or, and not. requires numpy")
+    parser.add_argument("--sidecar", action="store_true", default=False,
+            help="FLAG: write new columns from image and computer vision COMMANDs to a sidecar column store in the database, instead of rewriting the CSV. use --compact to fold them into the CSV")
+    parser.add_argument("--checkpoint", metavar="N", type=int,
+            default=d.CHECKPOINT_ROWS,
+            help="FLAG: journal the results of image and computer vision COMMANDs every N rows, so an interrupted COMMAND resumes where it stopped when it is run again. 0 disables the journal (default: {0})".format(d.CHECKPOINT_ROWS))
+    parser.add_argument("--watch", action="store_true", default=False,
+            help="FLAG: add the columns of image and computer vision COMMANDs to the rows of a Spec D database as they are appended to its CSV, i.e., by a running simulation, storing them as sidecar columns. the progress is saved every --checkpoint rows, so it resumes where it stopped when it is run again")
+    parser.add_argument("--watch-interval", metavar="SECONDS", type=float,
+            default=1.0,
+            help="FLAG: the maximum time between checks for new rows, for --watch (default: 1). uses inotify if inotify_simple is installed")
+    parser.add_argument("--watch-idle", metavar="SECONDS", type=float,
+            help="FLAG: stop watching after no new rows for SECONDS, for --watch (default: never, until interrupted)")
+    parser.add_argument("--profile", action="store_true", default=False,
+            help="FLAG: time the stages of image and computer vision COMMANDs per row (parsing the CSV, decoding images, computing, encoding images, and writing the CSV), and report the total, mean, percentile ({0}), and maximum times of each stage, and the rows per second".format(", ".join([str(p) for p in profile.PERCENTILES])))
+    parser.add_argument("--profile-json", metavar="FILE", type=str,
+            help="FLAG: write the --profile report as JSON to FILE (implies --profile)")
     parser.add_argument("-l", "--label", metavar="STR", type=str,
             help="INPUT: specify a header (label) for new output columns, otherwise a default label is generated. if the column(s) are output files, FILE will be automatically prepended to the supplied label.")
     parser.add_argument("-t", "--test", action="store_true", default=False,
@@ -215,67 +406,41 @@ $ cinema -d cinema_lib/test/data/sphere.cdb --cv-fast-draw 2 --label FAST
     parser.add_argument("--a2d", "--astairetodietrich", action="store_true",
         default=False,
         help="COMMAND: convert a Spec D database to a Spec A database, in place")
+    parser.add_argument("--d2a", "--dietrichtoastaire", action="store_true",
+        default=False,
+        help="COMMAND: convert a Spec D database to a Spec A database, in place, if it is a regular parameter grid (every combination of the non-FILE column values is a row, and the single FILE column can be derived from them). reports why not, if it is not")
     parser.add_argument("--d2s", "--dietrichtosqlite", action="store_true", 
         default=False,
         help="COMMAND: create a SQLite3 database from a Spec D database, to ./<database_name>.sqlite")
+    parser.add_argument("--compact", action="store_true", default=False,
+        help="COMMAND: fold the sidecar columns of a Spec D database into its CSV, in place")
+    parser.add_argument("--agg", "--aggregate", metavar="AGGS", type=str,
+        help="COMMAND: aggregate the columns of a Spec D database per group (--groupby), writing a new Spec D CSV (--output). AGGS is a comma separated list of COLUMN:AGGREGATION, i.e., \"image mean 0:mean,image canny count:max\", where AGGREGATION is one of {0}. null values are skipped".format(", ".join(sorted(aggregate.AGGREGATIONS))))
+    parser.add_argument("--groupby", metavar="COLS", type=str, default="",
+        help="INPUT: the comma separated names of the columns to group the rows by, for --agg (default: one group of all of the rows)")
+    parser.add_argument("--merge", metavar="DB", type=str, nargs="+",
+        help="COMMAND: merge Spec D databases (the second and following DB) with the same columns into a new Spec D database (the first DB), streaming the rows. the files of FILE columns are hard linked into a directory per database in the new database")
+    parser.add_argument("--sort-by", metavar="COLS", type=str,
+        help="INPUT: the comma separated names of the columns that the databases are sorted by, for --merge, to merge the rows in that order (default: concatenate the rows)")
+    parser.add_argument("--diff", metavar="DB", type=str, nargs=2,
+        help="COMMAND: compare the rows of two Spec D databases, matched by the --key columns, reporting the added, removed, and changed rows, and the number of changes per column, as JSON to standard output or --output. exits with {0} if they differ".format(ERROR_CODES.DATABASES_DIFFER))
+    parser.add_argument("--key", metavar="COLS", type=str,
+        help="INPUT: the comma separated names of the columns that identify a row, for --diff")
+    parser.add_argument("--compare-files", action="store_true", default=False,
+        help="FLAG: compare the files of FILE columns by size and hash, instead of their paths, for --diff")
+    parser.add_argument("--column-stats", action="store_true", default=False,
+        help="COMMAND: report the type, count, nulls, min, max, mean, variance, and approximate quantiles ({0}) of every column of a Spec D database as JSON, to standard output or --output, in one pass over the rows".format(", ".join([str(q) for q in stats.QUANTILES])))
+    parser.add_argument("-o", "--output", metavar="FILE", type=str,
+        help="INPUT: the path of the output, for --agg (a new Spec D CSV, default: aggregate.csv in the database), and --column-stats and --diff (JSON, default: standard output)")
+    parser.add_argument("--processes", metavar="N", type=int, default=1,
+        help="FLAG: the number of processes to read chunks of the CSV in parallel, for --agg and --column-stats (default: 1)")
     parser.add_argument("--s2d", "--sqlitetodietrich", metavar="DB", type=str, 
         default=False,
         help='COMMAND: create a a Spec D database CSV from a SQLite database. If there is only one table, it converts that table, otherwise it converts a table or view named "cinema".')
 
-    # add image tools
-    if image_ok:
-        parser.add_argument("--image-grey", metavar="N", type=int,
-                help="COMMAND: convert and write image data to greyscale PNG in column number N, using scikit-image color.rgb2grey. new files are named \"<old_base_filename>_image_grey.png\"")
-        parser.add_argument("--image-mean", metavar="N", type=int,
-                help="COMMAND: add image mean data calculated from images in column number N")
-        parser.add_argument("--image-stddev", metavar="N", type=int,
-                help="COMMAND: add image standard deviation data calculated from images in column number N")
-        parser.add_argument("--image-unique", metavar="N", type=int,
-                help="COMMAND: add unique pixel count data calculated from images in column number N")
-        parser.add_argument("--image-entropy", metavar="N", type=int,
-                help="COMMAND: add image Shannon entropy data calculated from images in column number N, using a histogram with 131072 bins")
-        parser.add_argument("--image-joint", metavar="N", type=int,
-                help="COMMAND: add the joint entropy (multi-dimensional Shannon entropy) data calculated from images in column number N, using 1024 discretization levels per dimension")
-        parser.add_argument("--image-canny", metavar="N", type=int,
-                help="COMMAND: add Canny edge pixel count data calculated from images in column number N")
-        parser.add_argument("--image-firstq", metavar="N", type=int,
-                help="COMMAND: add the first quartile data calculated from images in column number N")
-        parser.add_argument("--image-secondq", metavar="N", type=int,
-                help="COMMAND: add the second quartile data calculated from images in column number N")
-        parser.add_argument("--image-thirdq", metavar="N", type=int,
-                help="COMMAND: add the third quartile data calculated from images in column number N")
-        parser.add_argument("--image-90th", metavar="N", type=int,
-                help="command: add the 90th percentile data calculated from images in column number N")
-        parser.add_argument("--image-95th", metavar="N", type=int,
-                help="command: add the 95th percentile data calculated from images in column number N")
-        parser.add_argument("--image-99th", metavar="N", type=int,
-                help="command: add the 99th percentile data calculated from images in column number N")
-
-    # add cv2 tools
-    if cv_ok:
-        parser.add_argument("--cv-grey", metavar="N", type=int,
-                help="COMMAND: convert and write image data to greyscale PNG in column number N, using OpenCV cvtColor. new files are named \"<old_base_filename>_cv_grey.png\"")
-        parser.add_argument("--cv-box-blur", metavar="N", type=int,
-                help="COMMAND: apply box blur to image data in column number N. new files are named \"<old_base_filename>_cv_box_blur.png\"")
-        parser.add_argument("--cv-gaussian-blur", metavar="N", type=int,
-                help="COMMAND: apply Gaussian blur to image data in column number N. new files are named \"<old_base_filename>_cv_gaussian_blur.png\"")
-        parser.add_argument("--cv-median-blur", metavar="N", type=int,
-                help="COMMAND: apply median blur to image data in column number N. new files are named \"<old_base_filename>_cv_median_blur.png\"")
-        parser.add_argument("--cv-bilateral-filter", metavar="N", type=int,
-                help="COMMAND: apply bilateral filter to image data in column number N. new files are named \"<old_base_filename>_cv_bilateral_filter.png\"")
-        parser.add_argument("--cv-canny", metavar="N", type=int,
-                help="COMMAND: apply Canny edge detector to image data in column number N. new files are named \"<old_base_filename>_cv_canny.png\"")
-        parser.add_argument("--cv-contour-threshold", metavar="N", type=int,
-                help="COMMAND: draw contours around image thresholds on image data in column number N. new files are named \"<old_base_filename>_cv_contour_threshold.png\"")
-        parser.add_argument("--cv-fast-draw", metavar="N", type=int,
-                help="COMMAND: draw FAST features on image data in column number N. new files are named \"<old_base_filename>_cv_fast_draw.png\"")
-
-    # add cv2 contrib tools
-    if cv_contrib_ok:
-        parser.add_argument("--cv-sift-draw", metavar="N", type=int,
-                help="COMMAND: draw SIFT features on image data in column number N. new files are named \"<old_base_filename>_cv_sift_draw.png\"")
-        parser.add_argument("--cv-surf-draw", metavar="N", type=int,
-                help="COMMAND: draw SURF features on image data in column number N. new files are named \"<old_base_filename>_cv_surf_draw.png\"")
+    # add image and cv2 tools
+    for c in commands.available():
+        parser.add_argument(c.flag, metavar="N", type=int, help=c.help)
 
     # parse the rest of the args
     args = parser.parse_args(remaining_argv)
@@ -288,6 +453,75 @@ $ cinema -d cinema_lib/test/data/sphere.cdb --cv-fast-draw 2 --label FAST
     else:
         log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', 
                         level=log.WARNING, datefmt='%I:%M:%S')
+    progress.set_enabled(args.progress)
+
+    # run on many databases
+    if batch is not None:
+        import glob
+        import time
+
+        if args.dietrich is not None or args.astaire is not None:
+            log.error("--batch can not be used with -a or -d.")
+            exit(ERROR_CODES.INPUT_DATABASE_WITH_BATCH)
+        databases = sorted([p for p in glob.glob(batch) if os.path.isdir(p)])
+        if len(databases) == 0:
+            log.error("No databases match \"{0}\".".format(batch))
+            exit(ERROR_CODES.NO_DATABASES_FOR_BATCH)
+
+        names = {v: k for k, v in vars(ERROR_CODES).items() if k.isupper()}
+        t = trace.Trace() if trace_path is not None else None
+        start = time.perf_counter()
+        # the workers of a pool don't share the terminal
+        batch_argv = remaining_argv
+        if args.progress is None and jobs != 1 and len(databases) > 1:
+            batch_argv = batch_argv + ["--no-progress"]
+        results = run_batch(databases, batch_argv, jobs, t)
+        elapsed = time.perf_counter() - start
+        if t is not None:
+            __write_trace(t, trace_path)
+        for db_path, code, seconds in results:
+            if code == 0:
+                print("OK {0:.2f}s {1}".format(seconds, db_path))
+            else:
+                print("FAILED {0} ({1}) {2:.2f}s {3}".format(code,
+                    names.get(code, "UNKNOWN"), seconds, db_path))
+        codes = set([code for db_path, code, seconds in results if code != 0])
+        print("{0} databases, {1} succeeded, {2} failed, {3:.2f}s "
+              "({4:.2f}s total per database)".format(len(results),
+              sum([1 for r in results if r[1] == 0]),
+              sum([1 for r in results if r[1] != 0]), elapsed,
+              sum([r[2] for r in results])))
+        if len(codes) == 0:
+            exit(0)
+        elif len(codes) == 1:
+            exit(codes.pop())
+        exit(ERROR_CODES.BATCH_FAILED)
+
+    # parse the Spec A selectors
+    filters = []
+    for selector in args.select:
+        try:
+            filters.append(a.parse_selector(selector))
+        except ValueError as e:
+            log.error("Invalid --select: {0}".format(e))
+            exit(ERROR_CODES.INVALID_SELECTOR)
+
+    # select the Spec D rows
+    mask = None
+    if args.where is not None:
+        if args.dietrich is None:
+            log.error("--where needs a Spec D database (use --select for Spec A).")
+            exit(ERROR_CODES.INVALID_WHERE)
+        try:
+            from .spec.d import table
+            mask = table.where(args.dietrich, args.where)
+        except (ImportError, ValueError) as e:
+            log.error("Invalid --where: {0}".format(e))
+            exit(ERROR_CODES.INVALID_WHERE)
+        if mask is None:
+            log.error("Unable to open database.")
+            exit(ERROR_CODES.SPEC_D_VALIDATION_FAILED)
+        log.info("Selected {0} of {1} rows.".format(mask.sum(), len(mask)))
 
     # validate databases
     command = False
@@ -336,7 +570,7 @@ $ cinema -d cinema_lib/test/data/sphere.cdb --cv-fast-draw 2 --label FAST
     # convert A to D
     if args.a2d and not command:
         if args.astaire is not None:
-            if not spec.convert_a_to_d(args.astaire):
+            if not spec.convert_a_to_d(args.astaire, filters):
                 exit(ERROR_CODES.CONVERSION_FROM_A_TO_D_FAILED)
             else:
                 command = True
@@ -348,13 +582,137 @@ $ cinema -d cinema_lib/test/data/sphere.cdb --cv-fast-draw 2 --label FAST
 #           log.error("Input database not specified for A to D conversion.")
 #           exit(ERROR_CODES.NO_INPUT_DATABASE_FOR_A_TO_D_CONVERSION)
     
+    # convert D to A
+    if args.d2a and not command:
+        if args.dietrich is not None:
+            if not spec.convert_d_to_a(args.dietrich):
+                exit(ERROR_CODES.CONVERSION_FROM_D_TO_A_FAILED)
+            else:
+                command = True
+        else:
+            log.error("Input database not specified for D to A conversion.")
+            exit(ERROR_CODES.NO_INPUT_DATABASE_FOR_D_TO_A_CONVERSION)
+
+    # compact sidecar columns
+    if args.compact and not command:
+        if args.dietrich is not None:
+            try:
+                if d.compact(args.dietrich) is None:
+                    log.info("No sidecar columns to compact.")
+            except Exception as e:
+                log.error("Unable to compact database: {0}.".format(e))
+                exit(ERROR_CODES.COMPACTION_FAILED)
+            command = True
+        else:
+            log.error("Input database not specified for compaction.")
+            exit(ERROR_CODES.NO_INPUT_DATABASE_FOR_COMPACTION)
+
+    # aggregate groups
+    if args.agg is not None and not command:
+        if args.dietrich is not None:
+            groupby = tuple([c.strip() for c in args.groupby.split(",")
+                             if len(c.strip()) > 0])
+            output = args.output
+            if output is None:
+                output = os.path.join(args.dietrich, "aggregate.csv")
+            try:
+                n = aggregate.write_aggregate(args.dietrich, groupby,
+                        aggregate.parse_aggregations(args.agg), output,
+                        processes=args.processes)
+            except ValueError as e:
+                log.error("Unable to aggregate database: {0}".format(e))
+                exit(ERROR_CODES.AGGREGATION_FAILED)
+            if n is None:
+                log.error("Unable to read database \"{0}\".".format(
+                    args.dietrich))
+                exit(ERROR_CODES.AGGREGATION_FAILED)
+            log.info("Wrote {0} groups to \"{1}\".".format(n, output))
+            command = True
+        else:
+            log.error("Input database not specified for aggregation.")
+            exit(ERROR_CODES.NO_INPUT_DATABASE_FOR_AGGREGATION)
+
+    # merge databases
+    if args.merge is not None and not command:
+        from .spec.d import merge
+
+        if len(args.merge) < 2:
+            log.error("--merge needs a new database and the databases to merge.")
+            exit(ERROR_CODES.MERGE_FAILED)
+        sort_columns = None
+        if args.sort_by is not None:
+            sort_columns = tuple([c.strip() for c in args.sort_by.split(",")
+                                  if len(c.strip()) > 0])
+        try:
+            n = merge.merge(args.merge[0], args.merge[1:], sort_columns)
+        except (ValueError, OSError) as e:
+            log.error("Unable to merge databases: {0}".format(e))
+            exit(ERROR_CODES.MERGE_FAILED)
+        log.info("Merged {0} rows into \"{1}\".".format(n, args.merge[0]))
+        command = True
+
+    # compare databases
+    if args.diff is not None and not command:
+        from .spec.d import diff
+
+        if args.key is None:
+            log.error("--diff needs the --key columns.")
+            exit(ERROR_CODES.DIFF_FAILED)
+        key_columns = tuple([c.strip() for c in args.key.split(",")
+                             if len(c.strip()) > 0])
+        try:
+            result = diff.diff(args.diff[0], args.diff[1], key_columns,
+                               compare_files=args.compare_files)
+        except (ValueError, OSError) as e:
+            log.error("Unable to compare databases: {0}".format(e))
+            exit(ERROR_CODES.DIFF_FAILED)
+        if result is None:
+            log.error("Unable to read databases.")
+            exit(ERROR_CODES.DIFF_FAILED)
+        if args.output is None:
+            json.dump(result, sys.stdout, indent=2)
+            sys.stdout.write("\n")
+        else:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+        if any([len(result[k]) > 0 for k in ("added", "removed", "changed",
+                                             "only_in_a", "only_in_b")]):
+            exit(ERROR_CODES.DATABASES_DIFFER)
+        command = True
+
+    # column statistics
+    if args.column_stats and not command:
+        if args.dietrich is not None:
+            try:
+                result = stats.get_column_stats(args.dietrich,
+                                                processes=args.processes)
+            except ValueError as e:
+                log.error("Unable to calculate column statistics: {0}".format(
+                    e))
+                exit(ERROR_CODES.COLUMN_STATS_FAILED)
+            if result is None:
+                log.error("Unable to read database \"{0}\".".format(
+                    args.dietrich))
+                exit(ERROR_CODES.COLUMN_STATS_FAILED)
+            if args.output is None:
+                json.dump(result, sys.stdout, indent=2)
+                sys.stdout.write("\n")
+            else:
+                with open(args.output, "w", encoding="utf-8") as f:
+                    json.dump(result, f, indent=2)
+            command = True
+        else:
+            log.error("Input database not specified for column statistics.")
+            exit(ERROR_CODES.NO_INPUT_DATABASE_FOR_COLUMN_STATS)
+
     # convert D to S
     if args.d2s and not command:
         if args.dietrich is not None:
             basename = os.path.split(os.path.normpath(args.dietrich))[1]
             log.info('Using "{0}" for the table name.'.format(basename))
             if d.get_sqlite3(args.dietrich, 
-                    where=os.path.splitext(basename)[0] + ".sqlite") == None:
+                    where=os.path.splitext(basename)[0] + ".sqlite",
+                    mask=mask) == None:
                 exit(ERROR_CODES.CONVERSION_FROM_D_TO_SQLITE_FAILED)
             else:
                 command = True
@@ -400,330 +758,135 @@ $ cinema -d cinema_lib/test/data/sphere.cdb --cv-fast-draw 2 --label FAST
               "Output database not specified for D to SQLite conversion.")
             exit(ERROR_CODES.NO_OUTPUT_DATABASE_FOR_SQLITE_TO_D_CONVERSION)
 
-    # image commands
-    if image_ok and not command:
-        from .image import d as d_image # TODO FIXME
-        from . import image
-
-        # image command check
-        command = \
-            args.image_mean is not None or \
-            args.image_grey is not None or \
-            args.image_stddev is not None or \
-            args.image_entropy is not None or \
-            args.image_unique is not None or \
-            args.image_canny is not None or \
-            args.image_firstq is not None or \
-            args.image_secondq is not None or \
-            args.image_thirdq is not None or \
-            args.image_90th is not None or \
-            args.image_95th is not None or \
-            args.image_99th is not None or \
-            args.image_joint is not None 
-
-        if command:
-            if args.dietrich is None:
-                log.error(
-                    "Input Spec D database not specified for image command.")
-                exit(ERROR_CODES.NO_INPUT_DATABASE_FOR_IMAGE_COMMAND)
-            else:
-                header = next(d.get_iterator(args.dietrich))
-
-        # image-mean
-        if args.image_mean is not None:
-            check_n(header, args.image_mean)
-            if d_image.file_add_column(args.dietrich, 
-                                       args.image_mean, 
-                                       relabel(
-                                           "image mean", 
-                                           args.label),
-                                       image.file_mean):
-                exit(ERROR_CODES.IMAGE_MEAN_FAILED)
-        # image-grey
-        elif args.image_grey is not None:
-            check_n(header, args.image_grey)
-            if d_image.file_add_column(args.dietrich,
-                                       args.image_grey,
-                                       relabel(
-                                           "image greyscale",
-                                           args.label,
-                                           True),
-                                       image.file_grey,
-                                       n_components=0,
-                                       fill=""):
-                exit(ERROR_CODES.IMAGE_GREY_FAILED)
-        # image-stddev
-        elif args.image_stddev is not None:
-            check_n(header, args.image_stddev)
-            if d_image.file_add_column(args.dietrich, 
-                                       args.image_stddev, 
-                                       relabel(
-                                           "image standard deviation",
-                                           args.label),
-                                       image.file_stddev):
-                exit(ERROR_CODES.IMAGE_STDDEV_FAILED)
-        # image-entropy
-        elif args.image_entropy is not None:
-            check_n(header, args.image_entropy)
-            if d_image.file_add_column(args.dietrich, 
-                                       args.image_entropy, 
-                                       relabel(
-                                           "image shannon entropy",
-                                           args.label),
-                                       image.file_shannon_entropy):
-                exit(ERROR_CODES.IMAGE_ENTROPY_FAILED)
-        # image-unique
-        elif args.image_unique is not None:
-            check_n(header, args.image_unique)
-            if d_image.file_add_column(args.dietrich, 
-                                       args.image_unique, 
-                                       relabel(
-                                           "image unique count",
-                                           args.label),
-                                       image.file_unique_count,
-                                       n_components=0):
-                exit(ERROR_CODES.IMAGE_UNIQUE_FAILED)
-        # image-canny
-        elif args.image_canny is not None:
-            check_n(header, args.image_canny)
-            if d_image.file_add_column(args.dietrich, 
-                                       args.image_canny, 
-                                       relabel(
-                                           "image canny count",
-                                           args.label),
-                                       image.file_canny_count):
-                exit(ERROR_CODES.IMAGE_CANNY_FAILED)
-        # image-firstq
-        elif args.image_firstq is not None:
-            check_n(header, args.image_firstq)
-            __firstq = lambda x, y: image.file_percentile(x, y, 25)
-            if d_image.file_add_column(args.dietrich, 
-                                       args.image_firstq, 
-                                       relabel(
-                                           "image first quartile",
-                                           args.label),
-                                       __firstq):
-                exit(ERROR_CODES.IMAGE_FIRSTQ_FAILED)
-        # image-secondq
-        elif args.image_secondq is not None:
-            check_n(header, args.image_secondq)
-            __secondq = lambda x, y: image.file_percentile(x, y, 50)
-            if d_image.file_add_column(args.dietrich, 
-                                       args.image_secondq, 
-                                       relabel(
-                                           "image second quartile",
-                                           args.label),
-                                       __secondq):
-                exit(ERROR_CODES.IMAGE_SECONDQ_FAILED)
-        # image-thirdq
-        elif args.image_thirdq is not None:
-            check_n(header, args.image_thirdq)
-            __thirdq = lambda x, y: image.file_percentile(x, y, 75)
-            if d_image.file_add_column(args.dietrich, 
-                                       args.image_thirdq, 
-                                       relabel(
-                                           "image third quartile",
-                                           args.label),
-                                       __thirdq):
-                exit(ERROR_CODES.IMAGE_THIRDQ_FAILED)
-        # image-90th
-        elif args.image_90th is not None:
-            check_n(header, args.image_90th)
-            __90th = lambda x, y: image.file_percentile(x, y, 90)
-            if d_image.file_add_column(args.dietrich, 
-                                       args.image_90th, 
-                                       relabel(
-                                           "image 90th percentile",
-                                           args.label),
-                                       __90th):
-                exit(ERROR_CODES.IMAGE_90TH_FAILED)
-        # image-95th
-        elif args.image_95th is not None:
-            check_n(header, args.image_95th)
-            __95th = lambda x, y: image.file_percentile(x, y, 95)
-            if d_image.file_add_column(args.dietrich, 
-                                       args.image_95th, 
-                                       relabel(
-                                           "image 95th percentile",
-                                           args.label),
-                                       __95th):
-                exit(ERROR_CODES.IMAGE_95TH_FAILED)
-        # image-99th
-        elif args.image_99th is not None:
-            check_n(header, args.image_99th)
-            __99th = lambda x, y: image.file_percentile(x, y, 99)
-            if d_image.file_add_column(args.dietrich, 
-                                       args.image_99th, 
-                                       relabel(
-                                           "image 99th percentile",
-                                           args.label),
-                                       __99th):
-                exit(ERROR_CODES.IMAGE_99TH_FAILED)
-        # image-joint
-        elif args.image_joint is not None:
-            check_n(header, args.image_joint)
-            if d_image.file_add_column(args.dietrich,
-                                       args.image_joint,
-                                       relabel(
-                                           "image joint entropy",
-                                           args.label),
-                                       image.file_joint_entropy,
-                                       n_components=0):
-                exit(ERROR_CODES.IMAGE_JOINT_FAILED)
-
-    # computer vision commands
-    if cv_ok and not command:
-        from .cv import d as d_image 
-        from . import cv
-
-        # image command check
-        command = \
-            args.cv_grey is not None or \
-            args.cv_box_blur is not None or \
-            args.cv_gaussian_blur is not None or \
-            args.cv_median_blur is not None or \
-            args.cv_bilateral_filter is not None or \
-            args.cv_canny is not None or \
-            args.cv_contour_threshold is not None or \
-            args.cv_fast_draw is not None
-
-        if command:
-            if args.dietrich is None:
-                log.error(
-            "Input Spec D database not specified for computer vision command.")
-                exit(ERROR_CODES.NO_INPUT_DATABASE_FOR_CV_COMMAND)
-            else:
-                header = next(d.get_iterator(args.dietrich))
-
-        # cv-grey
-        if args.cv_grey is not None:
-            check_n(header, args.cv_grey)
-            if d_image.file_add_file_column(args.dietrich,
-                                       args.cv_grey,
-                                       relabel(
-                                           "cv greyscale",
-                                           args.label,
-                                           True),
-                                       cv.file_grey):
-                exit(ERROR_CODES.CV_GREY_FAILED)
-        # cv-box-blur
-        elif args.cv_box_blur is not None:
-            check_n(header, args.cv_box_blur)
-            if d_image.file_add_file_column(args.dietrich,
-                                       args.cv_box_blur,
-                                       relabel(
-                                           "cv box blur",
-                                           args.label,
-                                           True),
-                                       cv.file_box_blur):
-                exit(ERROR_CODES.CV_BOX_BLUR_FAILED)
-        # cv-gaussian-blur
-        elif args.cv_gaussian_blur is not None:
-            check_n(header, args.cv_gaussian_blur)
-            if d_image.file_add_file_column(args.dietrich,
-                                       args.cv_gaussian_blur,
-                                       relabel(
-                                            "cv gaussian blur",
-                                            args.label,
-                                            True),
-                                       cv.file_gaussian_blur):
-                exit(ERROR_CODES.CV_GAUSSIAN_BLUR_FAILED)
-        # cv-median-blur
-        elif args.cv_median_blur is not None:
-            check_n(header, args.cv_median_blur)
-            if d_image.file_add_file_column(args.dietrich,
-                                       args.cv_median_blur,
-                                       relabel(
-                                            "cv median blur",
-                                            args.label,
-                                            True),
-                                       cv.file_median_blur):
-                exit(ERROR_CODES.CV_MEDIAN_BLUR_FAILED)
-        # cv-bilateral-filter
-        elif args.cv_bilateral_filter is not None:
-            check_n(header, args.cv_bilateral_filter)
-            if d_image.file_add_file_column(args.dietrich,
-                                       args.cv_bilateral_filter,
-                                       relabel(
-                                            "cv bilateral filter",
-                                            args.label,
-                                            True),
-                                       cv.file_bilateral_filter):
-                exit(ERROR_CODES.CV_BILATERAL_FILTER_FAILED)
-        # cv-canny
-        elif args.cv_canny is not None:
-            check_n(header, args.cv_canny)
-            if d_image.file_add_file_column(args.dietrich,
-                                       args.cv_canny,
-                                       relabel(
-                                            "cv canny",
-                                            args.label,
-                                            True),
-                                       cv.file_canny):
-                exit(ERROR_CODES.CV_CANNY_FAILED)
-        # cv-contour-threshold
-        elif args.cv_contour_threshold is not None:
-            check_n(header, args.cv_contour_threshold)
-            if d_image.file_add_file_column(args.dietrich,
-                                       args.cv_contour_threshold,
-                                       relabel(
-                                            "cv contour threshold",
-                                            args.label,
-                                            True),
-                                       cv.file_contour_threshold):
-                exit(ERROR_CODES.CV_CONTOUR_THRESHOLD_FAILED)
-        # cv-fast-draw
-        elif args.cv_fast_draw is not None:
-            check_n(header, args.cv_fast_draw)
-            if d_image.file_add_file_column(args.dietrich,
-                                       args.cv_fast_draw,
-                                       relabel(
-                                            "cv fast draw",
-                                            args.label,
-                                            True),
-                                       cv.file_fast_draw):
-                exit(ERROR_CODES.CV_FAST_DRAW_FAILED)
-
-    # computer vision contrib commands
-    if cv_contrib_ok and not command:
-        from .cv import d as d_image 
-        from .cv import contrib
-
-        # image command check
-        command = \
-            args.cv_sift_draw is not None or \
-            args.cv_surf_draw is not None 
-
-        if command:
-            if args.dietrich is None:
+    # image and computer vision commands, planned into one database pass
+    if not command:
+        selected = [(c, getattr(args, commands.dest(c)))
+                    for c in commands.available()
+                    if getattr(args, commands.dest(c)) is not None]
+
+        if len(selected) > 0:
+            command = True
+            if args.dietrich is None and args.astaire is None:
+                c = selected[0][0]
                 log.error(
-            "Input Spec D database not specified for computer vision command.")
-                exit(ERROR_CODES.NO_INPUT_DATABASE_FOR_CV_COMMAND)
+                    "Input Spec D database not specified for {0} command.".
+                    format("image" if c.group == commands.GROUP_IMAGE else
+                           "computer vision"))
+                exit(ERROR_CODES.NO_INPUT_DATABASE_FOR_IMAGE_COMMAND 
+                     if c.group == commands.GROUP_IMAGE else
+                     ERROR_CODES.NO_INPUT_DATABASE_FOR_CV_COMMAND)
+            if len(selected) > 1 and args.label is not None:
+                log.error("--label can only be used with one COMMAND.")
+                exit(ERROR_CODES.LABEL_WITH_MULTIPLE_COMMANDS)
+
+            if args.watch and (args.dietrich is None or mask is not None):
+                log.error("--watch needs a Spec D database, and can not be used with --where.")
+                exit(ERROR_CODES.WATCH_FAILED)
+
+            # a Spec A database is read as a virtual Spec D database, and
+            # the rows with the new columns are written to a new Spec D CSV
+            rows = None
+            first = None
+            if args.dietrich is not None:
+                db_path = args.dietrich
+                if args.watch:
+                    # the commands need a first row, laid out as the rows
+                    # they are given, without the columns being watched
+                    try:
+                        while True:
+                            first = list(itertools.islice(
+                                watch.get_iterator(db_path), 2))
+                            if len(first) == 2:
+                                break
+                            watch.wait(db_path, args.watch_interval)
+                    except KeyboardInterrupt:
+                        exit(0)
+                    header, first = first
+                else:
+                    header = next(d.get_iterator(db_path))
             else:
-                header = next(d.get_iterator(args.dietrich))
-
-        # cv-sift-draw
-        if args.cv_sift_draw is not None:
-            check_n(header, args.cv_sift_draw)
-            if d_image.file_add_file_column(args.dietrich,
-                                        args.cv_sift_draw,
-                                        relabel(
-                                            "cv sift",
-                                            args.label,
-                                            True),
-                                        contrib.file_sift_draw):
-                exit(ERROR_CODES.CV_SIFT_DRAW_FAILED)
-        # cv-surf-draw
-        elif args.cv_surf_draw is not None:
-            check_n(header, args.cv_surf_draw)
-            if d_image.file_add_file_column(args.dietrich,
-                                        args.cv_surf_draw,
-                                        relabel(
-                                            "cv surf draw",
-                                            args.label,
-                                            True),
-                                        contrib.file_surf_draw):
-                exit(ERROR_CODES.CV_SURF_DRAW_FAILED)
+                db_path = args.astaire
+                if os.path.exists(os.path.join(db_path, 
+                                               d.SPEC_D_CSV_FILENAME)):
+                    log.error("{0} exists in the Spec A database. Use -d to add columns to it.".format(d.SPEC_D_CSV_FILENAME))
+                    exit(ERROR_CODES.SPEC_D_EXISTS_IN_SPEC_A)
+                if args.sidecar:
+                    log.error("--sidecar can not be used with a Spec A database.")
+                    exit(ERROR_CODES.SIDECAR_WITH_SPEC_A)
+                rows = spec.get_a_as_d_iterator(db_path, filters)
+                if rows is None:
+                    log.error("Unable to open database.")
+                    exit(ERROR_CODES.SPEC_A_VALIDATION_FAILED)
+                header = next(rows)
+                first = next(rows)
+                rows = itertools.chain((header, first), rows)
+
+            # create the row operators for all of the commands
+            columns = []
+            for c, column in selected:
+                check_n(header, column)
+                try:
+                    columns.append(commands.get_columns(c, db_path,
+                        column, relabel(c.label, args.label, c.is_file),
+                        first))
+                except ImportError as e:
+                    log.error("Unable to run {0}: {1}.".format(c.flag, e))
+                    columns.append(None)
+                if columns[-1] is None:
+                    exit(getattr(ERROR_CODES, c.error))
+            log.info("Adding columns {0} in one pass.".format(
+                [n for names, f in columns for n in names]))
+
+            # add them to the rows as they are appended
+            if args.watch:
+                try:
+                    n = watch.watch(db_path, columns,
+                                    interval=args.watch_interval,
+                                    idle=args.watch_idle,
+                                    checkpoint=args.checkpoint)
+                    log.info("Added columns to {0} rows.".format(n))
+                except KeyboardInterrupt:
+                    log.info("Stopped watching.")
+                except Exception as e:
+                    log.error("Unable to add columns: {0}.".format(e))
+                    exit(ERROR_CODES.WATCH_FAILED)
+                exit(0)
+
+            # run them over the database, timing the stages of the rows
+            profiler = contextlib.ExitStack()
+            if trace_path is not None:
+                profiler = profile.profiling(trace.Trace())
+            elif args.profile or args.profile_json is not None:
+                profiler = profile.profiling()
+            try:
+                with profiler as p:
+                    d.add_columns_by_row_functions(db_path, columns,
+                        sidecar=args.sidecar,
+                        checkpoint=args.checkpoint if rows is None else None,
+                        rows=rows, mask=mask)
+            except Exception as e:
+                log.error("Unable to add columns: {0}.".format(e))
+                if len(selected) == 1:
+                    exit(getattr(ERROR_CODES, selected[0][0].error))
+                else:
+                    exit(ERROR_CODES.MULTIPLE_COMMANDS_FAILED)
+
+            if trace_path is not None:
+                __write_trace(p, trace_path)
+            if args.profile or args.profile_json is not None:
+                summary = p.summary()
+                print(profile.format_summary(summary))
+                if args.profile_json is not None:
+                    try:
+                        with open(args.profile_json, "w") as f:
+                            json.dump(summary, f, indent=2)
+                    except OSError as e:
+                        log.error("Unable to write \"{0}\": {1}.".format(
+                            args.profile_json, e))
+
+    if args.watch and not command:
+        log.error("--watch needs image or computer vision COMMANDs.")
+        exit(ERROR_CODES.WATCH_FAILED)
 
     # print help
     if not command and not checked_db:
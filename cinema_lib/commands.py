@@ -0,0 +1,275 @@
+"""
+Registry of the image and computer vision commands for the command line
+utility. Each command declares its flag, help, and default label
+statically, and names its backend by module and function. The backends
+(scikit-image, OpenCV) are only imported when a command is run, so the
+command line utility can start without importing them.
+"""
+
+from collections import namedtuple
+import importlib
+from importlib import util
+import functools
+
+GROUP_IMAGE = "image"
+GROUP_CV = "cv"
+GROUP_CV_CONTRIB = "cv contrib"
+
+# top level modules that need to be installed for a group to be available
+GROUP_REQUIREMENTS = {
+    GROUP_IMAGE: ("numpy", "skimage"),
+    GROUP_CV: ("numpy", "cv2"),
+    GROUP_CV_CONTRIB: ("numpy", "cv2")
+    }
+
+# A command of the command line utility.
+#
+#     flag : string
+#         the command line flag, e.g., "--image-mean"
+#     help : string
+#         the help string for the command line flag
+#     group : string
+#         GROUP_IMAGE, GROUP_CV, or GROUP_CV_CONTRIB
+#     label : string
+#         the default label of the new column(s)
+#     is_file : boolean
+#         if the new column is a FILE column
+#     function : (string, string) or None
+#         module and name of the file function to apply to the images
+#     arguments : dictionary
+#         keyword arguments bound to the file function
+#     operator : (string, string)
+#         module and name of the function that returns the new column
+#         name(s) and row function for d.add_columns_by_row_data, called as 
+#         operator(db_path, column_number, label, [file function,]
+#         first_row=first_row, **operator_arguments), returning None on
+#         error
+#     operator_arguments : dictionary
+#         keyword arguments to the operator
+#     error : string
+#         the name of the cl.ERROR_CODES code to exit with on failure
+Command = namedtuple("Command", ("flag", "help", "group", "label", "is_file",
+                                 "function", "arguments", "operator",
+                                 "operator_arguments", "error"))
+
+IMAGE = "cinema_lib.image"
+IMAGE_D = "cinema_lib.image.d"
+CV = "cinema_lib.cv"
+CV_D = "cinema_lib.cv.d"
+CV_CONTRIB = "cinema_lib.cv.contrib"
+
+def __image(flag, help, label, function, arguments={}, error=None,
+            is_file=False, **operator_arguments):
+    return Command(flag, help, GROUP_IMAGE, label, is_file,
+                   (IMAGE, function), arguments,
+                   (IMAGE_D, "file_column_function"), operator_arguments,
+                   error)
+
+def __cv(flag, help, label, function, error, group=GROUP_CV, module=CV):
+    return Command(flag, help, group, label, True, (module, function), {},
+                   (CV_D, "file_file_column_function"), {}, error)
+
+COMMANDS = (
+    __image("--image-grey",
+            "COMMAND: convert and write image data to greyscale PNG in column number N, using scikit-image color.rgb2grey. new files are named \"<old_base_filename>_image_grey.png\"",
+            "image greyscale", "file_grey", error="IMAGE_GREY_FAILED",
+            is_file=True, n_components=0, fill=""),
+    __image("--image-mean",
+            "COMMAND: add image mean data calculated from images in column number N",
+            "image mean", "file_mean", error="IMAGE_MEAN_FAILED"),
+    __image("--image-stddev",
+            "COMMAND: add image standard deviation data calculated from images in column number N",
+            "image standard deviation", "file_stddev",
+            error="IMAGE_STDDEV_FAILED"),
+    __image("--image-unique",
+            "COMMAND: add unique pixel count data calculated from images in column number N",
+            "image unique count", "file_unique_count",
+            error="IMAGE_UNIQUE_FAILED", n_components=0),
+    __image("--image-entropy",
+            "COMMAND: add image Shannon entropy data calculated from images in column number N, using a histogram with 131072 bins",
+            "image shannon entropy", "file_shannon_entropy",
+            error="IMAGE_ENTROPY_FAILED"),
+    __image("--image-joint",
+            "COMMAND: add the joint entropy (multi-dimensional Shannon entropy) data calculated from images in column number N, using 1024 discretization levels per dimension",
+            "image joint entropy", "file_joint_entropy",
+            error="IMAGE_JOINT_FAILED", n_components=0),
+    __image("--image-canny",
+            "COMMAND: add Canny edge pixel count data calculated from images in column number N",
+            "image canny count", "file_canny_count",
+            error="IMAGE_CANNY_FAILED"),
+    __image("--image-firstq",
+            "COMMAND: add the first quartile data calculated from images in column number N",
+            "image first quartile", "file_percentile", {"percent": 25},
+            error="IMAGE_FIRSTQ_FAILED"),
+    __image("--image-secondq",
+            "COMMAND: add the second quartile data calculated from images in column number N",
+            "image second quartile", "file_percentile", {"percent": 50},
+            error="IMAGE_SECONDQ_FAILED"),
+    __image("--image-thirdq",
+            "COMMAND: add the third quartile data calculated from images in column number N",
+            "image third quartile", "file_percentile", {"percent": 75},
+            error="IMAGE_THIRDQ_FAILED"),
+    __image("--image-90th",
+            "COMMAND: add the 90th percentile data calculated from images in column number N",
+            "image 90th percentile", "file_percentile", {"percent": 90},
+            error="IMAGE_90TH_FAILED"),
+    __image("--image-95th",
+            "COMMAND: add the 95th percentile data calculated from images in column number N",
+            "image 95th percentile", "file_percentile", {"percent": 95},
+            error="IMAGE_95TH_FAILED"),
+    __image("--image-99th",
+            "COMMAND: add the 99th percentile data calculated from images in column number N",
+            "image 99th percentile", "file_percentile", {"percent": 99},
+            error="IMAGE_99TH_FAILED"),
+    Command("--image-describe",
+            "COMMAND: add the mean, standard deviation, min, max, median, and mode data calculated from images in column number N, reading each image once",
+            GROUP_IMAGE, "image describe", False, None, {},
+            (IMAGE_D, "file_describe_column_function"), {},
+            "IMAGE_DESCRIBE_FAILED"),
+    __cv("--cv-grey",
+         "COMMAND: convert and write image data to greyscale PNG in column number N, using OpenCV cvtColor. new files are named \"<old_base_filename>_cv_grey.png\"",
+         "cv greyscale", "file_grey", "CV_GREY_FAILED"),
+    __cv("--cv-box-blur",
+         "COMMAND: apply box blur to image data in column number N. new files are named \"<old_base_filename>_cv_box_blur.png\"",
+         "cv box blur", "file_box_blur", "CV_BOX_BLUR_FAILED"),
+    __cv("--cv-gaussian-blur",
+         "COMMAND: apply Gaussian blur to image data in column number N. new files are named \"<old_base_filename>_cv_gaussian_blur.png\"",
+         "cv gaussian blur", "file_gaussian_blur", "CV_GAUSSIAN_BLUR_FAILED"),
+    __cv("--cv-median-blur",
+         "COMMAND: apply median blur to image data in column number N. new files are named \"<old_base_filename>_cv_median_blur.png\"",
+         "cv median blur", "file_median_blur", "CV_MEDIAN_BLUR_FAILED"),
+    __cv("--cv-bilateral-filter",
+         "COMMAND: apply bilateral filter to image data in column number N. new files are named \"<old_base_filename>_cv_bilateral_filter.png\"",
+         "cv bilateral filter", "file_bilateral_filter",
+         "CV_BILATERAL_FILTER_FAILED"),
+    __cv("--cv-canny",
+         "COMMAND: apply Canny edge detector to image data in column number N. new files are named \"<old_base_filename>_cv_canny.png\"",
+         "cv canny", "file_canny", "CV_CANNY_FAILED"),
+    __cv("--cv-contour-threshold",
+         "COMMAND: draw contours around image thresholds on image data in column number N. new files are named \"<old_base_filename>_cv_contour_threshold.png\"",
+         "cv contour threshold", "file_contour_threshold",
+         "CV_CONTOURS_FAILED"),
+    __cv("--cv-fast-draw",
+         "COMMAND: draw FAST features on image data in column number N. new files are named \"<old_base_filename>_cv_fast_draw.png\"",
+         "cv fast draw", "file_fast_draw", "CV_FAST_FAILED"),
+    __cv("--cv-sift-draw",
+         "COMMAND: draw SIFT features on image data in column number N. new files are named \"<old_base_filename>_cv_sift_draw.png\"",
+         "cv sift", "file_sift_draw", "CV_SIFT_FAILED",
+         GROUP_CV_CONTRIB, CV_CONTRIB),
+    __cv("--cv-surf-draw",
+         "COMMAND: draw SURF features on image data in column number N. new files are named \"<old_base_filename>_cv_surf_draw.png\"",
+         "cv surf draw", "file_surf_draw", "CV_SURF_FAILED",
+         GROUP_CV_CONTRIB, CV_CONTRIB)
+    )
+
+def dest(command):
+    """
+    Return the argparse destination (attribute name) of a command's flag.
+
+    arguments:
+        command : Command
+            the command
+
+    returns:
+        a string, i.e., "--image-mean" is "image_mean"
+    """
+
+    return command.flag[2:].replace("-", "_")
+
+def missing_requirements(group):
+    """
+    Return the required modules of a command group that are not installed.
+    It only searches for the modules, and does not import them.
+
+    arguments:
+        group : string
+            GROUP_IMAGE, GROUP_CV, or GROUP_CV_CONTRIB
+
+    returns:
+        a tuple of the names of the missing modules, empty if the group
+        is available
+    """
+
+    return tuple([m for m in GROUP_REQUIREMENTS[group]
+                  if util.find_spec(m) is None])
+
+def available(commands=COMMANDS):
+    """
+    Return the commands whose group requirements are installed.
+
+    arguments:
+        commands : iterator of Command = COMMANDS
+            the commands to filter
+
+    returns:
+        a tuple of the available commands
+    """
+
+    groups = {}
+    for c in commands:
+        if c.group not in groups:
+            groups[c.group] = len(missing_requirements(c.group)) == 0
+    return tuple([c for c in commands if groups[c.group]])
+
+def get_function(command):
+    """
+    Import the backend of a command, and return its file function with the
+    command's arguments bound.
+
+    arguments:
+        command : Command
+            the command
+
+    returns:
+        a function(db_path : string, image_path : string), or None if the
+        command has no file function
+
+    raises:
+        an exception if the backend can not be imported
+    """
+
+    if command.function is None:
+        return None
+    module = importlib.import_module(command.function[0])
+    function = getattr(module, command.function[1])
+    if len(command.arguments) > 0:
+        function = functools.partial(function, **command.arguments)
+    return function
+
+def get_columns(command, db_path, column_number, label, first_row=None):
+    """
+    Import the backend of a command and return its new column name(s) and
+    row function, the row operator used by d.add_columns_by_row_data and
+    d.add_columns_by_row_functions. The database is not changed.
+
+    arguments:
+        command : Command
+            the command
+        db_path : string
+            POSIX path to a Cinema Spec D database
+        column_number : integer >= 0
+            FILE column that contains the image files
+        label : string
+            the header (label) of the new column(s)
+        first_row : tuple of strings = None
+            the first row of the database, if the rows are not read from
+            the database CSV, i.e., a Spec A database 
+            (spec.get_a_as_d_iterator)
+
+    returns:
+        a tuple of (tuple of column names, row function), or None if the
+        command is unable to process the images
+
+    raises:
+        an exception if the backend can not be imported
+    """
+
+    operator = getattr(importlib.import_module(command.operator[0]),
+                       command.operator[1])
+    function = get_function(command)
+    if function is None:
+        return operator(db_path, column_number, label, first_row=first_row,
+                        **command.operator_arguments)
+    else:
+        return operator(db_path, column_number, label, function,
+                        first_row=first_row, **command.operator_arguments)
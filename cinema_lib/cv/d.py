@@ -7,6 +7,39 @@ from ..spec import d
 import os
 import logging as log
 
+def file_file_column_function(db_path, column_number, function_name,
+                              cv_function, fill="", first_row=None):
+    """
+    Create the new FILE column name and the row function that computes it
+    for file_add_file_column, without changing the database. This is the
+    row operator that lets several functions be combined into one pass 
+    over the database with d.add_columns_by_row_functions.
+
+    arguments:
+        db_path : string
+            POSIX path to a Cinema Spec D database
+        column_number : integer >= 0
+            FILE column that contains the image files
+        function_name : string
+            the header that will be added to the database. must be "FILE" 
+        cv_function : function(db_path : string, image_path : string) => string
+            a function that returns the relative filename to a new file
+        fill : string = ""
+            the replacement value if the cv_function raises an exception
+        first_row : tuple of strings = None
+            the first row of the database. it is not used, because the
+            files are not read ahead, but it is accepted like the other
+            row operators
+
+    returns:
+        a tuple of (tuple of column names, row function) for
+        d.add_columns_by_row_data
+    """
+
+    return ((function_name,), 
+            d.file_row_function(db_path, column_number, 0, 
+                                function_name, cv_function, fill))
+
 # TODO rename to columns
 def file_add_file_column(db_path, column_number, 
                          function_name, cv_function,
@@ -40,14 +73,12 @@ def file_add_file_column(db_path, column_number,
         to the database, and False if the database was updated
     """
 
-    # create new column names
-    column_names = (function_name,)
+    column_names, row_function = file_file_column_function(db_path,
+        column_number, function_name, cv_function, fill)
 
     # iterate over the rows
-    d.add_columns_by_row_data(db_path, column_names,
-      d.file_row_function(db_path, column_number, 0, 
-                          function_name, cv_function, fill), 
-                          csv_path=csv_path)
+    d.add_columns_by_row_data(db_path, column_names, row_function,
+                              csv_path=csv_path)
     return False
 
 
@@ -218,3 +218,56 @@ def file_joint_entropy(db_path, image_path, discretization=1024):
         u, u_counts = np.unique(im, return_counts=True, axis=0)
         u_counts = u_counts.astype(np.float64) / total
         return -np.sum(u_counts * np.log2(u_counts)) 
+
+DESCRIBE_STATISTICS = ("mean", "stddev", "min", "max", "median", "mode")
+
+def __histogram(im):
+    if im.dtype.kind == 'b' or \
+       (im.dtype.kind == 'u' and im.dtype.itemsize <= 2):
+        counts = np.bincount(im.ravel())
+        values = np.flatnonzero(counts)
+        return values, counts[values]
+    else:
+        return np.unique(im, return_counts=True)
+
+def __describe(im):
+    values, counts = __histogram(im)
+    fvalues = values.astype(np.float64)
+    total = np.sum(counts)
+    mean = np.sum(fvalues * counts) / total
+    stddev = np.sqrt(np.sum(counts * (fvalues - mean) ** 2) / total)
+    cumulative = np.cumsum(counts)
+    median = (fvalues[np.searchsorted(cumulative, (total - 1) // 2, 'right')] +
+              fvalues[np.searchsorted(cumulative, total // 2, 'right')]) / 2
+    return (mean, stddev, values[0], values[-1], median, 
+            values[np.argmax(counts)])
+
+def file_describe(db_path, image_path):
+    """
+    Calculate the descriptive statistics (DESCRIBE_STATISTICS: mean, 
+    standard deviation, min, max, median, and mode) of an image file, 
+    decoding the image once. The statistics are derived from a single 
+    histogram of the pixel values per component, which is counted in one 
+    pass for boolean and 8 or 16-bit unsigned integer images. The mode is
+    the smallest of the most frequent values.
+
+    arguments:
+        db_path : string
+            POSIX path for the Cinema database
+        image_path : string
+            relative POSIX path to the image from the Cinema database
+
+    returns:
+        a tuple of the statistics in the order of DESCRIBE_STATISTICS for 
+        a scalar image, otherwise a tuple of the statistics per component 
+        (RGBA, etc.), grouped by statistic, i.e., (mean 0, mean 1, mean 2, 
+        stddev 0, ...)
+    """
+
+    im = io.imread(os.path.join(db_path, image_path))
+    if len(im.shape) == 2:
+        return __describe(im)
+    else:
+        stats = [__describe(im[:,:,d]) for d in range(0, im.shape[2])]
+        return tuple([s[i] for i in range(0, len(DESCRIBE_STATISTICS))
+                      for s in stats])
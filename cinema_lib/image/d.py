@@ -9,6 +9,79 @@ from skimage import io
 import os
 import logging as log
 
+def __first_image(db_path, column_number, csv_path, first_row):
+    # read the image in the first row, to know the shape of the images
+    if first_row is None:
+        data = d.get_iterator(db_path, csv_path)
+        next(data)
+        first_row = next(data)
+        # close the file
+        del(data)
+    return io.imread(os.path.join(db_path, first_row[column_number]))
+
+def file_column_function(db_path, column_number, 
+                         function_name, image_function,
+                         csv_path=d.SPEC_D_CSV_FILENAME,
+                         n_components=None,
+                         fill="NaN",
+                         first_row=None):
+    """
+    Create the new column name(s) and the row function that computes them
+    for file_add_column, without changing the database. This is the row
+    operator that lets several image functions be combined into one pass 
+    over the database with d.add_columns_by_row_functions. See 
+    file_add_column for how the number of components is determined.
+
+    arguments:
+        db_path : string
+            POSIX path to a Cinema Spec D database
+        column_number : integer >= 0
+            FILE column that contains the image files
+        function_name : string
+            the header(s) that will be added to the database
+        image_function : function(db_path : string, image_path : string) =>
+            tuple of n_components if n_components >= 1 else a value
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            the relative POSIX path to data.csv (or otherwise named)
+        n_components : integer = None
+            the number of components (vector length) that image_function
+            will return. if None, will read the first image in the database
+        fill : string = "NaN"
+            the replacement value if the image_function raises an exception
+        first_row : tuple of strings = None
+            the first row of the database, i.e., if the rows are not read
+            from csv_path (see d.add_columns_by_row_data). it is read from
+            csv_path if None
+
+    returns:
+        a tuple of (tuple of column names, row function) for
+        d.add_columns_by_row_data, or None if the images are unsupported
+    """
+
+    # get the first image
+    im = __first_image(db_path, column_number, csv_path, first_row)
+
+    if not (len(im.shape) == 2 or len(im.shape) == 3):
+        log.error("Unsupported image dimensions: {0}.".format(im.shape))
+        return None
+
+    # determine the number of components
+    if n_components == None:
+        if len(im.shape) == 3:
+            n_components = im.shape[2]
+        else:
+            n_components = 0
+
+    # create new column names
+    column_names = (function_name,)
+    if n_components > 0:
+        column_names = tuple([function_name + " " + str(i) for i in
+                             range(0, n_components)])
+
+    return (column_names, 
+            d.file_row_function(db_path, column_number, n_components, 
+                                function_name, image_function, fill))
+
 # TODO rename to columns
 def file_add_column(db_path, column_number, 
                     function_name, image_function,
@@ -58,36 +131,101 @@ def file_add_column(db_path, column_number,
         to the database, and False if the database was updated
     """
 
+    columns = file_column_function(db_path, column_number, function_name,
+                                   image_function, csv_path, n_components,
+                                   fill)
+    if columns is None:
+        return True
+
+    # iterate over the rows
+    d.add_columns_by_row_data(db_path, columns[0], columns[1], 
+                              csv_path=csv_path)
+    return False
+
+def file_describe_column_function(db_path, column_number, function_name,
+                                  csv_path=d.SPEC_D_CSV_FILENAME,
+                                  fill="NaN", first_row=None):
+    """
+    Create the new column names and the row function that computes them
+    for file_add_describe_columns, without changing the database. This is
+    the row operator for d.add_columns_by_row_functions.
+
+    arguments:
+        db_path : string
+            POSIX path to a Cinema Spec D database
+        column_number : integer >= 0
+            FILE column that contains the image files
+        function_name : string
+            the prefix of the headers that will be added to the database
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            the relative POSIX path to data.csv (or otherwise named)
+        fill : string = "NaN"
+            the replacement value if file_describe raises an exception
+        first_row : tuple of strings = None
+            the first row of the database, read from csv_path if None
+
+    returns:
+        a tuple of (tuple of column names, row function) for
+        d.add_columns_by_row_data, or None if the images are unsupported
+    """
+
+    from . import file_describe, DESCRIBE_STATISTICS
+
     # get the first image
-    data = d.get_iterator(db_path, csv_path)
-    next(data)
-    row = next(data)
-    im = io.imread(os.path.join(db_path, row[column_number]))
-    # close the file
-    del(data)
+    im = __first_image(db_path, column_number, csv_path, first_row)
 
     if not (len(im.shape) == 2 or len(im.shape) == 3):
         log.error("Unsupported image dimensions: {0}.".format(im.shape))
-        return(True)
-
-    # determine the number of components
-    if n_components == None:
-        if len(im.shape) == 3:
-            n_components = im.shape[2]
-        else:
-            n_components = 0
+        return None
 
     # create new column names
-    column_names = (function_name,)
-    if n_components > 0:
-        column_names = tuple([function_name + " " + str(i) for i in
-                             range(0, n_components)])
+    if len(im.shape) == 3:
+        column_names = tuple([function_name + " " + s + " " + str(i) for s in
+                              DESCRIBE_STATISTICS for i in 
+                              range(0, im.shape[2])])
+    else:
+        column_names = tuple([function_name + " " + s for s in 
+                              DESCRIBE_STATISTICS])
 
-    # iterate over the rows
-    d.add_columns_by_row_data(db_path, column_names,
-      d.file_row_function(db_path, column_number, n_components, 
-                          function_name, image_function, fill), 
-                          csv_path=csv_path)
-    return False
+    return (column_names,
+            d.file_row_function(db_path, column_number, len(column_names), 
+                                function_name, file_describe, fill))
 
+def file_add_describe_columns(db_path, column_number, function_name,
+                              csv_path=d.SPEC_D_CSV_FILENAME,
+                              fill="NaN"):
+    """
+    Adds the descriptive statistics columns (DESCRIBE_STATISTICS) of the
+    images in a FILE column to a Spec D database, using file_describe. 
+    All of the statistics are computed from one decode of each image. The
+    new columns are named "<function_name> <statistic>" for scalar images
+    and "<function_name> <statistic> <component>" for multi-component 
+    images, where the number of components is determined by reading the 
+    first image in the database.
 
+    arguments:
+        db_path : string
+            POSIX path to a Cinema Spec D database
+        column_number : integer >= 0
+            FILE column that contains the image files
+        function_name : string
+            the prefix of the headers that will be added to the database
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            the relative POSIX path to data.csv (or otherwise named)
+        fill : string = "NaN"
+            the replacement value if file_describe raises an exception
+
+    returns:
+        a boolean, True if there was an error and no changes were made
+        to the database, and False if the database was updated
+    """
+
+    columns = file_describe_column_function(db_path, column_number,
+                                            function_name, csv_path, fill)
+    if columns is None:
+        return True
+
+    # iterate over the rows
+    d.add_columns_by_row_data(db_path, columns[0], columns[1], 
+                              csv_path=csv_path)
+    return False
@@ -0,0 +1,297 @@
+"""
+Stage-level profiling of the row functions of the image and computer
+vision commands. While a Profile is active (see profiling), the time of
+each row is split into stages: parsing the CSV, decoding images
+(io.imread, cv2.imread), computing, encoding images (io.imsave,
+cv2.imwrite), and writing the CSV. The time of a stage does not include
+the time of the stages inside it, i.e., computing does not include
+decoding the images it reads.
+
+    with profile.profiling() as p:
+        d.add_columns_by_row_functions(db_path, columns)
+    print(profile.format_summary(p.summary()))
+"""
+
+import array
+import contextlib
+import functools
+import sys
+import threading
+import time
+
+STAGE_PARSE = "parse"
+STAGE_DECODE = "decode"
+STAGE_COMPUTE = "compute"
+STAGE_ENCODE = "encode"
+STAGE_WRITE = "write"
+STAGES = (STAGE_PARSE, STAGE_DECODE, STAGE_COMPUTE, STAGE_ENCODE,
+          STAGE_WRITE)
+PERCENTILES = (50, 90, 99)
+
+# the image functions that are timed, as (module, name, stage)
+IMAGE_FUNCTIONS = (
+    ("skimage.io", "imread", STAGE_DECODE),
+    ("skimage.io", "imsave", STAGE_ENCODE),
+    ("cv2", "imread", STAGE_DECODE),
+    ("cv2", "imwrite", STAGE_ENCODE),
+    )
+
+# the active Profile
+__active = [None]
+
+class Profile:
+    """
+    The time of each stage of each row. Stages can be timed from more
+    than one thread, but the rows are ended by one thread.
+
+    attributes:
+        rows : integer
+            the number of rows
+        totals : dictionary
+            the total seconds of each stage, including the time that is
+            not part of a row (i.e., reading the header)
+        times : dictionary
+            the seconds of each stage of each row, as arrays of doubles
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.totals = {s: 0.0 for s in STAGES}
+        self.times = {s: array.array("d") for s in STAGES}
+        self.__row = {s: 0.0 for s in STAGES}
+        # the stages being timed, per thread
+        self.__local = threading.local()
+        self.__start = time.perf_counter()
+        self.__end = None
+
+    def begin(self, stage):
+        """
+        Start timing a stage, nested in the current stage.
+        """
+
+        stack = self.__stack()
+        now = time.perf_counter()
+        if len(stack) > 0:
+            # pause the outer stage
+            outer, started = stack[-1]
+            self.__add(outer, now - started)
+        stack.append((stage, now))
+
+    def end(self):
+        """
+        Stop timing the current stage, and resume the outer stage.
+        """
+
+        stack = self.__stack()
+        now = time.perf_counter()
+        stage, started = stack.pop()
+        self.__add(stage, now - started)
+        if len(stack) > 0:
+            stack[-1] = (stack[-1][0], now)
+
+    def __stack(self):
+        # the (stage, start) of the stages being timed by this thread
+        if not hasattr(self.__local, "stack"):
+            self.__local.stack = []
+        return self.__local.stack
+
+    def __add(self, stage, seconds):
+        self.totals[stage] += seconds
+        self.__row[stage] += seconds
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        """
+        Time a stage, as a context manager.
+        """
+
+        self.begin(stage)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def timed(self, function, stage):
+        """
+        Wrap a function so its calls are timed as a stage.
+
+        arguments:
+            function : function
+            stage : string
+                one of STAGES
+
+        returns:
+            the wrapped function
+        """
+
+        @functools.wraps(function)
+        def __timed(*args, **kwargs):
+            self.begin(stage)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.end()
+        return __timed
+
+    def timed_iterator(self, iterator, stage=STAGE_PARSE):
+        """
+        Wrap an iterator so getting each item is timed as a stage.
+
+        arguments:
+            iterator : iterator
+            stage : string = STAGE_PARSE
+                one of STAGES
+
+        returns:
+            a generator of the items
+        """
+
+        iterator = iter(iterator)
+        while True:
+            self.begin(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.end()
+            yield item
+
+    def end_row(self):
+        """
+        Record the stage times since the last row as a row.
+        """
+
+        for s in STAGES:
+            self.times[s].append(self.__row[s])
+            self.__row[s] = 0.0
+        self.rows += 1
+
+    def stop(self):
+        """
+        Stop the wall clock of the profile.
+        """
+
+        self.__end = time.perf_counter()
+
+    def summary(self, percentiles=PERCENTILES):
+        """
+        Return the total, mean, percentile, and maximum times of each
+        stage per row, and the throughput.
+
+        arguments:
+            percentiles : iterator of numbers = PERCENTILES
+                the percentiles of the row times, in [0, 100]
+
+        returns:
+            a dictionary:
+
+            {"rows": <number of rows>,
+             "seconds": <wall clock seconds>,
+             "rows_per_second": <rows / seconds>,
+             "stages": {<stage>: {"total": <seconds>,
+                                  "fraction": <of the total of the stages>,
+                                  "mean": <seconds per row>,
+                                  "p<percentile>": <seconds per row>, ...,
+                                  "max": <seconds per row>}, ...}}
+        """
+
+        def percentile(times, p):
+            # the nearest rank percentile of sorted times
+            if len(times) == 0:
+                return None
+            rank = int(round(p / 100.0 * (len(times) - 1)))
+            return times[min(max(rank, 0), len(times) - 1)]
+
+        end = self.__end if self.__end is not None else time.perf_counter()
+        seconds = end - self.__start
+        total = sum(self.totals.values())
+        stages = {}
+        for s in STAGES:
+            times = sorted(self.times[s])
+            stage = {"total": self.totals[s],
+                     "fraction": self.totals[s] / total if total > 0 else 0.0,
+                     "mean": sum(times) / len(times) if times else None}
+            for p in percentiles:
+                stage["p{0:g}".format(p)] = percentile(times, p)
+            stage["max"] = times[-1] if times else None
+            stages[s] = stage
+        return {"rows": self.rows,
+                "seconds": seconds,
+                "rows_per_second": self.rows / seconds if seconds > 0
+                                   else None,
+                "stages": stages}
+
+def get_profile():
+    """
+    Return the active Profile, or None if there isn't one.
+    """
+
+    return __active[0]
+
+@contextlib.contextmanager
+def profiling(p=None):
+    """
+    Make a Profile active, and time the image decoding and encoding
+    functions of the modules that have been imported (IMAGE_FUNCTIONS).
+
+    arguments:
+        p : Profile = None
+            the profile, or a new Profile if None
+
+    returns:
+        a context manager of the Profile
+
+    side effects:
+        replaces the image functions with timed functions, until the
+        context manager exits
+    """
+
+    if p is None:
+        p = Profile()
+    previous = __active[0]
+    replaced = []
+    for module, name, stage in IMAGE_FUNCTIONS:
+        m = sys.modules.get(module)
+        if m is not None and hasattr(m, name):
+            replaced.append((m, name, getattr(m, name)))
+            setattr(m, name, p.timed(getattr(m, name), stage))
+    __active[0] = p
+    try:
+        yield p
+    finally:
+        __active[0] = previous
+        for m, name, function in reversed(replaced):
+            setattr(m, name, function)
+        p.stop()
+
+def format_summary(summary):
+    """
+    Format a summary (see Profile.summary) as a table.
+
+    arguments:
+        summary : dictionary
+
+    returns:
+        a string
+    """
+
+    percentiles = [k for k in summary["stages"][STAGES[0]]
+                   if k.startswith("p")]
+    columns = ["total", "%"] + ["mean"] + percentiles + ["max"]
+    lines = ["{0:<8}".format("stage") +
+             "".join(["{0:>10}".format(c) for c in columns])]
+
+    def ms(seconds):
+        return "-" if seconds is None else "{0:.3f}".format(seconds * 1000)
+
+    for s in STAGES:
+        stage = summary["stages"][s]
+        lines.append("{0:<8}".format(s) + "".join(["{0:>10}".format(v) for v
+            in [ms(stage["total"]), "{0:.1f}".format(stage["fraction"] * 100)]
+               + [ms(stage[c]) for c in columns[2:]]]))
+    rate = summary["rows_per_second"]
+    lines.append("{0} rows in {1:.3f}s ({2} rows/s), times in ms".format(
+        summary["rows"], summary["seconds"],
+        "-" if rate is None else "{0:.1f}".format(rate)))
+    return "\n".join(lines)
@@ -0,0 +1,280 @@
+"""
+Progress reporting for long passes over the rows of a database. A pass
+wraps its row iterator with iterate, which reports the rows, rows per
+second, bytes per second, and the estimated time remaining to standard
+error, at most every REFRESH_SECONDS. The clock is only read every so
+many rows, where the number of rows adapts to the rate, so the overhead
+per row is a counter. If reporting is disabled, the iterator is returned
+as is. By default, it is enabled if standard error is a terminal.
+"""
+
+import os
+import sys
+import time
+
+# the minimum number of seconds between reports
+REFRESH_SECONDS = 0.5
+
+# enabled (True), disabled (False), or if standard error is a terminal (None)
+__enabled = [None]
+
+def set_enabled(enabled):
+    """
+    Enable or disable progress reporting.
+
+    arguments:
+        enabled : boolean or None
+            True to report, False not to report, or None to report if
+            standard error is a terminal
+    """
+
+    __enabled[0] = enabled
+
+def is_enabled():
+    """
+    Return True if progress is reported (see set_enabled).
+    """
+
+    if __enabled[0] is None:
+        try:
+            return sys.stderr.isatty()
+        except (AttributeError, ValueError):
+            return False
+    return __enabled[0]
+
+def count_rows(fn, buffer_size=1 << 20):
+    """
+    Count the rows of a CSV quickly, by counting the newlines, without
+    parsing it. It is exact unless there are blank lines or quoted
+    newlines.
+
+    arguments:
+        fn : string
+            the path of the CSV
+        buffer_size : integer = 1 << 20
+            the number of bytes to read at a time
+
+    returns:
+        the number of rows, not counting the header
+    """
+
+    lines = 0
+    last = b"\n"
+    with open(fn, "rb", buffering=0) as f:
+        while True:
+            data = f.read(buffer_size)
+            if len(data) == 0:
+                break
+            lines += data.count(b"\n")
+            last = data[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(0, lines - 1)
+
+class Progress:
+    """
+    The progress of a pass over rows.
+
+    attributes:
+        label : string
+            what the pass is doing, i.e., "Checking data.csv"
+        count : integer
+            the number of rows so far
+        total : integer or None
+            the number of rows, if it is known
+        size : integer or None
+            the number of bytes of the rows, if it is known
+    """
+
+    def __init__(self, label, total=None, size=None, stream=None,
+                 interval=REFRESH_SECONDS):
+        """
+        Start a pass.
+
+        arguments:
+            label : string
+                what the pass is doing
+            total : integer = None
+                the number of rows, if it is known
+            size : integer = None
+                the number of bytes of the rows, if it is known, for the
+                bytes per second
+            stream : file = None
+                where to report, or standard error if None
+            interval : number = REFRESH_SECONDS
+                the minimum number of seconds between reports
+        """
+
+        self.label = label
+        self.total = total
+        self.size = size
+        self.count = 0
+        self.__stream = sys.stderr if stream is None else stream
+        try:
+            self.__terminal = self.__stream.isatty()
+        except (AttributeError, ValueError):
+            self.__terminal = False
+        self.__interval = interval
+        self.__start = time.monotonic()
+        self.__last = self.__start
+        self.__reported = False
+        # the number of rows between reading the clock
+        self.__stride = 1
+        self.__check = 1
+
+    def update(self, n=1):
+        """
+        Add rows, and report if it has been long enough since the last
+        report.
+        """
+
+        self.count += n
+        if self.count >= self.__check:
+            self.__tick()
+
+    def __tick(self):
+        now = time.monotonic()
+        elapsed = now - self.__start
+        if elapsed > 0:
+            # read the clock about 4 times per interval, and at most
+            # double the rows between reads
+            rate = self.count / elapsed
+            self.__stride = max(1, min(self.__stride * 2,
+                                       int(rate * self.__interval / 4)))
+        self.__check = self.count + self.__stride
+        if now - self.__last >= self.__interval:
+            self.__last = now
+            self.report()
+
+    def format(self):
+        """
+        Return the report of the progress, as a string.
+        """
+
+        def duration(seconds):
+            seconds = int(round(seconds))
+            return "{0}:{1:02d}:{2:02d}".format(seconds // 3600,
+                                                seconds // 60 % 60,
+                                                seconds % 60)
+
+        elapsed = time.monotonic() - self.__start
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        if self.total is not None and self.total > 0:
+            text = "{0}: {1}/{2} rows ({3:.1f}%)".format(self.label,
+                self.count, self.total,
+                100.0 * min(self.count, self.total) / self.total)
+        else:
+            text = "{0}: {1} rows".format(self.label, self.count)
+        text += ", {0:.0f} rows/s".format(rate)
+        if self.size is not None and self.total:
+            text += ", {0:.1f} MB/s".format(
+                rate * self.size / self.total / 1e6)
+        if self.total is not None and rate > 0 and self.count < self.total:
+            text += ", ETA {0}".format(
+                duration((self.total - self.count) / rate))
+        else:
+            text += ", {0}".format(duration(elapsed))
+        return text
+
+    def report(self):
+        """
+        Report the progress.
+
+        side effects:
+            writes to the stream, overwriting the last report if it is a
+            terminal
+        """
+
+        if self.__terminal:
+            self.__stream.write("\r" + self.format() + "\x1b[K")
+        else:
+            self.__stream.write(self.format() + "\n")
+        self.__stream.flush()
+        self.__reported = True
+
+    def close(self):
+        """
+        End the pass, reporting the final progress if the progress has
+        been reported, so short passes are silent.
+        """
+
+        if self.__reported:
+            self.report()
+            if self.__terminal:
+                self.__stream.write("\n")
+                self.__stream.flush()
+
+    def iterate(self, rows):
+        """
+        Iterate over rows, counting them, and end the pass after the
+        last row.
+
+        arguments:
+            rows : iterator
+
+        returns:
+            a generator of the rows
+        """
+
+        try:
+            for row in rows:
+                yield row
+                self.count += 1
+                if self.count >= self.__check:
+                    self.__tick()
+        finally:
+            self.close()
+
+def iterate(rows, label, total=None, size=None):
+    """
+    Report the progress of a pass over rows, if progress reporting is
+    enabled (see is_enabled).
+
+    arguments:
+        rows : iterator
+            the rows
+        label : string
+            what the pass is doing
+        total : integer or function() => integer = None
+            the number of rows, or a function that returns it, which is
+            only called if reporting is enabled, or None if it isn't
+            known
+        size : integer = None
+            the number of bytes of the rows, if it is known
+
+    returns:
+        rows, if reporting is disabled, otherwise a generator of the rows
+    """
+
+    if not is_enabled():
+        return rows
+    if callable(total):
+        total = total()
+    return Progress(label, total, size).iterate(rows)
+
+def iterate_csv(rows, label, fn):
+    """
+    Report the progress of a pass over the rows of a CSV (see iterate),
+    where the total is counted with count_rows.
+
+    arguments:
+        rows : iterator
+            the rows, without the header
+        label : string
+            what the pass is doing
+        fn : string
+            the path of the CSV
+
+    returns:
+        rows, if reporting is disabled, otherwise a generator of the rows
+    """
+
+    if not is_enabled():
+        return rows
+    try:
+        total = count_rows(fn)
+        size = os.path.getsize(fn)
+    except OSError:
+        total = None
+        size = None
+    return Progress(label, total, size).iterate(rows)
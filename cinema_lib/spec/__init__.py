@@ -4,19 +4,63 @@ Cinema Specification utility functions.
 
 from ..spec import d 
 from ..spec import a
+from .. import progress
 
 import os
+import json
 import logging as log
+from itertools import product
+from functools import reduce
 
 CINEMA_DATABASE_EXT = ".cdb"
+# the number of name patterns that are checked one by one
+MAX_NAME_PATTERNS = 64
 
-def convert_a_to_d(db_path):
+def get_a_as_d_iterator(db_path, filters=None):
+    """
+    Return a row iterator of a Spec A database as a virtual Spec D 
+    database, i.e., the rows that convert_a_to_d would write to the Spec D
+    CSV, as strings, without writing them. It handles the Spec A databases
+    written by ParaView, where the JSON is "image/info.json", by adding 
+    "image/" to the files.
+
+    arguments:
+        db_path : string
+            POSIX path to a Cinema Spec A database
+        filters : dictionary = None
+            argument filters (see a.filter_dictionary), if only some of 
+            the rows are wanted
+
+    returns:
+        an iterator that returns a tuple of strings per row, the first 
+        row being the header, if the database can be opened, otherwise None
+    """
+
+    db = a.get_iterator(db_path, filters=filters, as_strings=True)
+    if db != None:
+        return db
+
+    # special case to handle incorrectly written Spec A databases from ParaView
+    # ParaView writes the info.json file here ...
+    db = a.get_iterator(db_path, "image/info.json", filters, True)
+    if db == None:
+        return None
+    def imagedir():
+        yield next(db)
+        for row in db:
+            yield row[:-1] + ("image/" + row[-1],)
+    return imagedir()
+
+def convert_a_to_d(db_path, filters=None):
     """
     Create a Spec D CSV, in place, in a Spec A database.
 
     arguments:
         db_path : string
             POSIX path to a Cinema Spec A database
+        filters : dictionary = None
+            argument filters (see a.filter_dictionary), if only some of 
+            the rows are converted
 
     returns:
         True if it was able to create it, False if not
@@ -33,44 +77,291 @@ def convert_a_to_d(db_path):
         log.error("{0} exists. Refusing to execute.".format(csv_fn))
         return False
     
-    # special case to handle incorrectly written Spec A databases from ParaView
-    use_imagedir = False
-    db = a.get_iterator(db_path)
+    db = get_a_as_d_iterator(db_path, filters)
     if db == None:
-        # ParaView writes the info.json file here ...
-        db = a.get_iterator(db_path,"image/info.json")
-        if db == None:
-            log.error("Unable to open \"{0}\" in \"{1}\".".format(
-                a.SPEC_A_JSON_FILENAME, db_path))
-            return False
-        else:
-            use_imagedir = True 
+        log.error("Unable to open \"{0}\" in \"{1}\".".format(
+            a.SPEC_A_JSON_FILENAME, db_path))
+        return False
+
+    def count():
+        # the number of rows, from the arguments
+        for json_path in (a.SPEC_A_JSON_FILENAME, "image/info.json"):
+            accessor = a.get_accessor(db_path, json_path, filters)
+            if accessor is not None:
+                return len(accessor)
+        return None
 
     # create the csv 
     try:
-        with open(csv_fn, "w") as f:
-            # iterate over the data
-            firstline = True
-            for row in db:
-                line = ""
-                for col in row[:-1]:
-                    line = line + str(col) + ","
-
-                # ParaView exception logic 
-                if use_imagedir:
-                    if firstline:
-                        line = line + str(row[-1]) + "\n"
-                        firstline = False
-                    else:
-                        line = line + "image/" + str(row[-1]) + "\n"
-                else:
-                    line = line + str(row[-1]) + "\n"
-
-                f.write(line)
-
+        with open(csv_fn, "w", buffering=d.BUFFER_SIZE) as f:
+            f.write(",".join(next(db)) + "\n")
+            f.writelines(",".join(row) + "\n" for row in progress.iterate(
+                db, "Converting \"{0}\" to Spec D".format(db_path), count))
     except Exception as e:
         log.error("Conversion of database failed with \"{0}\".".format(e))
         return False
 
     return True
 
+def __pattern_graph(names, probes):
+    # the name patterns that render the files of the probe rows, as a graph
+    # of (position in each file) nodes, where the edges are (field name or
+    # literal character) labels. every edge advances every position, so
+    # the nodes sorted by the sum of the positions are in topological order
+    start = tuple([0] * len(probes))
+    end = tuple([len(fn) for kv, fn in probes])
+    edges = {}
+    stack = [start]
+    while len(stack) > 0:
+        node = stack.pop()
+        if node in edges:
+            continue
+        out = []
+        for name in names:
+            values = [kv[name] for kv, fn in probes]
+            if all([len(v) > 0 and fn.startswith(v, i) for v, (kv, fn), i
+                    in zip(values, probes, node)]):
+                out.append(((True, name), tuple([i + len(v) for i, v
+                                                 in zip(node, values)])))
+        if node != end and all([i < len(fn) for (kv, fn), i
+                                in zip(probes, node)]):
+            chars = set([fn[i] for (kv, fn), i in zip(probes, node)])
+            if len(chars) == 1:
+                out.append(((False, chars.pop()),
+                            tuple([i + 1 for i in node])))
+        edges[node] = out
+        stack.extend([n for label, n in out])
+
+    # the number of patterns from each node, without the dead ends
+    order = sorted(edges, key=sum)
+    paths = {}
+    for node in reversed(order):
+        edges[node] = [(label, n) for label, n in edges[node]
+                       if paths[n] > 0]
+        paths[node] = 1 if node == end else \
+                      sum([paths[n] for label, n in edges[node]])
+    return {"start": start, "end": end, "edges": edges, "order": order,
+            "paths": paths[start]}
+
+def __count_rendering(graph, kv, fn):
+    # the number of patterns of the graph that render fn from the row
+    edges = graph["edges"]
+    at = {graph["start"]: {0: 1}}
+    for node in graph["order"]:
+        if node not in at or node == graph["end"]:
+            continue
+        for j, count in at[node].items():
+            for (is_field, text), n in edges[node]:
+                value = kv[text] if is_field else text
+                if fn.startswith(value, j):
+                    counts = at.setdefault(n, {})
+                    counts[j + len(value)] = counts.get(j + len(value), 0) + \
+                                             count
+    return at.get(graph["end"], {}).get(len(fn), 0)
+
+def __format_pattern(labels):
+    return "".join(["{" + text + "}" if is_field else
+                    text.replace("{", "{{").replace("}", "}}")
+                    for is_field, text in labels])
+
+def __graph_patterns(graph):
+    # all of the patterns of the graph, as (pattern, number of fields),
+    # the fields before the literal characters
+    patterns = []
+    stack = [(graph["start"], ())]
+    while len(stack) > 0:
+        node, labels = stack.pop()
+        if node == graph["end"]:
+            patterns.append((__format_pattern(labels),
+                             sum([f for f, t in labels])))
+            continue
+        for label, n in reversed(graph["edges"][node]):
+            stack.append((n, labels + (label,)))
+    return patterns
+
+def __best_pattern(graph):
+    # the pattern of the graph with the most fields
+    best = {}
+    for node in reversed(graph["order"]):
+        if node == graph["end"]:
+            best[node] = (0, None, None)
+            continue
+        for label, n in graph["edges"][node]:
+            fields = best[n][0] + label[0]
+            if node not in best or fields > best[node][0]:
+                best[node] = (fields, label, n)
+    labels = []
+    node = graph["start"]
+    while node != graph["end"]:
+        fields, label, node = best[node]
+        labels.append(label)
+    return __format_pattern(labels)
+
+def __json_values(values):
+    # the values as JSON numbers, if they are written the same way
+    for t in (int, float):
+        try:
+            typed = [t(v) for v in values]
+            if all([str(v) == s for v, s in zip(typed, values)]):
+                return typed
+        except ValueError:
+            pass
+    return list(values)
+
+def __row_hash(row):
+    return hash(row) & 0xFFFFFFFFFFFFFFFF
+
+def convert_d_to_a(db_path, csv_path=d.SPEC_D_CSV_FILENAME):
+    """
+    Create a Spec A JSON, in place, in a Spec D database, if the Spec D 
+    database is a regular parameter grid. It is regular if it has one 
+    FILE column, every combination of the distinct values of the other 
+    columns (the arguments) is in exactly one row, i.e., it is the 
+    Cartesian product of the values, and the files can be derived from
+    the arguments by a name pattern. The size of the Spec A JSON is the 
+    number of distinct values, instead of the number of rows.
+
+    The database is read in one pass. The distinct values are kept per 
+    column, the name patterns that render the file of the first row are 
+    checked against every row (as a graph of the patterns, that is only
+    pruned by, and keeps, the rows that some of the patterns don't
+    render), and the rows are checked to be the product with the row
+    count and an order independent sum of row hashes, so the rows are
+    not kept in memory. The pattern with the most fields is used.
+
+    arguments:
+        db_path : string
+            POSIX path to a Cinema Spec D database
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        True if it was able to create it, False if not
+
+    side effects:
+        logs error and info messages to the logger, including why the
+        database is not a regular parameter grid
+
+        writes out a SPEC_A_JSON_FILENAME at *db_path*
+    """
+
+    log.info("Creating new Spec A JSON at \"{0}\".".format(db_path))
+
+    json_fn = os.path.join(db_path, a.SPEC_A_JSON_FILENAME)
+    if os.path.exists(json_fn):
+        log.error("{0} exists. Refusing to execute.".format(json_fn))
+        return False
+
+    db = d.get_iterator(db_path, csv_path)
+    if db == None:
+        log.error("Unable to open \"{0}\" in \"{1}\".".format(
+            csv_path, db_path))
+        return False
+
+    # one FILE column, and the rest are arguments
+    header = next(db)
+    files = d.file_columns(header)
+    if len(files) != 1:
+        log.error("Not a Spec A database: there are {0} FILE columns, "
+                  "instead of 1.".format(len(files)))
+        return False
+    file_column = files[0]
+    names = tuple([h for h in header if not d.is_file_column(h)])
+    if len(set(names)) != len(names):
+        log.error("Not a Spec A database: column names are not unique.")
+        return False
+
+    distinct = [dict() for n in names]
+    n_rows = 0
+    checksum = 0
+    patterns = None
+    graph = None
+    for n, row in enumerate(db):
+        if None in row:
+            log.error("Not a Spec A database: row {0} has empty values.".
+                format(n + 1))
+            return False
+        fn = row[file_column]
+        arguments = row[:file_column] + row[file_column + 1:]
+
+        # the name patterns that render every file, as a graph pruned by
+        # the rows that some of the patterns don't render, until there
+        # are few enough to check each of them
+        kv = {k: v for k, v in zip(names, arguments)}
+        if patterns is None:
+            if graph is None:
+                probes = [(kv, fn)]
+                graph = __pattern_graph(names, probes)
+            else:
+                rendering = __count_rendering(graph, kv, fn)
+                if 0 < rendering < graph["paths"]:
+                    probes.append((kv, fn))
+                    graph = __pattern_graph(names, probes)
+                elif rendering == 0:
+                    graph = None
+            if graph is not None and graph["paths"] <= MAX_NAME_PATTERNS:
+                patterns = __graph_patterns(graph)
+        else:
+            patterns = [p for p in patterns if p[0].format(**kv) == fn]
+        if graph is None or (patterns is not None and len(patterns) == 0):
+            log.error("Not a Spec A database: the files can not be "
+                      "derived from the arguments (row {0}, \"{1}\").".
+                      format(n + 1, fn))
+            return False
+
+        for values, v in zip(distinct, arguments):
+            values[v] = None
+        n_rows = n_rows + 1
+        checksum = (checksum + __row_hash(arguments)) & 0xFFFFFFFFFFFFFFFF
+
+    if n_rows == 0:
+        log.error("Not a Spec A database: there are no rows.")
+        return False
+
+    # the rows are the product of the distinct values
+    n_product = reduce(lambda x, y: x * len(y), distinct, 1)
+    if n_rows != n_product:
+        log.error("Not a Spec A database: there are {0} rows, but {1} "
+                  "combinations of the distinct values ({2}).".format(
+                  n_rows, n_product, 
+                  ", ".join(["{0} {1}".format(len(v), k) 
+                             for k, v in zip(names, distinct)])))
+        return False
+    product_checksum = 0
+    for row in product(*[tuple(v) for v in distinct]):
+        product_checksum = (product_checksum + __row_hash(row)) & \
+                           0xFFFFFFFFFFFFFFFF
+    if checksum != product_checksum:
+        log.error("Not a Spec A database: some combinations of the "
+                  "distinct values are repeated and others are missing.")
+        return False
+    if patterns is None:
+        pattern = __best_pattern(graph)
+    else:
+        pattern = max(patterns, key=lambda p: p[1])[0]
+    log.info("Name pattern is \"{0}\".".format(pattern))
+
+    # write the json
+    arguments = {}
+    for k, values in zip(names, distinct):
+        values = __json_values(tuple(values))
+        arguments[k] = {
+            a.KEY_ARG_DEFAULT: values[0],
+            a.KEY_ARG_LABEL: k,
+            a.KEY_ARG_TYPE: "list" if isinstance(values[0], str) else "range",
+            a.KEY_ARG_VALUES: values
+            }
+    try:
+        with open(json_fn, "w") as f:
+            json.dump({
+                a.KEY_TYPE: a.VALUE_TYPE,
+                a.KEY_VERSION: a.VALUE_VERSION,
+                a.KEY_METADATA: {a.KEY_METADATA_TYPE: a.VALUE_METADATA_TYPE},
+                a.KEY_NAME_PATTERN: pattern,
+                a.KEY_ARGUMENTS: arguments
+                }, f, indent=2)
+    except Exception as e:
+        log.error("Conversion of database failed with \"{0}\".".format(e))
+        return False
+
+    return True
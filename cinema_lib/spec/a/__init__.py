@@ -7,7 +7,9 @@ from ...spec import d
 import json
 import os
 import logging as log
-from itertools import product
+from itertools import product, chain
+from operator import itemgetter
+import string
 
 SPEC_A_JSON_FILENAME = "info.json"
 KEY_TYPE = "type"
@@ -50,7 +52,222 @@ def get_dictionary(db_path, json_path=SPEC_A_JSON_FILENAME):
     except:
         return None
 
-def get_iterator(db_path, json_path=SPEC_A_JSON_FILENAME):
+def value_filter(values):
+    """
+    Return an argument filter that selects the given values.
+
+    arguments:
+        values : iterator of values
+            the argument values to select
+
+    returns:
+        a function(value) that returns True if the value is selected
+    """
+
+    values = tuple(values)
+    return lambda v: v in values
+
+def range_filter(low=None, high=None):
+    """
+    Return an argument filter that selects values in a closed range.
+
+    arguments:
+        low : value = None
+            the lowest value to select, unbounded if None
+        high : value = None
+            the highest value to select, unbounded if None
+
+    returns:
+        a function(value) that returns True if the value is selected. 
+        values that can not be compared to the range are not selected
+    """
+
+    def __filter(v):
+        try:
+            return (low is None or v >= low) and (high is None or v <= high)
+        except TypeError:
+            return False
+    return __filter
+
+def __selector_value(value):
+    # selector values are numbers, if they can be, like the JSON values
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+def parse_selector(selector):
+    """
+    Parse an argument selector string into an argument filter. The 
+    selector is "<argument>=<values>", where values is either a comma
+    separated list of values, i.e., "phi=0,90", or a colon separated
+    closed range, i.e., "phi=-180:0", where either end of the range may be
+    empty to leave it unbounded, i.e., "phi=90:".
+
+    arguments:
+        selector : string
+            the selector
+
+    returns:
+        a tuple of (argument name, filter function), see value_filter
+        and range_filter
+
+    raises:
+        ValueError if the selector can not be parsed
+    """
+
+    name, equals, values = selector.partition("=")
+    name = name.strip()
+    if equals == "" or name == "":
+        raise ValueError(
+            "Selector \"{0}\" is not <argument>=<values>.".format(selector))
+    if ":" in values:
+        bounds = values.split(":")
+        if len(bounds) != 2:
+            raise ValueError(
+                "Selector range \"{0}\" is not <low>:<high>.".format(values))
+        low, high = [None if b.strip() == "" else __selector_value(b.strip())
+                     for b in bounds]
+        return (name, range_filter(low, high))
+    return (name, value_filter([__selector_value(v.strip()) 
+                                for v in values.split(",")]))
+
+def filter_dictionary(db, filters):
+    """
+    Restrict the values of the arguments of a Spec A dictionary, so the
+    rows of the database are only the selected combinations of values.
+    The order of the values is kept.
+
+    arguments:
+        db : dictionary
+            the contents of a Spec A JSON (get_dictionary)
+        filters : dictionary, or iterator of (string, function(value))
+            argument names to functions that return True if the value 
+            is selected. an argument may have more than one filter, and 
+            a value must be selected by all of them
+
+    returns:
+        a shallow copy of the dictionary with the filtered values
+
+    raises:
+        an exception if a filter names an argument that is not in the
+        database
+    """
+
+    if isinstance(filters, dict):
+        filters = filters.items()
+    arguments = dict(db[KEY_ARGUMENTS])
+    for k, f in filters:
+        if k not in arguments:
+            log.error("Unable to select \"{0}\", it is not an argument.".
+                format(k))
+            raise Exception("\"{0}\" is not an argument.".format(k))
+        arguments[k] = dict(arguments[k])
+        arguments[k][KEY_ARG_VALUES] = [v for v in arguments[k][KEY_ARG_VALUES]
+                                        if f(v)]
+        log.info("Selected {0} values of \"{1}\".".format(
+            len(arguments[k][KEY_ARG_VALUES]), k))
+    db = dict(db)
+    db[KEY_ARGUMENTS] = arguments
+    return db
+
+def compile_name_pattern(name_pattern, keylist, values):
+    """
+    Parse a Spec A name pattern once, so the files of many combinations 
+    of argument values can be rendered without str.format. The pattern 
+    is split into a "%s" template of the literal text, and the fields,
+    where each field is rendered once per value of its argument.
+
+    arguments:
+        name_pattern : string
+            the Spec A name pattern, i.e., "{phi}/{theta}.png"
+        keylist : tuple of strings
+            the argument names
+        values : tuple of tuples
+            the values of each argument, in keylist order
+
+    returns:
+        a tuple of (template, fields), where fields is a tuple of 
+        (argument index in keylist, tuple of the rendered string of each 
+        value of the argument), in template order, such that the file of 
+        the values at positions p is
+
+            template % tuple([strings[p[i]] for i, strings in fields])
+
+        or None if the pattern has fields that are not simple argument
+        names (i.e., indexing, attributes, or nested fields), which need
+        str.format
+    """
+
+    conversions = {None: lambda v: v, "s": str, "r": repr, "a": ascii}
+    template = ""
+    fields = []
+    try:
+        for literal, name, spec, conversion in \
+            string.Formatter().parse(name_pattern):
+            template = template + literal.replace("%", "%%")
+            if name is None:
+                continue
+            if name not in keylist or "{" in spec or \
+               conversion not in conversions:
+                return None
+            i = keylist.index(name)
+            convert = conversions[conversion]
+            fields.append((i, tuple([format(convert(v), spec) 
+                                     for v in values[i]])))
+            template = template + "%s"
+    except (ValueError, TypeError):
+        # let str.format report it
+        return None
+    return (template, tuple(fields))
+
+def __rows(db, as_strings=False):
+    # yields the rows of a Spec A dictionary, without the header
+    keylist = tuple(sorted(db[KEY_ARGUMENTS].keys()))
+    values = tuple([tuple(db[KEY_ARGUMENTS][k][KEY_ARG_VALUES])
+                    for k in keylist])
+    row_values = values
+    if as_strings:
+        # convert each value to a string once
+        row_values = tuple([tuple([str(v) for v in vs]) for vs in values])
+
+    compiled = compile_name_pattern(db[KEY_NAME_PATTERN], keylist, values)
+    if compiled is None:
+        name_pattern = db[KEY_NAME_PATTERN]
+        for row, strings in zip(product(*values), product(*row_values)):
+            kv = {k: v for k, v in zip(keylist, row)}
+            yield strings + (name_pattern.format(**kv),)
+        return
+
+    template, fields = compiled
+    arguments = [i for i, strings in fields]
+    if len(set(arguments)) != len(arguments):
+        # an argument is in more than one field, render by value positions
+        for row, positions in zip(product(*row_values), 
+                                  product(*[range(0, len(v)) 
+                                            for v in values])):
+            yield row + (template % tuple([strings[positions[i]] 
+                                           for i, strings in fields]),)
+        return
+
+    # the product of the rendered strings, in the same order as the rows,
+    # with the fields picked out in template order
+    rendered = list(row_values)
+    for i, strings in fields:
+        rendered[i] = strings
+    if len(arguments) == 0:
+        pick = lambda strings: ()
+    else:
+        pick = itemgetter(*arguments)
+    files = map(template.__mod__, map(pick, product(*rendered)))
+    for row, fn in zip(product(*row_values), files):
+        yield row + (fn,)
+
+def get_iterator(db_path, json_path=SPEC_A_JSON_FILENAME, filters=None,
+                 as_strings=False):
     """
     Return a row iterator, assuming a valid Spec A database. Does
     not validate that it is a proper Spec A database. 
@@ -67,6 +284,13 @@ def get_iterator(db_path, json_path=SPEC_A_JSON_FILENAME):
             POSIX path to Cinema database
         json_path : string = SPEC_A_JSON_FILENAME
             POSIX relative path to Cinema JSON 
+        filters : dictionary = None
+            argument filters (see filter_dictionary), if only some of the 
+            rows are wanted. the values are filtered before forming the
+            combinations, so the unselected rows are never generated
+        as_strings : boolean = False
+            if True, the argument values are returned as strings (str), 
+            converting each value once rather than once per row
 
     returns:
         an iterator that returns a tuple of data per row if the json_path 
@@ -81,14 +305,203 @@ def get_iterator(db_path, json_path=SPEC_A_JSON_FILENAME):
         return None
 
     try:
+        if filters is not None:
+            db = filter_dictionary(db, filters)
         keylist = tuple(sorted(db[KEY_ARGUMENTS].keys()))
-        def filelist():
-            yield keylist + (d.FILE_HEADER_KEYWORD,)
-            for row in product(*[db[KEY_ARGUMENTS][k][KEY_ARG_VALUES] 
-                                 for k in keylist]):
-                kv = {k: v for k, v in zip(keylist, row)}
-                yield row + (db[KEY_NAME_PATTERN].format(**kv),)
-        return filelist()
+        return chain((keylist + (d.FILE_HEADER_KEYWORD,),), 
+                     __rows(db, as_strings))
+    except:
+        return None
+
+class Accessor:
+    """
+    Random access to the rows of a Spec A database, without enumerating
+    the Cartesian product of the arguments. The rows are the same, and
+    in the same order, as the rows of get_iterator (without the header):
+    the argument values in sorted argument order, followed by the FILE.
+    A row index is a mixed-radix number, where each digit is the position
+    of an argument value in its list of values, and the last argument
+    is the least significant digit.
+
+    attributes:
+        header : tuple of strings
+            the header (column identifiers), i.e., the sorted argument
+            names followed by FILE
+        values : tuple of tuples
+            the values of each argument, in header order
+        count : integer
+            the number of rows, i.e., the product of the number of values
+            of each argument
+        name_pattern : string
+            the Spec A name pattern of the files
+    """
+
+    def __init__(self, db):
+        """
+        Create an accessor from a Spec A dictionary (get_dictionary).
+
+        arguments:
+            db : dictionary
+                the contents of a Spec A JSON
+
+        raises:
+            an exception if the dictionary is missing the arguments or 
+            name pattern
+        """
+
+        keylist = tuple(sorted(db[KEY_ARGUMENTS].keys()))
+        self.header = keylist + (d.FILE_HEADER_KEYWORD,)
+        self.values = tuple([tuple(db[KEY_ARGUMENTS][k][KEY_ARG_VALUES])
+                             for k in keylist])
+        self.name_pattern = db[KEY_NAME_PATTERN]
+        self.__compiled = compile_name_pattern(self.name_pattern, keylist,
+                                               self.values)
+        # the (first) position of each value of each argument
+        self.__positions = tuple([{v: i for i, v in reversed(
+                                   tuple(enumerate(values)))}
+                                  for values in self.values])
+        # the place value of each argument
+        self.__strides = [1] * len(keylist)
+        for i in range(len(keylist) - 2, -1, -1):
+            self.__strides[i] = self.__strides[i + 1] * \
+                                len(self.values[i + 1])
+        self.count = self.__strides[0] * len(self.values[0]) \
+                     if len(keylist) > 0 else 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        """
+        Return a row, or a list of rows given a slice.
+        """
+
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        positions = self.__positions_of(index)
+        parameters = tuple([values[p] 
+                            for values, p in zip(self.values, positions)])
+        if self.__compiled is None:
+            return parameters + (self.filename(parameters),)
+        template, fields = self.__compiled
+        return parameters + (template % tuple([strings[positions[i]]
+                                               for i, strings in fields]),)
+
+    def __iter__(self):
+        for i in range(0, self.count):
+            yield self[i]
+
+    def __arguments(self, parameters):
+        # parameters as a tuple in header order
+        if isinstance(parameters, dict):
+            return tuple([parameters[k] for k in self.header[:-1]])
+        parameters = tuple(parameters)
+        if len(parameters) != len(self.values):
+            raise ValueError("Expected {0} parameters, got {1}.".format(
+                len(self.values), len(parameters)))
+        return parameters
+
+    def parameters(self, index):
+        """
+        Return the argument values of a row.
+
+        arguments:
+            index : integer
+                the row index, negative indices count from the end
+
+        returns:
+            a tuple of argument values in header order
+
+        raises:
+            IndexError if the index is out of range
+        """
+
+        return tuple([values[p] for values, p in 
+                      zip(self.values, self.__positions_of(index))])
+
+    def __positions_of(self, index):
+        # the value positions (mixed-radix digits) of a row index
+        if index < 0:
+            index = index + self.count
+        if index < 0 or index >= self.count:
+            raise IndexError("Row index {0} out of range.".format(index))
+        return tuple([(index // stride) % len(values)
+                      for values, stride in zip(self.values, self.__strides)])
+
+    def index(self, parameters):
+        """
+        Return the row index of argument values.
+
+        arguments:
+            parameters : tuple of values, or dictionary
+                the argument values in header order, or a dictionary of
+                argument names to values
+
+        returns:
+            the row index
+
+        raises:
+            ValueError if a value is not a value of its argument, or 
+            KeyError if an argument is missing from the dictionary
+        """
+
+        index = 0
+        for k, v, positions, stride in zip(self.header, 
+                                           self.__arguments(parameters), 
+                                           self.__positions, self.__strides):
+            if v not in positions:
+                raise ValueError("{0} is not a value of \"{1}\".".format(
+                    v, k))
+            index = index + positions[v] * stride
+        return index
+
+    def filename(self, parameters):
+        """
+        Return the file of argument values, from the name pattern. The 
+        values do not need to be values of the arguments.
+
+        arguments:
+            parameters : tuple of values, or dictionary
+                the argument values in header order, or a dictionary of
+                argument names to values
+
+        returns:
+            the relative path of the file
+        """
+
+        kv = {k: v for k, v in zip(self.header, 
+                                   self.__arguments(parameters))}
+        return self.name_pattern.format(**kv)
+
+def get_accessor(db_path, json_path=SPEC_A_JSON_FILENAME, filters=None):
+    """
+    Return a random access Accessor to the rows of a Spec A database, 
+    assuming a valid Spec A database. Does not validate that it is a 
+    proper Spec A database. Unlike get_iterator, the number of rows, the
+    row of an index, and the index of a row are calculated without 
+    enumerating the rows.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        json_path : string = SPEC_A_JSON_FILENAME
+            POSIX relative path to Cinema JSON 
+        filters : dictionary = None
+            argument filters (see filter_dictionary), if only some of the 
+            rows are wanted. the rows are indexed within the selection
+
+    returns:
+        an Accessor if the json_path file can be opened, otherwise None
+    """
+
+    db = get_dictionary(db_path, json_path)
+    if db == None:
+        return None
+
+    try:
+        if filters is not None:
+            db = filter_dictionary(db, filters)
+        return Accessor(db)
     except:
         return None
 
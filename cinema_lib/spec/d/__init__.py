@@ -9,6 +9,18 @@ import csv
 from functools import reduce
 import hashlib
 import time
+import io
+import tempfile
+import shutil
+import stat
+import contextlib
+import struct
+import json
+import glob
+import itertools
+import collections
+from ... import profile
+from ... import progress
 
 SPEC_D_CSV_FILENAME = "data.csv"
 FILE_HEADER_KEYWORD = "FILE"
@@ -26,6 +38,18 @@ SQLITE3_TO_CDB = {
     "REAL": TYPE_FLOAT,
     "TEXT": TYPE_STRING
     }
+BUFFER_SIZE = 1 << 20
+SIDECAR_EXT = ".columns"
+SIDECAR_MANIFEST = "columns.json"
+SIDECAR_KEY_COLUMNS = "columns"
+SIDECAR_KEY_NAME = "name"
+SIDECAR_KEY_FILE = "file"
+SIDECAR_KEY_ROWS = "rows"
+SIDECAR_LENGTH = struct.Struct("<i")
+SIDECAR_NULL = -1
+JOURNAL_EXT = ".journal"
+CHECKPOINT_ROWS = 100
+CATALOG_EXT = ".catalog.json"
 
 def __row_generator(f, strict=False):
     row = [] 
@@ -122,13 +146,16 @@ def __row_generator(f, strict=False):
             row.append(None) if len(column) == 0 and not any_quotes else row.append(column)
         yield row
 
-def get_iterator(db_path, csv_path=SPEC_D_CSV_FILENAME, strict=False):
+def get_iterator(db_path, csv_path=SPEC_D_CSV_FILENAME, strict=False,
+                 sidecar=True):
     """
     Return a row iterator, assuming a valid Spec D database. Does
     not validate that it is a proper Spec D database, unless *strict*
     is *True*. The CSV file must adhere to RFC-4180 for proper 
     interpretation. If *strict* is True, it will raise an Exception on 
-    parsing errors.
+    parsing errors. If the database has sidecar columns (see
+    add_sidecar_columns_by_row_data), they are joined into the rows,
+    unless *sidecar* is False.
 
     arguments:
         db_path : string
@@ -138,6 +165,8 @@ def get_iterator(db_path, csv_path=SPEC_D_CSV_FILENAME, strict=False):
         strict : boolean = False
             enable strict checking mode, and raise an error if it
             does not match RFC-4180
+        sidecar : boolean = True
+            join the sidecar columns, if there are any
 
     returns:
         an iterator that returns a tuple of data per row if the csv_path 
@@ -162,10 +191,555 @@ def get_iterator(db_path, csv_path=SPEC_D_CSV_FILENAME, strict=False):
             with open(fn, "r", encoding="utf-8") as f:
                 for row in __row_generator(f, strict):
                     yield tuple(row)
-        return __wrapped(fn)
+        if sidecar:
+            return __join_sidecar(__wrapped(fn), db_path, csv_path)
+        else:
+            return __wrapped(fn)
     else:
         return None
 
+def get_chunks(db_path, n_chunks, csv_path=SPEC_D_CSV_FILENAME):
+    """
+    Split the rows of the CSV of a Spec D database into byte ranges that
+    can be read independently (get_chunk_iterator), i.e., by different
+    processes. The ranges start after the header and are split on line
+    boundaries, so values must not have quoted newlines.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        n_chunks : integer > 0
+            the maximum number of ranges
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        a tuple of (start, end) byte offsets, in order, covering all of
+        the rows, or None if the csv_path can not be opened
+    """
+
+    fn = os.path.join(db_path, csv_path)
+    if not os.path.isfile(fn):
+        return None
+    size = os.path.getsize(fn)
+    with open(fn, "rb") as f:
+        f.readline()
+        starts = [f.tell()]
+        for i in range(1, n_chunks):
+            offset = max(starts[-1], (size * i) // n_chunks)
+            if offset >= size:
+                break
+            f.seek(offset)
+            # move to the start of the next line
+            f.readline()
+            if f.tell() < size and f.tell() > starts[-1]:
+                starts.append(f.tell())
+    return tuple(zip(starts, starts[1:] + [size]))
+
+class __BoundedReader(io.RawIOBase):
+    # a binary reader that stops after a number of bytes
+    def __init__(self, f, n):
+        self.f = f
+        self.n = n
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self.n <= 0:
+            return 0
+        view = memoryview(b)[:self.n]
+        n = self.f.readinto(view)
+        if n:
+            self.n -= n
+        return n
+
+def get_chunk_iterator(db_path, chunk, csv_path=SPEC_D_CSV_FILENAME,
+                       strict=False):
+    """
+    Return a row iterator over a byte range of the CSV of a Spec D
+    database, from get_chunks. The header is not returned, and the sidecar
+    columns are not joined.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        chunk : (integer, integer)
+            the (start, end) byte offsets of the rows
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        strict : boolean = False
+            enable strict checking mode, and raise an error if it
+            does not match RFC-4180
+
+    returns:
+        an iterator that returns a tuple of data per row
+
+    raises:
+        an exception during iteration if the file does not match the
+        RFC-4180 specification
+    """
+
+    fn = os.path.join(db_path, csv_path)
+    start, end = chunk
+    with open(fn, "rb", buffering=0) as raw:
+        raw.seek(start)
+        bounded = __BoundedReader(raw, end - start)
+        f = io.TextIOWrapper(io.BufferedReader(bounded, BUFFER_SIZE),
+                             encoding="utf-8")
+        for row in __row_generator(f, strict):
+            yield tuple(row)
+
+def __file_last_swizzle(header):
+    # index vector (permute) that moves the FILE columns last, in order
+    isnt_file = [not is_file_column(i) for i in header]
+    left = 0 # start of non files
+    right = sum(isnt_file) # start of files
+    swizzle = [0] * len(header)
+    for i in range(0, len(header)):
+        if isnt_file[i]:
+            swizzle[i] = left
+            left += 1
+        else:
+            swizzle[i] = right
+            right += 1
+    return swizzle
+
+def get_sidecar_path(db_path, csv_path=SPEC_D_CSV_FILENAME):
+    """
+    Return the path of the sidecar column directory of a Spec D CSV.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        the POSIX path of the directory, i.e., <db_path>/<csv_path>.columns
+    """
+
+    return os.path.join(db_path, csv_path + SIDECAR_EXT)
+
+def get_sidecar_manifest(db_path, csv_path=SPEC_D_CSV_FILENAME):
+    """
+    Return the manifest of the sidecar columns of a Spec D CSV. The 
+    manifest lists the columns, in order, as dictionaries with the 
+    SIDECAR_KEY_NAME header of the column, the SIDECAR_KEY_FILE that holds 
+    the column data (relative to the sidecar directory), and the number of
+    SIDECAR_KEY_ROWS in the file.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        the manifest dictionary, or None if there are no sidecar columns
+    """
+
+    fn = os.path.join(get_sidecar_path(db_path, csv_path), SIDECAR_MANIFEST)
+    if not os.path.isfile(fn):
+        return None
+    with open(fn, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_sidecar_manifest(db_path, manifest, csv_path=SPEC_D_CSV_FILENAME):
+    """
+    Atomically replace the manifest of the sidecar columns of a Spec D CSV
+    (see get_sidecar_manifest).
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        manifest : dictionary
+            the new manifest
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    side effects:
+        writes the manifest in the sidecar directory, which must exist
+    """
+
+    directory = get_sidecar_path(db_path, csv_path)
+    fd, tmp_fn = tempfile.mkstemp(prefix="." + SIDECAR_MANIFEST + ".",
+                                  suffix=".tmp", dir=directory)
+    with open(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    __replace(tmp_fn, os.path.join(directory, SIDECAR_MANIFEST))
+
+def sidecar_value(value):
+    """
+    Encode a value for a sidecar column file: a 32-bit little-endian
+    length followed by the UTF-8 bytes of the value, where the length is
+    SIDECAR_NULL for None.
+
+    arguments:
+        value : string or None
+            the value
+
+    returns:
+        the bytes of the value
+    """
+
+    if value is None:
+        return SIDECAR_LENGTH.pack(SIDECAR_NULL)
+    b = str(value).encode("utf-8")
+    return SIDECAR_LENGTH.pack(len(b)) + b
+
+def __sidecar_reader(fn):
+    # yields the values of a sidecar column file, in row order
+    size = SIDECAR_LENGTH.size
+    with open(fn, "rb", buffering=BUFFER_SIZE) as f:
+        length = f.read(size)
+        while len(length) == size:
+            n = SIDECAR_LENGTH.unpack(length)[0]
+            if n == SIDECAR_NULL:
+                yield None
+            else:
+                yield f.read(n).decode("utf-8")
+            length = f.read(size)
+
+def __join_sidecar(rows, db_path, csv_path):
+    manifest = get_sidecar_manifest(db_path, csv_path)
+    if manifest is None:
+        for row in rows:
+            yield row
+        return
+
+    try:
+        header = next(rows)
+    except StopIteration:
+        return
+
+    # skip columns that are already in the CSV (interrupted compaction)
+    columns = [c for c in manifest[SIDECAR_KEY_COLUMNS] 
+               if c[SIDECAR_KEY_NAME] not in header]
+    if len(columns) != len(manifest[SIDECAR_KEY_COLUMNS]):
+        log.warning("Ignoring sidecar columns that are in the CSV.")
+    directory = get_sidecar_path(db_path, csv_path)
+    readers = [__sidecar_reader(os.path.join(directory, c[SIDECAR_KEY_FILE]))
+               for c in columns]
+
+    # sidecar columns are placed like add_columns_by_row_data does
+    new_header = header + tuple([c[SIDECAR_KEY_NAME] for c in columns])
+    swizzle = __file_last_swizzle(new_header)
+    output_row = [None] * len(new_header)
+    def permute(row):
+        for i in range(0, len(row)):
+            output_row[swizzle[i]] = row[i]
+        return tuple(output_row)
+
+    yield permute(new_header)
+    for row in rows:
+        yield permute(row + tuple([next(r, None) for r in readers]))
+
+def add_sidecar_columns_by_row_data(db_path, column_names, row_function,
+                                    csv_path=SPEC_D_CSV_FILENAME, 
+                                    checkpoint=None, mask=None):
+    """
+    For every row in a Cinema database, it will evaluate *row_function*
+    on the database (passing the row data to the function), like 
+    add_columns_by_row_data, but the new column(s) are written to a
+    sidecar column store rather than rewriting the SPEC_D_CSV_FILENAME. 
+    The SPEC_D_CSV_FILENAME is only read.
+
+    The sidecar is a directory in the database (get_sidecar_path) with
+    one compact binary file per column, row aligned with the CSV, and a
+    manifest (get_sidecar_manifest). Each value is stored as a 32-bit
+    little-endian length followed by the UTF-8 bytes of the value, where
+    the length is SIDECAR_NULL for null/None. get_iterator joins the
+    sidecar columns into the rows, placing them where 
+    add_columns_by_row_data would, and compact folds them into a standard
+    Spec D CSV.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        column_names : tuple of strings
+            the header name(s) for the new column(s)
+        row_function : function(row: tuple of strings) => tuple of string
+            a function that takes a row tuple, and returns a tuple of strings
+            based on the row tuple. len of the return value must equal the 
+            len of column_names
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        checkpoint : integer = None
+            journal the results every *checkpoint* rows, so an interrupted
+            update can be resumed (see add_columns_by_row_data)
+        mask : sequence of booleans = None
+            only evaluate *row_function* for the selected rows (see 
+            add_columns_by_row_data)
+
+    returns:
+        the relative filenames of the new sidecar column files
+
+    raises:
+        an exception if the column names already exist
+
+    side effects:
+        writes the sidecar column files and updates the sidecar manifest
+    """
+
+    rows = get_iterator(db_path, csv_path)
+    header = next(rows)
+    if len(set(header + tuple(column_names))) != \
+       len(header) + len(column_names):
+        raise Exception("Column names are not unique: {0}.".format(
+            column_names))
+    rows = progress.iterate_csv(rows, "Adding columns {0}".format(
+                                list(column_names)),
+                                os.path.join(db_path, csv_path))
+
+    manifest = get_sidecar_manifest(db_path, csv_path)
+    if manifest is None:
+        manifest = {SIDECAR_KEY_COLUMNS: []}
+    directory = get_sidecar_path(db_path, csv_path)
+    os.makedirs(directory, exist_ok=True)
+
+    # write the new columns
+    start = len(manifest[SIDECAR_KEY_COLUMNS])
+    filenames = tuple([str(start + i) + ".col" 
+                       for i in range(0, len(column_names))])
+    files = [open(os.path.join(directory, fn), "wb", buffering=BUFFER_SIZE)
+             for fn in filenames]
+    n_rows = 0
+    nulls = (None,) * len(column_names)
+    try:
+        with __journaled(db_path, csv_path, column_names, row_function,
+                         checkpoint, mask) as function:
+            # time the stages of each row, if profiling
+            p = profile.get_profile()
+            if p is not None:
+                rows = p.timed_iterator(rows, profile.STAGE_PARSE)
+                function = p.timed(function, profile.STAGE_COMPUTE)
+            for row in rows:
+                if mask is None or mask[n_rows]:
+                    values = function(row)
+                else:
+                    values = nulls
+                if p is not None:
+                    p.begin(profile.STAGE_WRITE)
+                for f, v in zip(files, values):
+                    f.write(sidecar_value(v))
+                if p is not None:
+                    p.end()
+                    p.end_row()
+                n_rows = n_rows + 1
+        for f in files:
+            f.flush()
+            os.fsync(f.fileno())
+    except:
+        for f, fn in zip(files, filenames):
+            f.close()
+            os.unlink(os.path.join(directory, fn))
+        raise
+    for f in files:
+        f.close()
+
+    # add them to the manifest
+    for name, fn in zip(column_names, filenames):
+        manifest[SIDECAR_KEY_COLUMNS].append({SIDECAR_KEY_NAME: name,
+                                              SIDECAR_KEY_FILE: fn,
+                                              SIDECAR_KEY_ROWS: n_rows})
+    write_sidecar_manifest(db_path, manifest, csv_path)
+    if checkpoint:
+        os.unlink(get_journal_path(db_path, csv_path))
+
+    return filenames
+
+def compact(db_path, csv_path=SPEC_D_CSV_FILENAME):
+    """
+    Fold the sidecar columns of a Spec D database into a standard Spec D 
+    CSV, i.e., for export, and remove the sidecar. It will backup the 
+    old SPEC_D_CSV_FILENAME. 
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        the name of the backup (previous version) csv_path, or None if
+        there are no sidecar columns
+
+    side effects:
+        atomically writes a new csv_path (see add_columns_by_row_data)
+        and removes the sidecar directory
+    """
+
+    if get_sidecar_manifest(db_path, csv_path) is None:
+        return None
+    return add_columns_by_row_data(db_path, (), lambda row: (), csv_path)
+
+def load_columns(db_path, csv_path=SPEC_D_CSV_FILENAME, columns=None):
+    """
+    Load the columns of a Spec D database into memory, including the 
+    sidecar columns. Does not validate or type the values.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        columns : iterator of strings = None
+            the header names of the columns to load, or all of the 
+            columns if None
+
+    returns:
+        a tuple of (header, tuple of lists of values per column), where
+        header is the tuple of the loaded column names, or None if the 
+        csv_path can not be opened
+
+    raises:
+        an exception if a column is not in the database
+    """
+
+    rows = get_iterator(db_path, csv_path)
+    if rows is None:
+        return None
+    header = next(rows)
+    if columns is None:
+        indices = tuple(range(0, len(header)))
+    else:
+        indices = tuple([header.index(c) for c in columns])
+    values = tuple([[] for i in indices])
+    appends = [v.append for v in values]
+    for row in rows:
+        for i, append in zip(indices, appends):
+            append(row[i] if i < len(row) else None)
+    return (tuple([header[i] for i in indices]), values)
+
+def get_catalog_path(db_path, csv_path=SPEC_D_CSV_FILENAME):
+    """
+    Return the path of the catalog of a Spec D CSV (see get_catalog).
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        the POSIX path of the catalog, i.e., <db_path>/<csv_path>.catalog.json
+    """
+
+    return os.path.join(db_path, csv_path + CATALOG_EXT)
+
+def __catalog_signature(db_path, csv_path):
+    # a catalog is only valid for the same rows
+    stat = os.stat(os.path.join(db_path, csv_path))
+    return {"size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sidecar": get_sidecar_manifest(db_path, csv_path)}
+
+def __catalog_column(name, counts):
+    # the typed, sorted, distinct values of a column, merging values that
+    # are the same number, i.e., "1" and "1.0"
+    nulls = counts.pop(None, 0)
+    for t, parse in ((TYPE_INTEGER, int), (TYPE_FLOAT, float)):
+        try:
+            typed = collections.Counter()
+            nans = 0
+            for v, n in counts.items():
+                x = parse(v)
+                if x != x:
+                    # NaN is null, if the column is numeric
+                    nans += n
+                else:
+                    typed[x] += n
+            nulls += nans
+            break
+        except ValueError:
+            pass
+    else:
+        t = TYPE_STRING
+        typed = counts
+    if len(typed) == 0:
+        t = TYPE_EMPTY
+    values = sorted(typed)
+    return {"name": name, "type": t, "values": values,
+            "counts": [typed[v] for v in values], "nulls": nulls}
+
+def get_catalog(db_path, csv_path=SPEC_D_CSV_FILENAME):
+    """
+    Return the catalog of a Spec D database: the distinct values of every
+    non-FILE column (including the sidecar columns), sorted and typed, with
+    the number of rows that have each value, i.e., for building sliders.
+    The catalog is computed in one pass over the rows, and stored next to
+    the CSV (get_catalog_path). It is reused, without reading the rows,
+    until the size or modification time of the CSV or the sidecar columns 
+    change.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        a dictionary, or None if the csv_path can not be opened:
+
+        {"rows": <number of rows>,
+         "columns": [{"name": <column name>,
+                      "type": TYPE_INTEGER, TYPE_FLOAT, TYPE_STRING, or 
+                              TYPE_EMPTY,
+                      "values": [<sorted distinct values>],
+                      "counts": [<number of rows per value>],
+                      "nulls": <number of rows without a value (or NaN)>
+                     }, ...]}
+
+    side effects:
+        writes <csv_path>.catalog.json, if it is missing or stale and the 
+        database is writable
+    """
+
+    fn = os.path.join(db_path, csv_path)
+    if not os.path.isfile(fn):
+        return None
+    signature = __catalog_signature(db_path, csv_path)
+
+    # reuse a fresh catalog
+    catalog_fn = get_catalog_path(db_path, csv_path)
+    try:
+        with open(catalog_fn, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+        if catalog.get("signature") == signature:
+            del(catalog["signature"])
+            return catalog
+    except (OSError, ValueError):
+        pass
+
+    # count the values of the non-FILE columns
+    rows = get_iterator(db_path, csv_path)
+    header = next(rows)
+    indices = tuple([i for i in range(0, len(header)) 
+                     if not is_file_column(header[i])])
+    counters = [collections.Counter() for i in indices]
+    n_rows = 0
+    for row in rows:
+        n_rows += 1
+        for i, c in zip(indices, counters):
+            c[row[i] if i < len(row) else None] += 1
+    catalog = {"rows": n_rows,
+               "columns": [__catalog_column(header[i], c)
+                           for i, c in zip(indices, counters)]}
+
+    # store it
+    try:
+        with __temporary_csv(db_path, csv_path + CATALOG_EXT) as (f, tmp_fn):
+            json.dump(dict(catalog, signature=signature), f)
+        __replace(tmp_fn, catalog_fn)
+    except OSError as e:
+        log.warning("Unable to write catalog \"{0}\": {1}.".format(
+            catalog_fn, e))
+
+    return catalog
+
 def typecheck(values, nans=[]):
     """
     Return a tuple of Spec D types given an iterator of strings.
@@ -378,6 +952,9 @@ def check_database(db_path, csv_path=SPEC_D_CSV_FILENAME, quick=False):
             # reopen the reader because we are lazy and skip the header
             reader = get_iterator(db_path, csv_path, True)
             next(reader)
+            reader = progress.iterate_csv(reader,
+                "Checking \"{0}\"".format(db_path),
+                os.path.join(db_path, csv_path))
 
             row_error = False
             n_rows = 1
@@ -451,7 +1028,325 @@ def check_database(db_path, csv_path=SPEC_D_CSV_FILENAME, quick=False):
     log.info("Check succeeded.")
     return True
 
-def get_sqlite3(db_path, csv_path=SPEC_D_CSV_FILENAME, where=":memory:"):
+class Writer:
+    """
+    Append rows to the CSV of a Spec D database, i.e., from a running
+    simulation. The header is validated once, and each row is type
+    checked against the types of the columns established by the first
+    non-null values, with a check compiled per column, so the rows are
+    valid for check_database. The rows are buffered, and written as whole
+    rows, while the writer has an exclusive lock (flock) on the CSV.
+
+        with d.Writer(db_path, ("time", "pressure", "FILE")) as w:
+            for t in range(0, n):
+                w.write((t, p[t], "{0}.png".format(t)))
+                if t % 1000 == 0:
+                    w.sync()
+
+    attributes:
+        db_path : string
+            POSIX path to the Cinema database
+        csv_path : string
+            POSIX relative path to the Cinema CSV
+        header : tuple of strings
+            the column identifiers
+        types : list of types
+            the type of each column (TYPE_INTEGER, TYPE_FLOAT,
+            TYPE_STRING, or TYPE_EMPTY if there has not been a value yet)
+        rows : integer
+            the number of rows written by this writer
+    """
+
+    def __init__(self, db_path, header=None, csv_path=SPEC_D_CSV_FILENAME,
+                 buffer_size=BUFFER_SIZE, lock=True):
+        """
+        Open a Spec D CSV for appending, creating it if it doesn't exist.
+        If the CSV ends with an incomplete row, i.e., a writer crashed,
+        the incomplete row is removed.
+
+        arguments:
+            db_path : string
+                POSIX path to Cinema database, which is created if it
+                doesn't exist
+            header : iterator of strings = None
+                the column identifiers of a new CSV. if the CSV exists, it
+                must be the same as its header, or None
+            csv_path : string = SPEC_D_CSV_FILENAME
+                POSIX relative path to Cinema CSV
+            buffer_size : integer = BUFFER_SIZE
+                the number of characters that are buffered before they
+                are written
+            lock : boolean = True
+                take an exclusive lock on the CSV until the writer is
+                closed, so that writers (and other processes using flock)
+                wait for each other
+
+        raises:
+            ValueError if the header is invalid, or is different than the
+            header of the existing CSV, or there is no header for a new
+            CSV
+        """
+
+        self.db_path = db_path
+        self.csv_path = csv_path
+        self.rows = 0
+        self.__buffer_size = buffer_size
+        fn = os.path.join(db_path, csv_path)
+        os.makedirs(os.path.dirname(fn) or ".", exist_ok=True)
+        self.__f = open(fn, "a+b", buffering=0)
+        try:
+            if lock:
+                try:
+                    import fcntl
+                    fcntl.flock(self.__f.fileno(), fcntl.LOCK_EX)
+                except ImportError:
+                    log.warning("Unable to lock \"{0}\", there is no "
+                                "fcntl.".format(fn))
+            self.__open(fn, header)
+        except:
+            self.__f.close()
+            raise
+        self.__buffer = io.StringIO()
+        self.__writer = csv.writer(self.__buffer, lineterminator="\n")
+        self.__established = []
+        self.__checks = [self.__compile(i) for i in range(0, len(self.types))]
+
+    def __open(self, fn, header):
+        # validate the header, and establish the types of an existing CSV
+        size = os.fstat(self.__f.fileno()).st_size
+        if size > 0:
+            # remove an incomplete last row
+            self.__f.seek(max(0, size - BUFFER_SIZE))
+            tail = self.__f.read()
+            if not tail.endswith(b"\n"):
+                end = tail.rfind(b"\n")
+                if end < 0 and size > len(tail):
+                    raise ValueError("\"{0}\" has a row longer than {1} "
+                                     "bytes.".format(fn, BUFFER_SIZE))
+                end = size - len(tail) + end + 1
+                log.warning("Removing an incomplete row at the end of "
+                            "\"{0}\".".format(fn))
+                self.__f.truncate(end)
+                size = end
+        if size == 0:
+            if header is None:
+                raise ValueError("\"{0}\" needs a header.".format(fn))
+            self.header = self.__check_header(header)
+            self.types = [TYPE_EMPTY] * len(self.header)
+            line = io.StringIO()
+            csv.writer(line, lineterminator="\n").writerow(self.header)
+            self.__f.write(line.getvalue().encode("utf-8"))
+            return
+
+        rows = get_iterator(self.db_path, self.csv_path, sidecar=False)
+        existing = next(rows)
+        if header is not None and tuple(header) != existing:
+            raise ValueError("The header {0} is not the header of \"{1}\", "
+                             "{2}.".format(list(header), fn, list(existing)))
+        self.header = existing
+        # the types of the existing rows, which have been checked
+        self.types = [TYPE_EMPTY] * len(self.header)
+        for row in rows:
+            self.types = typematch(row, self.types)[3]
+            if TYPE_EMPTY not in self.types:
+                break
+        del(rows)
+
+    def __check_header(self, header):
+        # the same checks as check_database
+        header = tuple([str(h) for h in header])
+        if len(header) == 0:
+            raise ValueError("The header has no columns.")
+        if len(set(header)) != len(header):
+            raise ValueError("Header identifiers are not unique: "
+                             "{0}.".format(list(header)))
+        if not all([t == TYPE_STRING for t in typecheck(header)]):
+            raise ValueError("Header identifiers are not all strings: "
+                             "{0}.".format(list(header)))
+        if any([h != h.strip() for h in header]):
+            raise ValueError("Header identifiers have whitespace: "
+                             "{0}.".format(list(header)))
+        files = file_columns(header)
+        if len(files) > 0 and files != list(range(len(header) - len(files),
+                                                  len(header))):
+            raise ValueError("FILE columns are not the last columns: "
+                             "{0}.".format(list(header)))
+        return header
+
+    def __compile(self, i):
+        # a function that converts a value of column i to a string, or
+        # raises ValueError if it isn't the type of the column (typematch)
+        t = self.types[i]
+        name = self.header[i]
+
+        def mismatch(v):
+            raise ValueError("\"{0}\" is not {1} for column \"{2}\" on row "
+                             "{3}.".format(v, t, name, self.rows + 1))
+
+        def is_integer(s):
+            try:
+                int(s)
+                return True
+            except ValueError:
+                return False
+
+        def is_float(s):
+            try:
+                float(s)
+                return True
+            except ValueError:
+                return False
+
+        # the characters of numbers, including infinity and nan
+        numeric = "0123456789+-._eE \t\n\r\x0b\x0ciInNfFtTyYaA"
+
+        def is_ascii(s):
+            try:
+                s.encode("ascii")
+                return True
+            except UnicodeEncodeError:
+                return False
+        # str.isascii is Python 3.7 or later
+        is_ascii = getattr(str, "isascii", is_ascii)
+
+        if t == TYPE_INTEGER:
+            def check(v):
+                if type(v) is int or v is None:
+                    return v
+                s = str(v)
+                if len(s) == 0:
+                    # an empty value is null
+                    return None
+                return s if is_integer(s) else mismatch(s)
+        elif t == TYPE_FLOAT:
+            def check(v):
+                if type(v) is float or v is None:
+                    return v
+                s = str(v)
+                if len(s) == 0:
+                    return None
+                return s if not is_integer(s) and is_float(s) \
+                       else mismatch(s)
+        elif t == TYPE_STRING:
+            def check(v):
+                # strings that can't be numbers, without parsing them
+                if type(v) is str and is_ascii(v) and v.strip(numeric):
+                    return v
+                if v is None:
+                    return v
+                s = str(v)
+                if len(s) == 0:
+                    return None
+                return s if s.lower() == "nan" or \
+                       not (is_integer(s) or is_float(s)) else mismatch(s)
+        else:
+            def check(v):
+                # the first value establishes the type of the column
+                s = None if v is None else str(v)
+                if s is None or len(s) == 0:
+                    return None
+                self.__established.append((i, typecheck((s,))[0]))
+                return s
+        return check
+
+    def write(self, row):
+        """
+        Write a row. The values are converted to strings with str, and
+        None (or an empty string) is null.
+
+        arguments:
+            row : iterator of values
+                a value for each column
+
+        raises:
+            ValueError if the row does not have a value for each column,
+            or a value does not match the type of its column
+
+        side effects:
+            buffers the row, and writes the buffer if it is full
+        """
+
+        if not isinstance(row, (tuple, list)):
+            row = tuple(row)
+        if len(row) != len(self.header):
+            raise ValueError("Row {0} has {1} values, but there are {2} "
+                             "columns.".format(self.rows + 1, len(row),
+                                               len(self.header)))
+        try:
+            values = [c(v) for c, v in zip(self.__checks, row)]
+        finally:
+            established = self.__established
+            self.__established = []
+        self.__writer.writerow(values)
+        self.rows += 1
+        # the types of the columns that had their first values
+        for i, t in established:
+            self.types[i] = t
+            self.__checks[i] = self.__compile(i)
+        if self.__buffer.tell() >= self.__buffer_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        """
+        Write rows (see write).
+
+        arguments:
+            rows : iterator of iterators of values
+
+        returns:
+            the number of rows written
+        """
+
+        n = self.rows
+        for row in rows:
+            self.write(row)
+        return self.rows - n
+
+    def flush(self):
+        """
+        Write the buffered rows to the CSV, so that readers can see them.
+
+        side effects:
+            writes to the CSV
+        """
+
+        if self.__buffer.tell() > 0:
+            self.__f.write(self.__buffer.getvalue().encode("utf-8"))
+            self.__buffer.seek(0)
+            self.__buffer.truncate()
+
+    def sync(self):
+        """
+        Write the buffered rows to the CSV, and sync it to disk, so that
+        the rows are durable.
+
+        side effects:
+            writes to the CSV
+        """
+
+        self.flush()
+        os.fsync(self.__f.fileno())
+
+    def close(self):
+        """
+        Sync the rows to disk (see sync), and release the lock.
+        """
+
+        if self.__f.closed:
+            return
+        try:
+            self.sync()
+        finally:
+            self.__f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def get_sqlite3(db_path, csv_path=SPEC_D_CSV_FILENAME, where=":memory:",
+                mask=None):
     """
     Returns a SQLite3 database that backs a Spec D database. Does not check 
     that the database is valid. By default, will open an in-memory SQLite3,
@@ -465,6 +1360,9 @@ def get_sqlite3(db_path, csv_path=SPEC_D_CSV_FILENAME, where=":memory:"):
         where : string = ":memory:"
             where to back the SQLite3 on disk; ":memory:" is temporary in 
             memory
+        mask : sequence of booleans = None
+            if not None, only the rows where mask[row index] is True are 
+            inserted (see add_columns_by_row_data)
             
     returns:
         a SQLite3 database if successful, None if not. The table that
@@ -495,6 +1393,13 @@ def get_sqlite3(db_path, csv_path=SPEC_D_CSV_FILENAME, where=":memory:"):
 
         # get the header and first row
         header = next(cdb)
+        label = "Converting \"{0}\" to SQLite".format(db_path)
+        if mask is not None:
+            cdb = progress.iterate(itertools.compress(cdb, mask), label,
+                                   lambda: sum([1 for m in mask if m]))
+        else:
+            cdb = progress.iterate_csv(cdb, label,
+                                       os.path.join(db_path, csv_path))
         log.info("Header is {0}.".format(header))
         first = next(cdb)
         log.info("First row is {0}.".format(first))
@@ -529,6 +1434,33 @@ def get_sqlite3(db_path, csv_path=SPEC_D_CSV_FILENAME, where=":memory:"):
         log.error("Error in creating database: {0}.".format(e))
         return None
 
+def hash_file(fn, h=None):
+    """
+    Calculate the MD5 hash of a file, reading it in binary mode with 
+    BUFFER_SIZE reads.
+
+    arguments:
+        fn : string
+            POSIX path to the file
+        h : hashlib hash = None
+            the hash to update, a new MD5 hash if None
+
+    returns:
+        the hex digest of the hash
+    """
+
+    if h is None:
+        h = hashlib.md5()
+    with open(fn, "rb", buffering=0) as f:
+        block = f.read(BUFFER_SIZE)
+        while len(block) > 0:
+            h.update(block)
+            block = f.read(BUFFER_SIZE)
+    return h.hexdigest()
+
+def __backup_name(csv_path, digest):
+    return csv_path + '.' + str(int(time.time())) + '.' + digest
+
 def move_to_backup(db_path, csv_path=SPEC_D_CSV_FILENAME):
     """
     Rename the CSV in a Spec D database to a backup name.
@@ -546,31 +1478,311 @@ def move_to_backup(db_path, csv_path=SPEC_D_CSV_FILENAME):
         renames old csv_path to csv_path.<epoch timestamp>.<md5 hash>
     """
 
-    # calculate the hash and time stamp
-    h = hashlib.md5()
-    with open(os.path.join(db_path, csv_path)) as f:
-        line = f.read(4096)
-        while line != '':
-            h.update(line.encode('utf-8'))
-            line = f.read(4096)
-        h = h.hexdigest()
-    t = int(time.time())
-
     # get the paths
     full_fn = os.path.join(db_path, csv_path)
-    backup = csv_path + '.' + str(t) + '.' + h
+    backup = __backup_name(csv_path, hash_file(full_fn))
     full_backup = os.path.join(db_path, backup) 
     os.rename(full_fn, full_backup)
 
     return backup
 
+def link_to_backup(db_path, csv_path=SPEC_D_CSV_FILENAME, digest=None):
+    """
+    Make a backup of the CSV in a Spec D database, without copying it if
+    possible. The backup is a hard link to the CSV, so the data is not 
+    copied, and when the CSV is replaced (renamed over) the backup keeps
+    the old version. If the file system does not support hard links, it
+    copies the CSV.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        digest : string = None
+            the MD5 hex digest of the CSV, if it is already known, i.e., 
+            calculated while reading the CSV. it is calculated if None
+
+    returns:
+        the relative filename of the backup of csv_path
+
+    side effects:
+        creates csv_path.<epoch timestamp>.<md5 hash>
+    """
+
+    full_fn = os.path.join(db_path, csv_path)
+    if digest is None:
+        digest = hash_file(full_fn)
+    backup = __backup_name(csv_path, digest)
+    full_backup = os.path.join(db_path, backup)
+    try:
+        os.link(full_fn, full_backup)
+    except FileExistsError:
+        # same second and same hash, so it is the same backup
+        pass
+    except OSError as e:
+        log.info("Unable to hard link backup, copying: {0}.".format(e))
+        shutil.copy2(full_fn, full_backup)
+
+    return backup
+
+def __temporary_csvs(db_path, csv_path):
+    # the temporary files of __temporary_csv
+    full_fn = os.path.join(db_path, csv_path)
+    return glob.glob(os.path.join(os.path.dirname(full_fn),
+        glob.escape("." + os.path.basename(full_fn)) + ".*.tmp"))
+
+@contextlib.contextmanager
+def __temporary_csv(db_path, csv_path):
+    # write to a temporary file next to csv_path, so it can be renamed
+    full_fn = os.path.join(db_path, csv_path)
+    fd, tmp_fn = tempfile.mkstemp(prefix="." + os.path.basename(full_fn) + ".",
+                                  suffix=".tmp", 
+                                  dir=os.path.dirname(full_fn) or ".")
+    try:
+        with open(fd, "w", encoding="utf-8", buffering=BUFFER_SIZE) as f:
+            yield f, tmp_fn
+            f.flush()
+            os.fsync(f.fileno())
+    except:
+        os.unlink(tmp_fn)
+        raise
+
+def get_file_mode(fn):
+    """
+    Return the permissions of a file, or the permissions of a new file
+    (0o666 without the umask) if it doesn't exist. Files that are
+    replaced by renaming a temporary file (from tempfile.mkstemp, which
+    is only readable by the owner) are given these permissions.
+
+    arguments:
+        fn : string
+            POSIX path to the file
+
+    returns:
+        an integer, the permission bits
+    """
+
+    try:
+        return stat.S_IMODE(os.stat(fn).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+def __replace(tmp_fn, full_fn):
+    os.chmod(tmp_fn, get_file_mode(full_fn))
+    os.replace(tmp_fn, full_fn)
+    # make the rename durable, where directories can be synced
+    try:
+        fd = os.open(os.path.dirname(full_fn) or ".", os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+def replace_csv(db_path, write, csv_path=SPEC_D_CSV_FILENAME, digest=None):
+    """
+    Atomically update the CSV in a Spec D database. The new CSV is written
+    to a temporary file in the same directory, synced to disk, the old CSV
+    is backed up with link_to_backup, and then the temporary file is
+    renamed over the old CSV. The CSV is never missing or partially 
+    written, even if the update is interrupted.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        write : function(f : file) => string or None
+            a function that writes the new CSV to a text file f. it may 
+            return the MD5 hex digest of the old CSV, if it read it 
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        digest : string = None
+            the MD5 hex digest of the old CSV, if it is already known
+
+    returns:
+        the relative filename of the backup of the old csv_path, or None
+        if there was no old csv_path
+
+    side effects:
+        writes a new csv_path and creates csv_path.<epoch timestamp>.<md5
+        hash> that is the old csv_path
+    """
+
+    full_fn = os.path.join(db_path, csv_path)
+    with __temporary_csv(db_path, csv_path) as (f, tmp_fn):
+        written = write(f)
+    if written is not None:
+        digest = written
+
+    backup = None
+    try:
+        if os.path.isfile(full_fn):
+            backup = link_to_backup(db_path, csv_path, digest)
+        __replace(tmp_fn, full_fn)
+    except:
+        os.unlink(tmp_fn)
+        raise
+
+    return backup
+
+def get_journal_path(db_path, csv_path=SPEC_D_CSV_FILENAME):
+    """
+    Return the path of the checkpoint journal of a Spec D CSV.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        the POSIX path of the journal, i.e., <db_path>/<csv_path>.journal
+    """
+
+    return os.path.join(db_path, csv_path + JOURNAL_EXT)
+
+def __journal_signature(db_path, csv_path, column_names, mask):
+    # a journal is only valid for the same new columns of the same rows
+    stat = os.stat(os.path.join(db_path, csv_path))
+    return {"columns": list(column_names), 
+            "size": stat.st_size, 
+            "mtime": stat.st_mtime_ns,
+            "sidecar": get_sidecar_manifest(db_path, csv_path),
+            "mask": None if mask is None else 
+                    hashlib.md5(bytes([1 if m else 0 for m in mask])).
+                    hexdigest()}
+
+def __resume_journal(fn, signature):
+    # returns the byte offsets (start, end) of the complete entries of a
+    # journal, truncating a partially written entry, or None if there
+    # isn't a journal for the signature
+    if not os.path.isfile(fn):
+        return None
+    with open(fn, "r+b") as f:
+        try:
+            if json.loads(f.readline().decode("utf-8")) != signature:
+                log.warning("Discarding journal \"{0}\" for different "
+                            "data or columns.".format(fn))
+                return None
+        except ValueError:
+            return None
+        start = f.tell()
+        end = start
+        line = f.readline()
+        while line.endswith(b"\n"):
+            try:
+                json.loads(line.decode("utf-8"))
+            except ValueError:
+                break
+            end = f.tell()
+            line = f.readline()
+        if end != f.tell():
+            log.warning("Truncating incomplete journal entry.")
+            f.truncate(end)
+    return (start, end)
+
+def __journal_entries(fn, start, end):
+    # yields the (row index, values) of the complete entries of a journal
+    with open(fn, "rb", buffering=BUFFER_SIZE) as f:
+        f.seek(start)
+        while f.tell() < end:
+            index, values = json.loads(f.readline().decode("utf-8"))
+            yield (index, tuple(values))
+
+@contextlib.contextmanager
+def __journaled(db_path, csv_path, column_names, row_function, checkpoint,
+                mask=None):
+    # wraps a row function so its results are written to the journal,
+    # and results that are in the journal are not calculated again. with 
+    # a mask, the journal is indexed by the selected rows
+    if not checkpoint:
+        yield row_function
+        return
+
+    fn = get_journal_path(db_path, csv_path)
+    signature = __journal_signature(db_path, csv_path, column_names, mask)
+    offsets = __resume_journal(fn, signature)
+    if offsets is None:
+        with open(fn, "wb") as f:
+            f.write((json.dumps(signature) + "\n").encode("utf-8"))
+        entries = __journal_entries(fn, 0, 0)
+    else:
+        log.info("Resuming from journal \"{0}\".".format(fn))
+        entries = __journal_entries(fn, offsets[0], offsets[1])
+
+    journal = open(fn, "ab", buffering=BUFFER_SIZE)
+    state = {"index": 0, "pending": 0, "entry": next(entries, None)}
+    def __row_function(row):
+        index = state["index"]
+        state["index"] = index + 1
+        entry = state["entry"]
+        while entry is not None and entry[0] < index:
+            entry = next(entries, None)
+        state["entry"] = entry
+        if entry is not None and entry[0] == index:
+            return entry[1]
+
+        values = tuple([None if v is None else str(v) 
+                        for v in row_function(row)])
+        journal.write((json.dumps([index, values]) + "\n").encode("utf-8"))
+        state["pending"] = state["pending"] + 1
+        if state["pending"] >= checkpoint:
+            journal.flush()
+            os.fsync(journal.fileno())
+            state["pending"] = 0
+        return values
+
+    try:
+        yield __row_function
+    finally:
+        journal.flush()
+        os.fsync(journal.fileno())
+        journal.close()
+        entries.close()
+
+class __HashedReader(io.RawIOBase):
+    # a binary reader that hashes the bytes as they are read
+    def __init__(self, f, h):
+        self.f = f
+        self.h = h
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.f.readinto(b)
+        if n:
+            self.h.update(memoryview(b)[:n])
+        return n
+
+def __hashed_iterator(fn, h, strict=False):
+    # read the rows of a CSV and update the hash h with the bytes in 
+    # the same pass
+    with open(fn, "rb", buffering=0) as raw:
+        hashed = __HashedReader(raw, h)
+        f = io.TextIOWrapper(io.BufferedReader(hashed, BUFFER_SIZE),
+                             encoding="utf-8")
+        for row in __row_generator(f, strict):
+            yield tuple(row)
+        # hash anything that hasn't been read
+        block = raw.read(BUFFER_SIZE)
+        while len(block) > 0:
+            h.update(block)
+            block = raw.read(BUFFER_SIZE)
+
 def add_columns_by_row_data(db_path, column_names, row_function, 
-                           csv_path=SPEC_D_CSV_FILENAME):
+                           csv_path=SPEC_D_CSV_FILENAME, checkpoint=None,
+                           rows=None, mask=None):
     """
     For every row in a Cinema database, it will evaluate *row_function*
     on the database (passing the row data to the function). This adds new
     column(s) to the database, by writing a new SPEC_D_CSV_FILENAME. 
-    It will backup the old SPEC_D_CSV_FILENAME.
+    It will backup the old SPEC_D_CSV_FILENAME. Sidecar columns, if there 
+    are any, are passed to the function and folded into the new 
+    SPEC_D_CSV_FILENAME.
 
     arguments:
         db_path : string
@@ -586,25 +1798,65 @@ def add_columns_by_row_data(db_path, column_names, row_function,
             equal the len of column_names
         csv_path : string = SPEC_D_CSV_FILENAME
             POSIX relative path to Cinema CSV
+        checkpoint : integer = None
+            if not None or 0, the results of *row_function* are written to 
+            a journal (get_journal_path) keyed by row index, and the journal 
+            is flushed to disk every *checkpoint* rows. if the update is 
+            interrupted, calling it again with the same column names on the
+            same data resumes from the journal, only evaluating 
+            *row_function* for the rows that are not in the journal
+        rows : iterator of tuples of strings = None
+            if not None, the rows (header first) to read instead of 
+            csv_path, i.e., a virtual Spec D database of a Spec A database.
+            csv_path is created, or replaced, with the rows and the new 
+            columns. the rows can not be checkpointed
+        mask : sequence of booleans = None
+            if not None, *row_function* is only evaluated for the rows 
+            where mask[row index] is True (the row index does not count 
+            the header), and the new columns are null/None in the other 
+            rows, i.e., a selection from spec.d.table.where
 
     returns:
-        the name of the backup (previous version) csv_path
+        the name of the backup (previous version) csv_path, or None if 
+        there was no csv_path
+
+    raises:
+        an exception if the column names are not unique, or already exist
 
     side effects:
-        writes a new csv_path and will rename the old csv_path to 
-        csv_path.<epoch timestamp>.<md5 hash>
-    """
+        atomically writes a new csv_path and will keep the old csv_path as
+        csv_path.<epoch timestamp>.<md5 hash> (see replace_csv)
 
-    # create a backup
-    backup = move_to_backup(db_path, csv_path)
-    full_fn = os.path.join(db_path, csv_path)
+        removes the sidecar directory, if there is one, and the journal
+        when the update is complete
+    """
 
-    # get the data from the backup
-    rows = get_iterator(db_path, backup) 
-    header = next(rows)
+    if rows is None:
+        # read the old data and hash it in the same pass
+        full_fn = os.path.join(db_path, csv_path)
+        h = hashlib.md5()
+        rows = __join_sidecar(__hashed_iterator(full_fn, h), db_path, 
+                              csv_path)
+        digest = h.hexdigest
+        has_sidecar = get_sidecar_manifest(db_path, csv_path) is not None
+        header = next(rows)
+        rows = progress.iterate_csv(rows, "Adding columns {0}".format(
+                                    list(column_names)), full_fn)
+    else:
+        if checkpoint:
+            log.warning("Not checkpointing rows that are not in a CSV.")
+            checkpoint = None
+        digest = lambda: None
+        has_sidecar = False
+        header = next(rows)
+        rows = progress.iterate(rows, "Adding columns {0}".format(
+                                list(column_names)))
 
     # output data
-    new_header = header + column_names
+    new_header = header + tuple(column_names)
+    if len(set(new_header)) != len(new_header):
+        raise Exception("Column names are not unique: {0}.".format(
+            column_names))
     output_row = [None] * len(new_header)
 
     # calculate where to put the new columns
@@ -627,13 +1879,44 @@ def add_columns_by_row_data(db_path, column_names, row_function,
         writer.writerow(output_row)
 
     # write the new column data
-    with open(full_fn, "w") as out:
+    def write(out):
         writer = csv.writer(out)
         # write the new header
         write_row(writer, new_header)
         # write the new rows
-        for row in rows:
-            write_row(writer, row + row_function(row))
+        nulls = (None,) * len(column_names)
+        with __journaled(db_path, csv_path, column_names, row_function,
+                         checkpoint, mask) as function:
+            # time the stages of each row, if profiling
+            p = profile.get_profile()
+            source, put = rows, write_row
+            if p is not None:
+                source = p.timed_iterator(rows, profile.STAGE_PARSE)
+                function = p.timed(function, profile.STAGE_COMPUTE)
+                put = p.timed(write_row, profile.STAGE_WRITE)
+            for i, row in enumerate(source):
+                if mask is None or mask[i]:
+                    put(writer, row + function(row))
+                else:
+                    put(writer, row + nulls)
+                if p is not None:
+                    p.end_row()
+        return digest()
+
+    # remove the partial data of an interrupted update
+    if checkpoint and os.path.isfile(get_journal_path(db_path, csv_path)):
+        for tmp_fn in __temporary_csvs(db_path, csv_path):
+            log.info("Removing \"{0}\".".format(tmp_fn))
+            os.unlink(tmp_fn)
+
+    # replace the old data, and back it up
+    backup = replace_csv(db_path, write, csv_path)
+
+    # the sidecar columns have been folded into the new data
+    if has_sidecar:
+        shutil.rmtree(get_sidecar_path(db_path, csv_path))
+    if checkpoint:
+        os.unlink(get_journal_path(db_path, csv_path))
 
     # return the backup filename
     return backup
@@ -663,11 +1946,6 @@ def get_sqlite3_to_csv(
         from the sqlite3 database
     """
     try:
-        # backup the file if it exists
-        fn = os.path.join(db_path, csv_path) 
-        if os.path.isfile(fn):
-            move_to_backup(db_path, csv_path)
-
         # get the header
         cursor = connection.cursor() 
         header = cursor.execute("pragma table_info(%s)" % table).fetchall()
@@ -699,14 +1977,20 @@ def get_sqlite3_to_csv(
                 output_row[swizzle[i]] = new_row[i]
             writer.writerow(output_row)
 
-        # write the column data
-        with open(fn, "w") as out:
+        # write the column data, backing up the file if it exists
+        def write(out):
             writer = csv.writer(out)
             # write the new header
             write_row(writer, names)
             # write the new rows
             for row in cursor.execute("select * from %s" % table):
                 write_row(writer, row)
+        replace_csv(db_path, write, csv_path)
+
+        # the sidecar columns are no longer row aligned
+        if get_sidecar_manifest(db_path, csv_path) is not None:
+            log.warning("Removing the sidecar columns of the old CSV.")
+            shutil.rmtree(get_sidecar_path(db_path, csv_path))
 
         return get_iterator(db_path, csv_path)
     except Exception as e:
@@ -741,8 +2025,8 @@ def add_column_by_row_data(db_path, column_name, row_function,
         the name of the backup (previous version) file
 
     side effects:
-        writes a new SPEC_D_CSV_FILENAME and will rename the old 
-        SPEC_D_CSV_FILENAME to SPEC_D_CSV_FILENAME.<epoch timestamp>.<md5 hash>
+        atomically writes a new SPEC_D_CSV_FILENAME and will keep the old 
+        SPEC_D_CSV_FILENAME as SPEC_D_CSV_FILENAME.<epoch timestamp>.<md5 hash>
     """
 
     def __row_function(row):
@@ -751,14 +2035,83 @@ def add_column_by_row_data(db_path, column_name, row_function,
     return add_columns_by_row_data(db_path, (column_name,), __row_function,
                                    csv_path)
 
+def add_columns_by_row_functions(db_path, columns, 
+                                 csv_path=SPEC_D_CSV_FILENAME, sidecar=False,
+                                 checkpoint=None, rows=None, mask=None):
+    """
+    For every row in a Cinema database, it will evaluate all of the row
+    functions in *columns*, adding all of their new columns to the 
+    database in one pass, i.e., one read and one write of the
+    SPEC_D_CSV_FILENAME. It will backup the old SPEC_D_CSV_FILENAME. This
+    is a convenience function that calls add_columns_by_row_data, or 
+    add_sidecar_columns_by_row_data if *sidecar* is True.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        columns : iterator of (tuple of strings, row_function)
+            the header name(s) for the new column(s) and the function that
+            computes them, as used by add_columns_by_row_data. the new
+            columns are added in order
+        csv_path : string = SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        sidecar : boolean = False
+            write the new columns to the sidecar column store, instead of
+            writing a new SPEC_D_CSV_FILENAME
+        checkpoint : integer = None
+            journal the results every *checkpoint* rows, so an interrupted
+            update can be resumed (see add_columns_by_row_data)
+        rows : iterator of tuples of strings = None
+            the rows to read instead of csv_path (see 
+            add_columns_by_row_data)
+        mask : sequence of booleans = None
+            only evaluate the row functions for the selected rows (see
+            add_columns_by_row_data)
+
+    returns:
+        the name of the backup (previous version) file, or the sidecar
+        column files if *sidecar* is True
+
+    raises:
+        an exception if the new column names are not unique, or already
+        exist, or both *sidecar* and *rows* are given
+
+    side effects:
+        atomically writes a new SPEC_D_CSV_FILENAME and will keep the old 
+        SPEC_D_CSV_FILENAME as SPEC_D_CSV_FILENAME.<epoch timestamp>.<md5 hash>
+    """
+
+    columns = tuple(columns)
+    column_names = tuple([n for names, f in columns for n in names])
+    if len(set(column_names)) != len(column_names):
+        raise Exception("New column names are not unique: {0}.".format(
+            column_names))
+    row_functions = tuple([f for names, f in columns])
+
+    def __row_function(row):
+        values = ()
+        for f in row_functions:
+            values = values + tuple(f(row))
+        return values
+
+    if sidecar:
+        if rows is not None:
+            raise Exception("Sidecar columns need a CSV.")
+        return add_sidecar_columns_by_row_data(db_path, column_names,
+                                               __row_function, csv_path,
+                                               checkpoint, mask)
+    else:
+        return add_columns_by_row_data(db_path, column_names, __row_function,
+                                       csv_path, checkpoint, rows, mask)
+
 def file_row_function(db_path, column_number, n_components,
                       function_name, file_function, fill):
     """
     Wraps a file function that calculates value(s) from a file, returning a 
     tuple of strings. This is wrapping of functions meant to be able to be used 
     in conjunction with add_columns_by_row_data. It will skip rows that have
-    null/None for the filename in the column column_number, and handle
-    exceptions by logging the error.
+    null/None for the filename in the column column_number, returning 
+    null/None value(s), and handle exceptions by logging the error.
 
     arguments:
         db_path : string
@@ -789,6 +2142,14 @@ def file_row_function(db_path, column_number, n_components,
         or error data to the logger if file_function raises an error
     """
 
+    def __file_function(image_path):
+        # time the file function, if profiling
+        p = profile.get_profile()
+        if p is None:
+            return file_function(db_path, image_path)
+        with p.stage(profile.STAGE_COMPUTE):
+            return file_function(db_path, image_path)
+
     if n_components > 0:
         nans = (fill,) * n_components 
         def __row_function(row):
@@ -797,7 +2158,9 @@ def file_row_function(db_path, column_number, n_components,
                     log.info("Performing \"{0}\" on \"{1}\"...".format(
                         function_name, row[column_number]))
                     return tuple([str(i) for i in 
-                                  file_function(db_path, row[column_number])])
+                                  __file_function(row[column_number])])
+                else:
+                    return (None,) * n_components
             except Exception as e:
                 log.error("Unable to process row {0}: {1}".format(row, e))
                 return nans
@@ -808,7 +2171,9 @@ def file_row_function(db_path, column_number, n_components,
                 if row[column_number] is not None:
                     log.info("Performing \"{0}\" on \"{1}\"...".format(
                         function_name, row[column_number]))
-                    return (str(file_function(db_path, row[column_number])),)
+                    return (str(__file_function(row[column_number])),)
+                else:
+                    return (None,)
             except Exception as e:
                 log.error("Unable to process row {0}: {1}".format(row, e))
                 return (fill,)
@@ -0,0 +1,319 @@
+"""
+Group-by aggregation of the columns of a Spec D database, i.e., the mean
+"image shannon entropy" per "time", or the max "image canny count" per
+"phi". The rows are streamed through a hash table of the groups, so only
+one partial aggregate per group and aggregation is kept in memory. The
+partial aggregates can be merged, so large databases can be aggregated
+in parallel over chunks of the CSV (d.get_chunks).
+
+Null values (empty, or NaN) are skipped by all of the aggregations.
+"""
+
+from ...spec import d
+
+import os
+import csv
+import math
+import logging as log
+
+def __number(column, value):
+    # the number of a value, or None if it is null
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        x = float(value)
+    except ValueError:
+        raise ValueError(
+            "Value \"{0}\" of column \"{1}\" is not a number.".format(
+            value, column))
+    return None if math.isnan(x) else x
+
+def __count_update(s, x):
+    s[0] += 1
+
+def __count_merge(s, t):
+    s[0] += t[0]
+
+def __sum_update(s, x):
+    s[0] += 1
+    s[1] += x
+
+def __sum_merge(s, t):
+    s[0] += t[0]
+    s[1] += t[1]
+
+def __min_update(s, x):
+    if s[0] is None or x < s[0]:
+        s[0] = x
+
+def __max_update(s, x):
+    if s[0] is None or x > s[0]:
+        s[0] = x
+
+def __moments_update(s, x):
+    # Welford's update of the count, mean, and sum of squared differences
+    s[0] += 1
+    delta = x - s[1]
+    s[1] += delta / s[0]
+    s[2] += delta * (x - s[1])
+
+def __moments_merge(s, t):
+    # Chan et al.'s combination of two partial moments
+    n = s[0] + t[0]
+    if n == 0:
+        return
+    delta = t[1] - s[1]
+    s[2] += t[2] + delta * delta * s[0] * t[0] / n
+    s[1] += delta * t[0] / n
+    s[0] = n
+
+def __variance(s):
+    return s[2] / s[0] if s[0] > 0 else None
+
+# The aggregations, by name, as a tuple of (the initial partial aggregate,
+# function(partial, value) that updates it with a (non-null) value,
+# function(partial, other partial) that merges another partial into it,
+# function(partial) that returns the aggregate, or None, and if the values
+# are numbers).
+AGGREGATIONS = {
+    "count": (lambda: [0], __count_update, __count_merge,
+              lambda s: s[0], False),
+    "sum": (lambda: [0, 0], __sum_update, __sum_merge,
+            lambda s: s[1] if s[0] > 0 else None, True),
+    "mean": (lambda: [0, 0], __sum_update, __sum_merge,
+             lambda s: s[1] / s[0] if s[0] > 0 else None, True),
+    "min": (lambda: [None], __min_update,
+            lambda s, t: t[0] is None or __min_update(s, t[0]),
+            lambda s: s[0], True),
+    "max": (lambda: [None], __max_update,
+            lambda s, t: t[0] is None or __max_update(s, t[0]),
+            lambda s: s[0], True),
+    "variance": (lambda: [0, 0.0, 0.0], __moments_update, __moments_merge,
+                 __variance, True),
+    "stddev": (lambda: [0, 0.0, 0.0], __moments_update, __moments_merge,
+               lambda s: None if s[0] == 0 else math.sqrt(__variance(s)),
+               True)
+    }
+
+def parse_aggregations(text):
+    """
+    Parse a comma separated list of aggregations, i.e.,
+    "image shannon entropy:mean,image canny count:max".
+
+    arguments:
+        text : string
+            the aggregations, as "<column name>:<aggregation>", where the
+            aggregation is one of AGGREGATIONS
+
+    returns:
+        a tuple of (column name, aggregation) tuples
+
+    raises:
+        ValueError if an aggregation is not valid
+    """
+
+    aggregations = []
+    for a in text.split(","):
+        column, sep, name = a.rpartition(":")
+        column = column.strip()
+        name = name.strip().lower()
+        if len(sep) == 0 or len(column) == 0:
+            raise ValueError(
+                "Aggregation \"{0}\" is not \"<column>:<aggregation>\".".format(
+                a))
+        if name not in AGGREGATIONS:
+            raise ValueError(
+                "Unknown aggregation \"{0}\", it must be one of {1}.".format(
+                name, ", ".join(sorted(AGGREGATIONS))))
+        aggregations.append((column, name))
+    return tuple(aggregations)
+
+def __indices(header, groupby, aggregations):
+    # the indices of the group by and aggregated columns
+    for c in tuple(groupby) + tuple([c for c, a in aggregations]):
+        if c not in header:
+            raise ValueError("\"{0}\" is not a column.".format(c))
+    return (tuple([header.index(c) for c in groupby]),
+            tuple([header.index(c) for c, a in aggregations]))
+
+def __partial(header, rows, groupby, aggregations):
+    # hash aggregate rows into partial aggregates per group
+    keys, columns = __indices(header, groupby, aggregations)
+    functions = [AGGREGATIONS[a] for c, a in aggregations]
+    plan = tuple(zip(columns, [c for c, a in aggregations],
+                     [f[1] for f in functions], [f[4] for f in functions]))
+    groups = {}
+    for row in rows:
+        if len(row) != len(header):
+            raise ValueError(
+                "Row has {0} values, but there are {1} columns.".format(
+                len(row), len(header)))
+        key = tuple([row[i] for i in keys])
+        partial = groups.get(key)
+        if partial is None:
+            partial = [f[0]() for f in functions]
+            groups[key] = partial
+        for s, (i, column, update, numeric) in zip(partial, plan):
+            value = row[i]
+            if numeric:
+                value = __number(column, value)
+            elif value is not None and value.lower() == "nan":
+                value = None
+            if value is not None:
+                update(s, value)
+    return groups
+
+def __chunk_partial(arguments):
+    # the partial aggregates of a chunk of the CSV, in a worker process
+    db_path, csv_path, header, chunk, groupby, aggregations = arguments
+    return __partial(header, d.get_chunk_iterator(db_path, chunk, csv_path),
+                     groupby, aggregations)
+
+def merge(groups, other, aggregations):
+    """
+    Merge the partial aggregates of a group by into another.
+
+    arguments:
+        groups : dictionary
+            the partial aggregates per group, updated in place
+        other : dictionary
+            the partial aggregates per group to merge into groups
+        aggregations : iterator of (string, string)
+            the aggregated columns and aggregations
+
+    returns:
+        groups
+
+    side effects:
+        updates groups
+    """
+
+    merges = [AGGREGATIONS[a][2] for c, a in aggregations]
+    for key, partial in other.items():
+        mine = groups.get(key)
+        if mine is None:
+            groups[key] = partial
+        else:
+            for f, s, t in zip(merges, mine, partial):
+                f(s, t)
+    return groups
+
+def aggregate(db_path, groupby, aggregations, csv_path=d.SPEC_D_CSV_FILENAME,
+              processes=None):
+    """
+    Group the rows of a Spec D database by the values of one or more
+    columns, and aggregate the values of other columns per group. The
+    groups are in the order that they first occur.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        groupby : iterator of strings
+            the names of the columns to group by, or empty for one group
+        aggregations : iterator of (string, string)
+            the names of the columns to aggregate and their aggregations,
+            from AGGREGATIONS, i.e., (("image mean", "mean"),)
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        processes : integer = None
+            the number of processes to aggregate chunks of the CSV in
+            parallel, if more than 1 (the values must not have quoted
+            newlines), otherwise the rows are aggregated in this process
+
+    returns:
+        a tuple of (the header, a list of the rows), where the header is
+        the group by column names followed by "<column> <aggregation>"
+        per aggregation, or None if the csv_path can not be opened
+
+    raises:
+        ValueError if a column is not in the database, or a value to
+        aggregate is not a number
+    """
+
+    groupby = tuple(groupby)
+    aggregations = tuple(aggregations)
+    rows = d.get_iterator(db_path, csv_path)
+    if rows is None:
+        return None
+    header = next(rows)
+
+    # the sidecar columns can't be read by byte range
+    if processes is not None and processes > 1 and \
+       d.get_sidecar_manifest(db_path, csv_path) is not None:
+        log.info("Not aggregating in parallel, the database has sidecar "
+                 "columns.")
+        processes = None
+
+    if processes is not None and processes > 1:
+        import multiprocessing
+
+        del(rows)
+        __indices(header, groupby, aggregations)
+        chunks = d.get_chunks(db_path, processes, csv_path)
+        with multiprocessing.Pool(processes) as pool:
+            groups = {}
+            for partial in pool.imap(__chunk_partial,
+                    [(db_path, csv_path, header, c, groupby, aggregations)
+                     for c in chunks]):
+                merge(groups, partial, aggregations)
+    else:
+        groups = __partial(header, rows, groupby, aggregations)
+
+    finals = [AGGREGATIONS[a][3] for c, a in aggregations]
+    new_header = groupby + tuple(["{0} {1}".format(c, a)
+                                  for c, a in aggregations])
+    return (new_header,
+            [key + tuple([f(s) for f, s in zip(finals, partial)])
+             for key, partial in groups.items()])
+
+def write_aggregate(db_path, groupby, aggregations, output_path,
+                    csv_path=d.SPEC_D_CSV_FILENAME, processes=None):
+    """
+    Aggregate a Spec D database (see aggregate), and write the groups to
+    a new Spec D CSV.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        groupby : iterator of strings
+            the names of the columns to group by
+        aggregations : iterator of (string, string)
+            the names of the columns to aggregate and their aggregations
+        output_path : string
+            POSIX path of the new CSV, i.e., "<db>/entropy.csv"
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        processes : integer = None
+            the number of processes to aggregate in parallel
+
+    returns:
+        the number of groups, or None if the csv_path can not be opened
+
+    raises:
+        ValueError if a column is not in the database, or a value to
+        aggregate is not a number
+
+    side effects:
+        writes the output_path, and backs up an old output_path
+        (d.replace_csv)
+    """
+
+    aggregated = aggregate(db_path, groupby, aggregations, csv_path,
+                           processes)
+    if aggregated is None:
+        return None
+    header, rows = aggregated
+
+    def write(out):
+        writer = csv.writer(out)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(["" if v is None else v for v in row])
+
+    d.replace_csv(os.path.dirname(output_path), write,
+                  os.path.basename(output_path))
+    return len(rows)
@@ -0,0 +1,171 @@
+"""
+Compare two Spec D databases, i.e., a re-run of a simulation, row by row
+on key columns, regardless of the order of the rows. The rows of the
+first database are indexed in a hash table by their keys, and the rows of
+the second are streamed through it, so it takes time linear in the rows.
+Optionally, the files of FILE columns are compared by size and MD5 hash.
+"""
+
+from ...spec import d
+
+import os
+import decimal
+
+def __normal(value):
+    # values that are the same number are the same, i.e., "1" and "1.0",
+    # compared exactly, so large integers are not rounded, and NaN is the
+    # same as NaN
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        number = decimal.Decimal(value)
+    except decimal.InvalidOperation:
+        return value
+    return "nan" if number.is_nan() else number
+
+def __file_hash(db_path, value, hashes):
+    # the size and hash of a file, or None if it doesn't exist
+    if value is None:
+        return None
+    fn = os.path.join(db_path, value)
+    if fn not in hashes:
+        if os.path.isfile(fn):
+            hashes[fn] = (os.path.getsize(fn), None)
+        else:
+            hashes[fn] = None
+    return hashes[fn]
+
+def __same_file(a_path, a_value, b_path, b_value, hashes):
+    # compare the size first, and then the hash
+    a = __file_hash(a_path, a_value, hashes)
+    b = __file_hash(b_path, b_value, hashes)
+    if a is None or b is None:
+        # missing files are compared by path
+        return a is None and b is None and a_value == b_value
+    if a[0] != b[0]:
+        return False
+    for path, value in ((a_path, a_value), (b_path, b_value)):
+        fn = os.path.join(path, value)
+        if hashes[fn][1] is None:
+            hashes[fn] = (hashes[fn][0], d.hash_file(fn))
+    return hashes[os.path.join(a_path, a_value)][1] == \
+           hashes[os.path.join(b_path, b_value)][1]
+
+def diff(a_path, b_path, key_columns, csv_path=d.SPEC_D_CSV_FILENAME,
+         compare_files=False):
+    """
+    Compare the rows of two Spec D databases with the same key columns.
+    Rows are matched by the values of the key columns, and the other
+    columns that are in both databases are compared. Values that are the
+    same number are equal, i.e., "1" and "1.0", and NaN is equal to NaN.
+
+    arguments:
+        a_path : string
+            POSIX path to the first (old) Cinema database, which is
+            indexed in memory
+        b_path : string
+            POSIX path to the second (new) Cinema database, which is
+            streamed
+        key_columns : iterator of strings
+            the names of the columns that identify a row
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV, of both databases
+        compare_files : boolean = False
+            compare the files of FILE columns by size and hash, instead of
+            their paths
+
+    returns:
+        a dictionary, or None if a csv_path can not be opened:
+
+        {"key": [<key column names>],
+         "only_in_a": [<column names>], "only_in_b": [<column names>],
+         "added": [<keys of rows only in b>],
+         "removed": [<keys of rows only in a>],
+         "changed": [<keys of rows that are different>],
+         "unchanged": <number of rows that are the same>,
+         "columns": {<column name>: <number of rows where it changed>}}
+
+        where the keys are lists of the key column values of b (or a, if
+        removed)
+
+    raises:
+        ValueError if a key column is not in both databases, or a key is
+        not unique
+    """
+
+    a_rows = d.get_iterator(a_path, csv_path)
+    b_rows = d.get_iterator(b_path, csv_path)
+    if a_rows is None or b_rows is None:
+        return None
+    a_header = next(a_rows)
+    b_header = next(b_rows)
+    key_columns = tuple(key_columns)
+    for c in key_columns:
+        if c not in a_header or c not in b_header:
+            raise ValueError("Key column \"{0}\" is not in both "
+                             "databases.".format(c))
+    compared = tuple([c for c in a_header if c in b_header and
+                      c not in key_columns])
+    is_file = [compare_files and d.is_file_column(c) for c in compared]
+    a_keys = [a_header.index(c) for c in key_columns]
+    b_keys = [b_header.index(c) for c in key_columns]
+    a_values = [a_header.index(c) for c in compared]
+    b_values = [b_header.index(c) for c in compared]
+
+    def get(row, indices):
+        return tuple([row[i] if i < len(row) else None for i in indices])
+
+    # index the first database
+    index = {}
+    for row in a_rows:
+        key = get(row, a_keys)
+        normal = tuple([__normal(v) for v in key])
+        if normal in index:
+            raise ValueError("Key {0} is not unique in \"{1}\".".format(
+                list(key), a_path))
+        index[normal] = (key, get(row, a_values))
+
+    # stream the second database
+    added = []
+    changed = []
+    unchanged = 0
+    counts = [0] * len(compared)
+    seen = set()
+    hashes = {}
+    for row in b_rows:
+        key = get(row, b_keys)
+        normal = tuple([__normal(v) for v in key])
+        if normal in seen:
+            raise ValueError("Key {0} is not unique in \"{1}\".".format(
+                list(key), b_path))
+        seen.add(normal)
+        old = index.pop(normal, None)
+        if old is None:
+            added.append(list(key))
+            continue
+        different = False
+        for i, (u, v) in enumerate(zip(old[1], get(row, b_values))):
+            if is_file[i]:
+                same = __same_file(a_path, u, b_path, v, hashes)
+            else:
+                same = u == v or __normal(u) == __normal(v)
+            if not same:
+                counts[i] += 1
+                different = True
+        if different:
+            changed.append(list(key))
+        else:
+            unchanged += 1
+
+    return {"key": list(key_columns),
+            "only_in_a": [c for c in a_header if c not in b_header],
+            "only_in_b": [c for c in b_header if c not in a_header],
+            "added": added,
+            "removed": [list(key) for key, values in index.values()],
+            "changed": changed,
+            "unchanged": unchanged,
+            "columns": dict(zip(compared, counts))}
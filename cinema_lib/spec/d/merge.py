@@ -0,0 +1,227 @@
+"""
+Merge Spec D databases, i.e., the shards of a simulation, into one. The
+rows are streamed from all of the databases, concatenated or merged on
+sort columns (k-way), so memory does not depend on the number of rows.
+The files of the FILE columns are hard linked into the new database, in
+a directory per input database, and their paths are rewritten to match.
+"""
+
+from ...spec import d
+
+import os
+import csv
+import heapq
+import shutil
+import logging as log
+
+def get_headers(db_paths, csv_path=d.SPEC_D_CSV_FILENAME):
+    """
+    Read the headers of Spec D databases, and check that they have the
+    same columns. Only the first line of each CSV is read.
+
+    arguments:
+        db_paths : iterator of strings
+            POSIX paths to Cinema databases
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        a tuple of the headers, in the order of db_paths
+
+    raises:
+        ValueError if a database can not be opened, or the databases do
+        not have the same columns
+    """
+
+    db_paths = list(db_paths)
+    headers = []
+    for db_path in db_paths:
+        rows = d.get_iterator(db_path, csv_path)
+        if rows is None:
+            raise ValueError("Unable to open \"{0}\".".format(
+                os.path.join(db_path, csv_path)))
+        headers.append(next(rows))
+        del(rows)
+        if len(set(headers[-1])) != len(headers[-1]):
+            raise ValueError("\"{0}\" has duplicate columns.".format(db_path))
+        if set(headers[-1]) != set(headers[0]):
+            raise ValueError(
+                "\"{0}\" has columns {1}, but \"{2}\" has columns {3}.".format(
+                db_path, list(headers[-1]), db_paths[0], list(headers[0])))
+    return tuple(headers)
+
+def __sort_key(indices):
+    # the key of a row for sorting on columns, where nulls are first, then
+    # numbers, then strings
+    def key(row):
+        k = []
+        for i in indices:
+            v = row[i]
+            if v is None:
+                k.append((0, 0))
+            else:
+                try:
+                    k.append((1, float(v)))
+                except ValueError:
+                    k.append((2, v))
+        return tuple(k)
+    return key
+
+def __sorted(db_path, rows, key, columns):
+    # check that the rows of an input are sorted
+    last = None
+    for row in rows:
+        k = key(row)
+        if last is not None and k < last:
+            raise ValueError("\"{0}\" is not sorted by {1}.".format(db_path,
+                             list(columns)))
+        last = k
+        yield row
+
+def __shard_names(db_paths):
+    # unique directory names for the files of each input
+    names = []
+    for db_path in db_paths:
+        name = os.path.basename(os.path.normpath(db_path))
+        unique = name
+        i = 1
+        while unique in names:
+            unique = "{0}_{1}".format(name, i)
+            i += 1
+        names.append(unique)
+    return names
+
+def __makedirs(directory, created):
+    # make a directory and its parents, and record the ones that are new
+    missing = []
+    while directory != "" and not os.path.lexists(directory):
+        missing.append(directory)
+        directory = os.path.dirname(directory)
+    if len(missing) > 0:
+        os.makedirs(missing[0], exist_ok=True)
+        created.extend(reversed(missing))
+
+def __link(source, destination, created):
+    # hard link a file, or copy it if it can't be linked, and record the
+    # new files and directories
+    if os.path.lexists(destination):
+        return
+    __makedirs(os.path.dirname(destination), created)
+    try:
+        os.link(source, destination)
+    except OSError as e:
+        log.warning("Unable to link \"{0}\", copying it: {1}.".format(
+            source, e))
+        shutil.copy2(source, destination)
+    created.append(destination)
+
+def __remove(created):
+    # remove the files and directories that a failed merge created
+    for path in reversed(created):
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                os.rmdir(path)
+            else:
+                os.unlink(path)
+        except OSError as e:
+            log.warning("Unable to remove \"{0}\": {1}.".format(path, e))
+
+def merge(output_path, db_paths, sort_columns=None,
+          csv_path=d.SPEC_D_CSV_FILENAME, link=True):
+    """
+    Merge Spec D databases into a new Spec D database.
+
+    arguments:
+        output_path : string
+            POSIX path to the new Cinema database, which must not have a
+            CSV yet
+        db_paths : iterator of strings
+            POSIX paths to the Cinema databases to merge, with the same
+            columns (in any order)
+        sort_columns : iterator of strings = None
+            the names of the columns that each database is sorted by, to
+            merge the rows in that order, or None to concatenate the rows
+            in the order of db_paths
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV, of the inputs and output
+        link : boolean = True
+            hard link the files of the FILE columns into
+            <output_path>/<input database name>/, and rewrite the paths to
+            them. if False, the paths are not changed, and no files are
+            linked
+
+    returns:
+        the number of rows
+
+    raises:
+        ValueError if the databases do not have the same columns, a sort
+        column is not a column, a database is not sorted, or the output
+        CSV exists
+
+    side effects:
+        creates output_path, its CSV, and links (or copies) files. if the
+        merge fails, the files (and directories) that it created are
+        removed
+    """
+
+    db_paths = list(db_paths)
+    if len(db_paths) == 0:
+        raise ValueError("No databases to merge.")
+    if os.path.exists(os.path.join(output_path, csv_path)):
+        raise ValueError("\"{0}\" exists.".format(
+            os.path.join(output_path, csv_path)))
+    headers = get_headers(db_paths, csv_path)
+    header = headers[0]
+    if sort_columns is not None:
+        sort_columns = tuple(sort_columns)
+        for c in sort_columns:
+            if c not in header:
+                raise ValueError("\"{0}\" is not a column.".format(c))
+    files = tuple(d.file_columns(header))
+    shards = __shard_names(db_paths)
+    created = []
+
+    def rows(i):
+        # the rows of an input, in the column order of the output, with
+        # the file paths rewritten
+        order = [headers[i].index(c) for c in header]
+        it = d.get_iterator(db_paths[i], csv_path)
+        next(it)
+        for row in it:
+            row = [row[j] if j < len(row) else None for j in order]
+            if link:
+                for j in files:
+                    if row[j] is None or os.path.isabs(row[j]):
+                        continue
+                    source = os.path.join(db_paths[i], row[j])
+                    row[j] = shards[i] + "/" + row[j]
+                    if os.path.isfile(source):
+                        __link(source, os.path.join(output_path, row[j]),
+                               created)
+                    else:
+                        log.warning("\"{0}\" does not exist.".format(source))
+            yield row
+
+    if sort_columns is None:
+        merged = (row for i in range(0, len(db_paths)) for row in rows(i))
+    else:
+        key = __sort_key([header.index(c) for c in sort_columns])
+        merged = heapq.merge(*[__sorted(db_paths[i], rows(i), key,
+                                        sort_columns)
+                               for i in range(0, len(db_paths))], key=key)
+
+    n_rows = [0]
+    def write(out):
+        writer = csv.writer(out)
+        writer.writerow(header)
+        for row in merged:
+            writer.writerow(row)
+            n_rows[0] += 1
+
+    __makedirs(output_path, created)
+    try:
+        d.replace_csv(output_path, write, csv_path)
+    except:
+        __remove(created)
+        raise
+    return n_rows[0]
@@ -0,0 +1,288 @@
+"""
+Nearest row queries over the numeric parameter columns of a Spec D
+database, i.e., the row closest to theta=37.2, phi=-150 for a viewer's
+sliders. The rows are indexed in a k-d tree over the parameters, each
+normalized to [0, 1] by its range, so nearest and k-nearest queries take
+logarithmic time instead of a scan of the rows.
+"""
+
+from ...spec import d
+from . import table
+
+import numpy as np
+import heapq
+
+# the maximum number of rows in a leaf of the tree
+LEAF_SIZE = 16
+
+class Index:
+    """
+    A k-d tree of the rows of a table over one or more numeric columns.
+
+    attributes:
+        columns : tuple of strings
+            the names of the indexed columns, the order of the coordinates
+            of a point
+        rows : numpy int64 array
+            the row numbers of the indexed rows, rows that have a null
+            (NaN) value in an indexed column are not indexed
+        low : numpy float64 array
+            the minimum of each column
+        scale : numpy float64 array
+            the range of each column, or 1 if it is 0
+    """
+
+    def __init__(self, columns, values, rows=None, leaf_size=LEAF_SIZE):
+        """
+        Build the index.
+
+        arguments:
+            columns : iterator of strings
+                the names of the columns
+            values : iterator of numpy arrays
+                the numeric values of each column, in the same order
+            rows : numpy array of integers = None
+                the row number of each value, or 0, 1, ... if None
+            leaf_size : integer = LEAF_SIZE
+                the maximum number of rows in a leaf of the tree
+
+        raises:
+            ValueError if there are no columns, or they have different
+            lengths
+        """
+
+        self.columns = tuple(columns)
+        values = [np.asarray(v, dtype=np.float64) for v in values]
+        if len(values) == 0 or len(values) != len(self.columns):
+            raise ValueError("Need one array of values per column.")
+        if len(set([len(v) for v in values])) != 1:
+            raise ValueError("Columns have different lengths.")
+        points = np.column_stack(values)
+        if rows is None:
+            rows = np.arange(len(points), dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+
+        # ignore the rows with nulls
+        valid = np.logical_not(np.isnan(points).any(axis=1))
+        points = points[valid]
+        rows = rows[valid]
+
+        # normalize the columns by their range
+        if len(points) > 0:
+            self.low = points.min(axis=0)
+            self.scale = points.max(axis=0) - self.low
+        else:
+            self.low = np.zeros(len(self.columns))
+            self.scale = np.ones(len(self.columns))
+        self.scale[self.scale == 0] = 1.0
+        points = (points - self.low) / self.scale
+
+        order = self.__build(points, leaf_size)
+        self.points = points[order]
+        self.rows = rows[order]
+        self.__coordinates = self.points.tolist()
+        self.__row_list = self.rows.tolist()
+
+    def __build(self, points, leaf_size):
+        # split the points on the median of the widest dimension, until
+        # the leaves are small, storing the nodes in lists. returns the
+        # order of the points, so each node is a contiguous range
+        order = np.arange(len(points))
+        self.__dim = []
+        self.__split = []
+        self.__left = []
+        self.__right = []
+        self.__start = []
+        self.__end = []
+
+        def node(start, end):
+            n = len(self.__dim)
+            self.__dim.append(-1)
+            self.__split.append(0.0)
+            self.__left.append(-1)
+            self.__right.append(-1)
+            self.__start.append(start)
+            self.__end.append(end)
+            return n
+
+        root = node(0, len(points))
+        stack = [root]
+        while len(stack) > 0:
+            n = stack.pop()
+            start, end = self.__start[n], self.__end[n]
+            if end - start <= leaf_size:
+                continue
+            sub = points[order[start:end]]
+            spread = sub.max(axis=0) - sub.min(axis=0)
+            dim = int(np.argmax(spread))
+            if spread[dim] == 0:
+                # all of the points are the same
+                continue
+            mid = (end - start) // 2
+            part = np.argpartition(sub[:, dim], mid)
+            order[start:end] = order[start:end][part]
+            self.__dim[n] = dim
+            self.__split[n] = float(points[order[start + mid], dim])
+            self.__left[n] = node(start, start + mid)
+            self.__right[n] = node(start + mid, end)
+            stack.append(self.__left[n])
+            stack.append(self.__right[n])
+        return order
+
+    def __len__(self):
+        return len(self.__row_list)
+
+    def normalize(self, point):
+        """
+        Normalize a point to the coordinates of the index.
+
+        arguments:
+            point : dictionary or iterator of numbers
+                the value of each indexed column, as a dictionary of the
+                column names to values, or in the order of columns
+
+        returns:
+            a list of the normalized coordinates
+
+        raises:
+            ValueError if the point does not have a value for every column
+        """
+
+        if isinstance(point, dict):
+            missing = [c for c in self.columns if c not in point]
+            if len(missing) > 0:
+                raise ValueError("Point is missing column(s) {0}.".format(
+                    ", ".join(["\"{0}\"".format(c) for c in missing])))
+            point = [point[c] for c in self.columns]
+        point = [float(x) for x in point]
+        if len(point) != len(self.columns):
+            raise ValueError("Point has {0} values, but there are {1} "
+                             "columns.".format(len(point), len(self.columns)))
+        return [(x - l) / s for x, l, s in zip(point, self.low.tolist(),
+                                               self.scale.tolist())]
+
+    def k_nearest(self, point, k):
+        """
+        Return the k rows nearest to a point, by the Euclidean distance of
+        the normalized coordinates.
+
+        arguments:
+            point : dictionary or iterator of numbers
+                the value of each indexed column, as a dictionary of the
+                column names to values, or in the order of columns
+            k : integer > 0
+                the number of rows
+
+        returns:
+            a list of (row number, distance) tuples, nearest first, with
+            fewer than k if there are fewer rows
+
+        raises:
+            ValueError if the point does not have a value for every column
+        """
+
+        q = self.normalize(point)
+        coordinates = self.__coordinates
+        dim, split = self.__dim, self.__split
+        left, right = self.__left, self.__right
+        start, end = self.__start, self.__end
+        # max heap of the best (negative squared distance, index)
+        best = []
+
+        def search(n):
+            if dim[n] < 0:
+                for i in range(start[n], end[n]):
+                    dd = 0.0
+                    for a, b in zip(q, coordinates[i]):
+                        dd += (a - b) * (a - b)
+                    if len(best) < k:
+                        heapq.heappush(best, (-dd, i))
+                    elif dd < -best[0][0]:
+                        heapq.heapreplace(best, (-dd, i))
+                return
+            diff = q[dim[n]] - split[n]
+            if diff < 0:
+                near, far = left[n], right[n]
+            else:
+                near, far = right[n], left[n]
+            search(near)
+            if len(best) < k or diff * diff < -best[0][0]:
+                search(far)
+
+        if len(coordinates) > 0 and k > 0:
+            search(0)
+        return [(self.__row_list[i], dd ** 0.5)
+                for dd, i in sorted([(-dd, i) for dd, i in best])]
+
+    def nearest(self, point):
+        """
+        Return the row nearest to a point (see k_nearest).
+
+        arguments:
+            point : dictionary or iterator of numbers
+                the value of each indexed column
+
+        returns:
+            a (row number, distance) tuple, or None if there are no rows
+
+        raises:
+            ValueError if the point does not have a value for every column
+        """
+
+        found = self.k_nearest(point, 1)
+        return found[0] if len(found) > 0 else None
+
+def get_index(db_path, columns=None, csv_path=d.SPEC_D_CSV_FILENAME,
+              leaf_size=LEAF_SIZE):
+    """
+    Build a nearest row Index over numeric columns of a Spec D database.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        columns : iterator of strings = None
+            the names of the columns to index, or all of the numeric
+            non-FILE columns if None
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        leaf_size : integer = LEAF_SIZE
+            the maximum number of rows in a leaf of the tree
+
+    returns:
+        an Index, where the row numbers are the rows of the database
+        (0 is the first row after the header), or None if the csv_path
+        can not be opened
+
+    raises:
+        ValueError if a column is not in the database, or is not numeric,
+        or there are no numeric columns
+    """
+
+    if columns is not None:
+        columns = tuple(columns)
+        rows = d.get_iterator(db_path, csv_path)
+        if rows is None:
+            return None
+        header = next(rows)
+        del(rows)
+        for c in columns:
+            if c not in header:
+                raise ValueError("\"{0}\" is not a column.".format(c))
+    t = table.get_table(db_path, csv_path, columns)
+    if t is None:
+        return None
+
+    names = []
+    values = []
+    for name, c in zip(t.header, t.columns):
+        if d.is_file_column(name) and columns is None:
+            continue
+        if c.dtype == object:
+            if columns is None:
+                continue
+            raise ValueError("\"{0}\" is not a numeric column.".format(name))
+        names.append(name)
+        values.append(c)
+    if len(names) == 0:
+        raise ValueError("There are no numeric columns to index.")
+    return Index(names, values, leaf_size=leaf_size)
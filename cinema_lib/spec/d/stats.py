@@ -0,0 +1,334 @@
+"""
+Statistics of the columns of a Spec D database, in one streaming pass:
+the count of values and nulls, the type, and for numeric columns the
+min, max, mean, and variance (Welford), and approximate quantiles from a
+mergeable quantile sketch (Karnin, Lang, and Liberty, "Optimal Quantile
+Approximation in Streams", 2016). Memory does not depend on the number
+of rows, and partial statistics of chunks of the CSV (d.get_chunks) can
+be computed in parallel and merged.
+
+Null values (empty, or NaN in a numeric column) are counted as nulls.
+"""
+
+from ...spec import d
+from . import aggregate
+
+import math
+import random
+import logging as log
+
+# the default quantiles
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+# the default accuracy of the quantile sketch, the rank error is about 1/K
+SKETCH_K = 200
+
+__MOMENTS = aggregate.AGGREGATIONS["variance"]
+# the order of the types, from most to least specific
+__TYPES = (d.TYPE_EMPTY, d.TYPE_INTEGER, d.TYPE_FLOAT, d.TYPE_STRING)
+
+class QuantileSketch:
+    """
+    A mergeable sketch of a stream of numbers that answers quantile
+    queries with a rank error of about 1/k, keeping O(k log(n/k)) of the
+    numbers. Numbers are kept in levels of compactors, where a number at
+    level h stands for 2^h numbers of the stream. When the sketch is full,
+    a full level is sorted, and every other number (randomly the odd or
+    even ones) is promoted to the next level.
+
+    attributes:
+        k : integer
+            the accuracy parameter, the capacity of the top level
+        n : integer
+            the number of numbers in the stream
+        compactors : list of lists of numbers
+            the numbers kept at each level
+    """
+
+    def __init__(self, k=SKETCH_K, seed=None):
+        self.k = k
+        self.n = 0
+        self.compactors = []
+        self.size = 0
+        self.max_size = 0
+        self.random = random.Random(seed)
+        self.__grow()
+
+    def __capacity(self, h):
+        # lower levels have geometrically smaller capacities
+        depth = len(self.compactors) - h - 1
+        return int(math.ceil(self.k * (2.0 / 3.0) ** depth)) + 1
+
+    def __grow(self):
+        self.compactors.append([])
+        self.max_size = sum([self.__capacity(h)
+                             for h in range(0, len(self.compactors))])
+
+    def __compress(self):
+        while self.size >= self.max_size:
+            for h in range(0, len(self.compactors)):
+                c = self.compactors[h]
+                if len(c) >= self.__capacity(h):
+                    if h + 1 >= len(self.compactors):
+                        self.__grow()
+                    c.sort()
+                    odd = len(c) % 2
+                    offset = self.random.randint(0, 1)
+                    self.compactors[h + 1].extend(c[odd + offset::2])
+                    self.compactors[h] = c[:odd]
+                    break
+            self.size = sum([len(c) for c in self.compactors])
+
+    def update(self, x):
+        """
+        Add a number to the sketch.
+
+        arguments:
+            x : number
+                the number
+
+        side effects:
+            updates the sketch
+        """
+
+        self.compactors[0].append(x)
+        self.n += 1
+        self.size += 1
+        if self.size >= self.max_size:
+            self.__compress()
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one. The sketch is then a sketch of
+        both streams.
+
+        arguments:
+            other : QuantileSketch
+                the other sketch
+
+        returns:
+            this sketch
+
+        side effects:
+            updates the sketch
+        """
+
+        while len(self.compactors) < len(other.compactors):
+            self.__grow()
+        for h, c in enumerate(other.compactors):
+            self.compactors[h].extend(c)
+        self.n += other.n
+        self.size = sum([len(c) for c in self.compactors])
+        self.__compress()
+        return self
+
+    def quantiles(self, qs):
+        """
+        Return the approximate quantiles of the stream.
+
+        arguments:
+            qs : iterator of numbers in [0, 1]
+                the quantiles, i.e., 0.5 for the median
+
+        returns:
+            a tuple of the numbers at the quantiles, or of None if the
+            stream is empty
+        """
+
+        weighted = sorted([(x, 1 << h) for h, c in enumerate(self.compactors)
+                           for x in c])
+        total = sum([w for x, w in weighted])
+        result = []
+        for q in qs:
+            rank = q * total
+            value = None
+            cumulative = 0
+            for x, w in weighted:
+                value = x
+                cumulative += w
+                if cumulative >= rank:
+                    break
+            result.append(value)
+        return tuple(result)
+
+def __new_state(k):
+    # the partial statistics of a column
+    return {"type": d.TYPE_EMPTY, "count": 0, "nulls": 0, "nans": 0,
+            "moments": __MOMENTS[0](), "min": None, "max": None,
+            "sketch": QuantileSketch(k)}
+
+def __to_string(state):
+    # not a number, so there are no numeric statistics, and the NaN values
+    # that were pending are values
+    state["type"] = d.TYPE_STRING
+    state["moments"] = state["sketch"] = None
+    state["min"] = state["max"] = None
+    state["count"] += state["nans"]
+    state["nans"] = 0
+
+def __update(state, value):
+    if value is None:
+        state["nulls"] += 1
+        return
+    state["count"] += 1
+    if state["type"] == d.TYPE_STRING:
+        return
+    try:
+        x = int(value)
+        if state["type"] == d.TYPE_EMPTY:
+            state["type"] = d.TYPE_INTEGER
+    except ValueError:
+        try:
+            x = float(value)
+        except ValueError:
+            __to_string(state)
+            return
+        if math.isnan(x):
+            # null, unless the column turns out to be a string
+            state["count"] -= 1
+            state["nans"] += 1
+            return
+        state["type"] = d.TYPE_FLOAT
+    __MOMENTS[1](state["moments"], x)
+    state["sketch"].update(x)
+    if state["min"] is None or x < state["min"]:
+        state["min"] = x
+    if state["max"] is None or x > state["max"]:
+        state["max"] = x
+
+def merge(states, other):
+    """
+    Merge the partial statistics of the columns of a chunk into another.
+
+    arguments:
+        states : list of dictionaries
+            the partial statistics per column, updated in place
+        other : list of dictionaries
+            the partial statistics per column to merge into states
+
+    returns:
+        states
+
+    side effects:
+        updates states
+    """
+
+    for s, t in zip(states, other):
+        s["count"] += t["count"]
+        s["nulls"] += t["nulls"]
+        s["nans"] += t["nans"]
+        s["type"] = max(s["type"], t["type"], key=__TYPES.index)
+        if s["type"] == d.TYPE_STRING:
+            __to_string(s)
+            continue
+        __MOMENTS[2](s["moments"], t["moments"])
+        s["sketch"].merge(t["sketch"])
+        for key, f in (("min", min), ("max", max)):
+            values = [v for v in (s[key], t[key]) if v is not None]
+            s[key] = f(values) if len(values) > 0 else None
+    return states
+
+def __partial(header, rows, k):
+    # the partial statistics of the columns of rows
+    states = [__new_state(k) for c in header]
+    for row in rows:
+        if len(row) != len(header):
+            raise ValueError(
+                "Row has {0} values, but there are {1} columns.".format(
+                len(row), len(header)))
+        for s, v in zip(states, row):
+            __update(s, v)
+    return states
+
+def __chunk_partial(arguments):
+    # the partial statistics of a chunk of the CSV, in a worker process
+    db_path, csv_path, header, chunk, k = arguments
+    return __partial(header, d.get_chunk_iterator(db_path, chunk, csv_path),
+                     k)
+
+def get_column_stats(db_path, csv_path=d.SPEC_D_CSV_FILENAME,
+                     quantiles=QUANTILES, processes=None, k=SKETCH_K):
+    """
+    Calculate the statistics of every column of a Spec D database, in one
+    pass over the rows.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        quantiles : iterator of numbers in [0, 1] = QUANTILES
+            the approximate quantiles to calculate
+        processes : integer = None
+            the number of processes to calculate the statistics of chunks
+            of the CSV in parallel, if more than 1 (the values must not
+            have quoted newlines), otherwise they are calculated in this
+            process
+        k : integer = SKETCH_K
+            the accuracy of the quantile sketch
+
+    returns:
+        a dictionary that can be written as JSON, or None if the csv_path
+        can not be opened:
+
+        {"rows": <number of rows>,
+         "columns": [{"name": <column name>,
+                      "type": d.TYPE_INTEGER, TYPE_FLOAT, TYPE_STRING, or
+                              TYPE_EMPTY,
+                      "count": <number of values>,
+                      "nulls": <number of nulls>,
+                      and if the type is TYPE_INTEGER or TYPE_FLOAT,
+                      "min": <min>, "max": <max>, "mean": <mean>,
+                      "variance": <population variance>,
+                      "quantiles": {"<quantile>": <approximate value>, ...}
+                     }, ...]}
+
+    raises:
+        ValueError if a row does not have a value for every column
+    """
+
+    rows = d.get_iterator(db_path, csv_path)
+    if rows is None:
+        return None
+    header = next(rows)
+
+    # the sidecar columns can't be read by byte range
+    if processes is not None and processes > 1 and \
+       d.get_sidecar_manifest(db_path, csv_path) is not None:
+        log.info("Not calculating statistics in parallel, the database has "
+                 "sidecar columns.")
+        processes = None
+
+    if processes is not None and processes > 1:
+        import multiprocessing
+
+        del(rows)
+        states = __partial(header, (), k)
+        chunks = d.get_chunks(db_path, processes, csv_path)
+        with multiprocessing.Pool(processes) as pool:
+            for partial in pool.imap(__chunk_partial,
+                    [(db_path, csv_path, header, c, k) for c in chunks]):
+                merge(states, partial)
+    else:
+        states = __partial(header, rows, k)
+
+    # the pending NaN values of the numeric (or empty) columns are nulls
+    for s in states:
+        s["nulls"] += s["nans"]
+        s["nans"] = 0
+
+    quantiles = tuple(quantiles)
+    columns = []
+    for name, s in zip(header, states):
+        column = {"name": name, "type": s["type"], "count": s["count"],
+                  "nulls": s["nulls"]}
+        if s["type"] in (d.TYPE_INTEGER, d.TYPE_FLOAT):
+            column["min"] = s["min"]
+            column["max"] = s["max"]
+            column["mean"] = s["moments"][1]
+            column["variance"] = __MOMENTS[3](s["moments"])
+            column["quantiles"] = dict(zip([str(q) for q in quantiles],
+                s["sketch"].quantiles(quantiles)))
+        columns.append(column)
+    n_rows = states[0]["count"] + states[0]["nulls"] if len(states) > 0 \
+             else 0
+    return {"rows": n_rows, "columns": columns}
@@ -0,0 +1,299 @@
+"""
+In-memory, NumPy backed, columns of a Spec D database, and a small
+expression language to select rows with vectorized boolean masks, i.e.,
+"theta >= 30 and phi == -180".
+
+The expressions are Python expressions, restricted to:
+    column names, i.e., phi, or `image mean 0` for names that are not
+        identifiers (quoted with backticks)
+    numbers and strings, i.e., 30, -180.5, "rho"
+    comparisons, i.e., ==, !=, <, <=, >, >=, and chains, i.e., 0 < phi < 90
+    membership in a tuple or list of numbers and strings, i.e.,
+        phi in (0, 90), var not in ["rho", "u"]
+    arithmetic, i.e., +, -, *, /, //, %, **
+    boolean operators and, or, not
+"""
+
+from ...spec import d
+
+import numpy as np
+import ast
+import re
+import sys
+from collections import namedtuple
+
+# A table of the columns of a Spec D database.
+#
+#     header : tuple of strings
+#         the names of the columns
+#     columns : tuple of numpy arrays
+#         the values of each column, in header order. integer columns are
+#         int64, numeric columns with null values or floats are float64
+#         with NaN for null, and other columns are object arrays of
+#         strings with None for null
+#     n_rows : integer
+#         the number of rows
+Table = namedtuple("Table", ("header", "columns", "n_rows"))
+
+BACKTICK = re.compile(r"`([^`]*)`")
+
+# the nodes of literals, which are Num, Str, and NameConstant before
+# Python 3.8
+if sys.version_info < (3, 8):
+    __LITERALS = (ast.Num, ast.Str, ast.NameConstant)
+else:
+    __LITERALS = (ast.Constant,)
+
+def __is_literal(node):
+    # if the node is a number or string
+    if not isinstance(node, __LITERALS):
+        return False
+    v = ast.literal_eval(node)
+    return isinstance(v, (int, float, str)) and not isinstance(v, bool)
+
+__COMPARE = {
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal
+    }
+__ARITHMETIC = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.FloorDiv: np.floor_divide,
+    ast.Mod: np.mod,
+    ast.Pow: np.power
+    }
+
+def typed_column(values):
+    """
+    Convert the string values of a column into a typed numpy array.
+
+    arguments:
+        values : list of strings or None
+            the values of a column
+
+    returns:
+        an int64 array if all of the values are integers, a float64 array
+        (with NaN for null) if all of the values are numbers or null, and
+        otherwise an object array of the values
+    """
+
+    if None not in values:
+        try:
+            return np.array([int(v) for v in values], dtype=np.int64)
+        except (ValueError, OverflowError):
+            pass
+    try:
+        return np.array([np.nan if v is None else float(v) for v in values],
+                        dtype=np.float64)
+    except ValueError:
+        return np.array(values, dtype=object)
+
+def get_table(db_path, csv_path=d.SPEC_D_CSV_FILENAME, columns=None):
+    """
+    Load the columns of a Spec D database into a Table, including the
+    sidecar columns.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        columns : iterator of strings = None
+            the names of the columns to load, or all of them if None
+
+    returns:
+        a Table, or None if the csv_path can not be opened
+
+    raises:
+        an exception if a column is not in the database
+    """
+
+    if columns is not None and len(tuple(columns)) == 0:
+        # only count the rows
+        rows = d.get_iterator(db_path, csv_path)
+        if rows is None:
+            return None
+        next(rows)
+        return Table((), (), sum(1 for row in rows))
+
+    loaded = d.load_columns(db_path, csv_path, columns)
+    if loaded is None:
+        return None
+    header, values = loaded
+    n_rows = len(values[0]) if len(values) > 0 else 0
+    return Table(header, tuple([typed_column(v) for v in values]), n_rows)
+
+def __column_name(name):
+    return "__column_{0}".format(name)
+
+def parse(expression):
+    """
+    Parse and check a row selection expression.
+
+    arguments:
+        expression : string
+            the expression
+
+    returns:
+        a tuple of (the parsed expression, a tuple of the column names in
+        the expression)
+
+    raises:
+        ValueError if the expression is not valid
+    """
+
+    # replace the backtick quoted names with identifiers
+    quoted = []
+    def quote(match):
+        quoted.append(match.group(1))
+        return __column_name(len(quoted) - 1)
+    try:
+        tree = ast.parse(BACKTICK.sub(quote, expression).strip(),
+                         mode="eval")
+    except SyntaxError as e:
+        raise ValueError("Invalid expression \"{0}\": {1}.".format(
+            expression, e.msg))
+
+    names = []
+    def check(node):
+        if isinstance(node, ast.Expression):
+            check(node.body)
+        elif isinstance(node, ast.BoolOp):
+            for v in node.values:
+                check(v)
+        elif isinstance(node, ast.UnaryOp) and \
+             isinstance(node.op, (ast.Not, ast.USub, ast.UAdd)):
+            check(node.operand)
+        elif isinstance(node, ast.BinOp) and type(node.op) in __ARITHMETIC:
+            check(node.left)
+            check(node.right)
+        elif isinstance(node, ast.Compare):
+            check(node.left)
+            for op, right in zip(node.ops, node.comparators):
+                if isinstance(op, (ast.In, ast.NotIn)):
+                    if not isinstance(right, (ast.Tuple, ast.List)) or \
+                       not all([__is_literal(e) for e in right.elts]):
+                        raise ValueError("\"in\" needs a tuple or list of "
+                                         "values.")
+                elif type(op) in __COMPARE:
+                    check(right)
+                else:
+                    raise ValueError("Unsupported comparison.")
+        elif isinstance(node, ast.Name):
+            if node.id.startswith("__column_"):
+                node.id = quoted[int(node.id[len("__column_"):])]
+            names.append(node.id)
+        elif __is_literal(node):
+            pass
+        else:
+            raise ValueError("Unsupported expression \"{0}\".".format(
+                ast.dump(node)))
+    check(tree)
+
+    return (tree, tuple(sorted(set(names))))
+
+def evaluate(table, tree):
+    """
+    Evaluate a parsed row selection expression on a Table.
+
+    arguments:
+        table : Table
+            the columns of the database, including all of the columns in
+            the expression
+        tree : parsed expression
+            the expression, from parse
+
+    returns:
+        a numpy boolean array, the mask of the selected rows
+
+    raises:
+        ValueError if the expression can not be evaluated, i.e., a string
+        column is compared to a number
+    """
+
+    def value(node):
+        if isinstance(node, ast.Expression):
+            return value(node.body)
+        elif isinstance(node, ast.BoolOp):
+            values = [value(v) for v in node.values]
+            if isinstance(node.op, ast.And):
+                return np.logical_and.reduce(values)
+            return np.logical_or.reduce(values)
+        elif isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not):
+                return np.logical_not(value(node.operand))
+            elif isinstance(node.op, ast.USub):
+                return np.negative(value(node.operand))
+            return value(node.operand)
+        elif isinstance(node, ast.BinOp):
+            return __ARITHMETIC[type(node.op)](value(node.left),
+                                               value(node.right))
+        elif isinstance(node, ast.Compare):
+            mask = np.ones(table.n_rows, dtype=bool)
+            left = value(node.left)
+            for op, right in zip(node.ops, node.comparators):
+                if isinstance(op, (ast.In, ast.NotIn)):
+                    selected = np.isin(left, [ast.literal_eval(e)
+                                              for e in right.elts])
+                    if isinstance(op, ast.NotIn):
+                        selected = np.logical_not(selected)
+                    mask = mask & selected
+                else:
+                    right = value(right)
+                    mask = mask & __COMPARE[type(op)](left, right)
+                    left = right
+            return mask
+        elif isinstance(node, ast.Name):
+            return table.columns[table.header.index(node.id)]
+        return ast.literal_eval(node)
+
+    try:
+        mask = value(tree)
+    except TypeError as e:
+        raise ValueError("Unable to evaluate expression: {0}.".format(e))
+    mask = np.asarray(mask)
+    if mask.dtype != bool:
+        raise ValueError("Expression is not a comparison.")
+    return np.broadcast_to(mask, (table.n_rows,))
+
+def where(db_path, expression, csv_path=d.SPEC_D_CSV_FILENAME):
+    """
+    Select the rows of a Spec D database with an expression, i.e.,
+    "theta >= 30 and phi == -180". Only the columns in the expression are
+    loaded, and the expression is evaluated on whole columns at once.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        expression : string
+            the row selection expression
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        a numpy boolean array, the mask of the selected rows, which can
+        be given as the mask of d.add_columns_by_row_data,
+        d.add_columns_by_row_functions, and d.get_sqlite3, or None if the
+        csv_path can not be opened
+
+    raises:
+        ValueError if the expression is not valid, or names a column that
+        is not in the database
+    """
+
+    tree, names = parse(expression)
+    rows = d.get_iterator(db_path, csv_path)
+    if rows is None:
+        return None
+    header = next(rows)
+    del(rows)
+    for n in names:
+        if n not in header:
+            raise ValueError("\"{0}\" is not a column.".format(n))
+    return evaluate(get_table(db_path, csv_path, names), tree)
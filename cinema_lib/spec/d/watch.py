@@ -0,0 +1,331 @@
+"""
+Add columns to a Spec D database that is growing, i.e., a running
+simulation appending rows to its CSV. Only the new complete rows are
+processed, and the new columns are appended to the sidecar column store
+(see d.add_sidecar_columns_by_row_data), so the CSV is only read. The
+byte offset of the first unprocessed row is kept in a state file next to
+the CSV, so watching can be stopped and resumed.
+
+The CSV must only be appended to, and its values must not have quoted
+newlines. Growth is detected with inotify, if the optional inotify_simple
+module is installed, otherwise by polling.
+"""
+
+from ...spec import d
+
+import os
+import json
+import time
+import tempfile
+import logging as log
+
+WATCH_EXT = ".watch.json"
+
+def get_watch_path(db_path, csv_path=d.SPEC_D_CSV_FILENAME):
+    """
+    Return the path of the watch state of a Spec D CSV.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        the POSIX path of the state, i.e., <db_path>/<csv_path>.watch.json
+    """
+
+    return os.path.join(db_path, csv_path + WATCH_EXT)
+
+def get_watch_state(db_path, csv_path=d.SPEC_D_CSV_FILENAME):
+    """
+    Return the watch state of a Spec D CSV: the "columns" being added,
+    their sidecar "files" and the byte "sizes" of them, the CSV "header",
+    the byte "offset" of the first unprocessed row, and the number of
+    processed "rows".
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        the state dictionary, or None if the CSV is not being watched
+    """
+
+    fn = get_watch_path(db_path, csv_path)
+    if not os.path.isfile(fn):
+        return None
+    with open(fn, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def get_iterator(db_path, csv_path=d.SPEC_D_CSV_FILENAME):
+    """
+    Return an iterator of the rows of a Spec D database as the row
+    functions of update are given them, i.e., as d.get_iterator returns
+    them, but without the columns being watched.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+
+    returns:
+        an iterator of tuples of strings, the first being the header
+    """
+
+    state = get_watch_state(db_path, csv_path)
+    watched = [] if state is None else state["columns"]
+    rows = d.get_iterator(db_path, csv_path)
+    header = next(rows)
+    keep = [i for i, c in enumerate(header) if c not in watched]
+    yield tuple([header[i] for i in keep])
+    for row in rows:
+        yield tuple([row[i] for i in keep])
+
+def __write_state(db_path, csv_path, state):
+    fn = get_watch_path(db_path, csv_path)
+    fd, tmp_fn = tempfile.mkstemp(prefix="." + os.path.basename(fn) + ".",
+                                  suffix=".tmp", dir=os.path.dirname(fn))
+    with open(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.chmod(tmp_fn, d.get_file_mode(fn))
+    os.replace(tmp_fn, fn)
+
+def __raw_header(fn):
+    # the header of the CSV and the byte offset of the first row, or None
+    # if the header is not complete
+    with open(fn, "rb") as f:
+        line = f.readline()
+    if not line.endswith(b"\n"):
+        return None
+    return (next(d.get_chunk_iterator(os.path.dirname(fn),
+                                      (0, len(line)), os.path.basename(fn))),
+            len(line))
+
+def __start(db_path, csv_path, column_names):
+    # load the watch state, or register the new sidecar columns
+    column_names = list(column_names)
+    state = get_watch_state(db_path, csv_path)
+    directory = d.get_sidecar_path(db_path, csv_path)
+    if state is not None:
+        if state["columns"] != column_names:
+            raise ValueError("Already watching for columns {0}.".format(
+                state["columns"]))
+        # discard values appended after the last update of the state
+        for fn, size in zip(state["files"], state["sizes"]):
+            with open(os.path.join(directory, fn), "r+b") as f:
+                f.truncate(size)
+        return state
+
+    header = __raw_header(os.path.join(db_path, csv_path))
+    if header is None:
+        return None
+    header, offset = header
+    joined = next(d.get_iterator(db_path, csv_path))
+    if len(set(joined + tuple(column_names))) != \
+       len(joined) + len(column_names):
+        raise ValueError("Column names are not unique: {0}.".format(
+            column_names))
+
+    manifest = d.get_sidecar_manifest(db_path, csv_path)
+    if manifest is None:
+        manifest = {d.SIDECAR_KEY_COLUMNS: []}
+    os.makedirs(directory, exist_ok=True)
+    start = len(manifest[d.SIDECAR_KEY_COLUMNS])
+    files = [str(start + i) + ".col" for i in range(0, len(column_names))]
+    for name, fn in zip(column_names, files):
+        open(os.path.join(directory, fn), "wb").close()
+        manifest[d.SIDECAR_KEY_COLUMNS].append({d.SIDECAR_KEY_NAME: name,
+                                                d.SIDECAR_KEY_FILE: fn,
+                                                d.SIDECAR_KEY_ROWS: 0})
+    state = {"columns": column_names, "files": files,
+             "sizes": [0] * len(files), "header": list(header),
+             "offset": offset, "rows": 0}
+    __write_state(db_path, csv_path, state)
+    d.write_sidecar_manifest(db_path, manifest, csv_path)
+    return state
+
+def update(db_path, columns, csv_path=d.SPEC_D_CSV_FILENAME,
+           checkpoint=d.CHECKPOINT_ROWS):
+    """
+    Add the values of new columns for the rows that have been appended to
+    a Spec D database since the last update. Only complete rows (ending
+    in a newline) are processed.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        columns : iterator of (tuple of strings, function)
+            the new column names and the row function that returns their
+            values (see d.add_columns_by_row_functions). the row functions
+            are given the rows as get_iterator returns them, with null
+            values for the sidecar columns, and without the new columns
+            (see get_iterator)
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        checkpoint : integer = d.CHECKPOINT_ROWS
+            save the progress every *checkpoint* rows
+
+    returns:
+        the number of new rows
+
+    raises:
+        ValueError if the columns are different than the columns being
+        watched, the CSV was changed other than by appending to it, or a
+        new row does not have a value for every column
+
+    side effects:
+        registers the new columns as sidecar columns, appends their
+        values, and updates the watch state
+    """
+
+    columns = list(columns)
+    names = [n for c in columns for n in c[0]]
+    fn = os.path.join(db_path, csv_path)
+    state = __start(db_path, csv_path, names)
+    if state is None:
+        return 0
+
+    # the CSV must have been appended to
+    size = os.path.getsize(fn)
+    header = __raw_header(fn)
+    if size < state["offset"] or header is None or \
+       list(header[0]) != state["header"]:
+        raise ValueError("\"{0}\" was changed, not appended to.".format(fn))
+    raw = state["header"]
+
+    # the row as get_iterator returns it
+    joined = next(get_iterator(db_path, csv_path))
+    order = [raw.index(c) if c in raw else None for c in joined]
+    def join(row):
+        return tuple([None if i is None else row[i] for i in order])
+
+    directory = d.get_sidecar_path(db_path, csv_path)
+    files = [open(os.path.join(directory, f), "ab") for f in state["files"]]
+    n_rows = 0
+    try:
+        with open(fn, "rb") as f:
+            f.seek(state["offset"])
+            while True:
+                # the complete rows of the next checkpoint
+                start = state["offset"]
+                end = start
+                for i in range(0, max(1, checkpoint or 0)):
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    end += len(line)
+                if end == start:
+                    break
+                f.seek(end)
+
+                n = 0
+                for row in d.get_chunk_iterator(db_path, (start, end),
+                                                csv_path):
+                    if len(row) != len(raw):
+                        raise ValueError("Row {0} has {1} values, but there "
+                            "are {2} columns.".format(state["rows"] + n + 1,
+                            len(row), len(raw)))
+                    row = join(row)
+                    values = [v for names, function in columns
+                              for v in function(row)]
+                    for out, v in zip(files, values):
+                        out.write(d.sidecar_value(v))
+                    n += 1
+                for out in files:
+                    out.flush()
+                    os.fsync(out.fileno())
+
+                # save the progress
+                state["offset"] = end
+                state["rows"] += n
+                state["sizes"] = [out.tell() for out in files]
+                __write_state(db_path, csv_path, state)
+                n_rows += n
+    finally:
+        for out in files:
+            out.close()
+
+    if n_rows > 0:
+        manifest = d.get_sidecar_manifest(db_path, csv_path)
+        for c in manifest[d.SIDECAR_KEY_COLUMNS]:
+            if c[d.SIDECAR_KEY_FILE] in state["files"]:
+                c[d.SIDECAR_KEY_ROWS] = state["rows"]
+        d.write_sidecar_manifest(db_path, manifest, csv_path)
+    return n_rows
+
+def wait(db_path, timeout, csv_path=d.SPEC_D_CSV_FILENAME):
+    """
+    Wait for a Spec D CSV to change, or a timeout. Uses inotify if the
+    inotify_simple module is installed, otherwise it sleeps.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        timeout : number
+            the maximum number of seconds to wait
+
+    side effects:
+        waits
+    """
+
+    try:
+        import inotify_simple
+    except ImportError:
+        time.sleep(timeout)
+        return
+    with inotify_simple.INotify() as inotify:
+        inotify.add_watch(os.path.join(db_path, csv_path),
+                          inotify_simple.flags.MODIFY |
+                          inotify_simple.flags.CLOSE_WRITE)
+        inotify.read(timeout=int(timeout * 1000))
+
+def watch(db_path, columns, csv_path=d.SPEC_D_CSV_FILENAME, interval=1.0,
+          idle=None, checkpoint=d.CHECKPOINT_ROWS):
+    """
+    Add the values of new columns for the rows of a Spec D database as
+    they are appended (see update), until the database stops growing.
+
+    arguments:
+        db_path : string
+            POSIX path to Cinema database
+        columns : iterator of (tuple of strings, function)
+            the new column names and their row functions
+        csv_path : string = d.SPEC_D_CSV_FILENAME
+            POSIX relative path to Cinema CSV
+        interval : number = 1.0
+            the maximum number of seconds between checking for new rows
+        idle : number = None
+            stop after no new rows for *idle* seconds, or never if None
+        checkpoint : integer = d.CHECKPOINT_ROWS
+            save the progress every *checkpoint* rows
+
+    returns:
+        the number of new rows
+
+    raises:
+        ValueError (see update)
+
+    side effects:
+        see update
+    """
+
+    columns = list(columns)
+    total = 0
+    last = time.monotonic()
+    while True:
+        n = update(db_path, columns, csv_path, checkpoint)
+        total += n
+        if n > 0:
+            log.info("Added columns to {0} rows.".format(n))
+            last = time.monotonic()
+        elif idle is not None and time.monotonic() - last >= idle:
+            return total
+        wait(db_path, interval if idle is None else
+                      max(0, min(interval, last + idle - time.monotonic())),
+             csv_path)
@@ -14,6 +14,7 @@ import tempfile as temp
 import shutil as sh
 from functools import reduce
 import filecmp
+import json
         
 TEST_PATH = "cinema_lib/test/data"
 
@@ -71,6 +72,106 @@ class SpecA(unittest.TestCase):
         self.assertEqual(next(it), ("phi", "theta", "FILE"))
         self.assertEqual(len([i for i in it]), 20)
 
+    def test_sphere_accessor(self):
+        it = a.get_iterator(self.SPHERE_DATA)
+        access = a.get_accessor(self.SPHERE_DATA)
+        self.assertEqual(access.header, next(it))
+        self.assertEqual(len(access), 20)
+        self.assertEqual(list(access), list(it))
+        self.assertEqual(access.index((54, 0)), 13)
+        self.assertEqual(access.index({"theta": 0, "phi": 54}), 13)
+        self.assertEqual(access.filename((54, 0)), "54/0.png")
+        self.assertEqual(access[-1], (162, 0, "162/0.png"))
+        self.assertEqual(a.get_accessor(self.SPHERE_DATA, "nonexistent.json"),
+                         None)
+
+    def test_accessor(self):
+        access = a.Accessor({
+            a.KEY_NAME_PATTERN: "{c}/{a}_{b}.png",
+            a.KEY_ARGUMENTS: {
+                "c": {a.KEY_ARG_VALUES: [0.5, 1.5]},
+                "a": {a.KEY_ARG_VALUES: [1, 2, 3]},
+                "b": {a.KEY_ARG_VALUES: ["x", "y", "z", "w"]}
+                }
+            })
+        self.assertEqual(access.header, ("a", "b", "c", "FILE"))
+        self.assertEqual(len(access), 24)
+        rows = [(i, j, k, "{2}/{0}_{1}.png".format(i, j, k))
+                for i in (1, 2, 3) for j in ("x", "y", "z", "w") 
+                for k in (0.5, 1.5)]
+        self.assertEqual(list(access), rows)
+        for n, row in enumerate(rows):
+            self.assertEqual(access[n], row)
+            self.assertEqual(access.index(row[:-1]), n)
+            self.assertEqual(access.parameters(n), row[:-1])
+        self.assertEqual(access[5:17:3], rows[5:17:3])
+        self.assertEqual(access[::-1], rows[::-1])
+        with self.assertRaises(IndexError):
+            access[24]
+        with self.assertRaises(ValueError):
+            access.index((1, "q", 0.5))
+        with self.assertRaises(ValueError):
+            access.index((1, "x"))
+
+    def test_sphere_filters(self):
+        it = a.get_iterator(self.SPHERE_DATA, filters={
+            "phi": a.range_filter(-36, 36)})
+        self.assertEqual(next(it), ("phi", "theta", "FILE"))
+        self.assertEqual([r[0] for r in it], [-36, -18, 0, 18, 36])
+        access = a.get_accessor(self.SPHERE_DATA, filters=[
+            a.parse_selector("phi=90,-90, 45"), a.parse_selector("theta=0")])
+        self.assertEqual(list(access), [(-90, 0, "-90/0.png"), 
+                                        (90, 0, "90/0.png")])
+        self.assertEqual(a.get_iterator(self.SPHERE_DATA, 
+                                        filters={"psi": a.range_filter()}),
+                         None)
+
+    def test_name_pattern(self):
+        values = ((-90, 0, 90), (0.5, 1.5), ("a", "b"))
+        keylist = ("phi", "theta", "var")
+        db_path = temp.mkdtemp()
+        def rows(pattern):
+            with open(os.path.join(db_path, a.SPEC_A_JSON_FILENAME), "w") \
+                 as f:
+                json.dump({
+                    a.KEY_NAME_PATTERN: pattern,
+                    a.KEY_ARGUMENTS: {k: {a.KEY_ARG_VALUES: list(v)} 
+                                      for k, v in zip(keylist, values)}}, f)
+            it = list(a.get_iterator(db_path))[1:]
+            self.assertEqual(it, list(a.get_accessor(db_path)))
+            return it
+        for pattern in ("{var}/{phi}_{theta}.png", "{theta:.2f}%_{phi:+04d}",
+                        "{phi}/{var!r}_{phi}.png", "const.png",
+                        "{{var}}{var}.png", "{phi.real}"):
+            self.assertEqual([r[-1] for r in rows(pattern)],
+                [pattern.format(phi=phi, theta=theta, var=var) 
+                 for phi in values[0] for theta in values[1] 
+                 for var in values[2]])
+        sh.rmtree(db_path)
+        self.assertNotEqual(a.compile_name_pattern("{theta:.2f}%_{phi:+04d}",
+                                                   keylist, values), None)
+        self.assertEqual(a.compile_name_pattern("{phi.real}", keylist, 
+                                                values), None)
+        self.assertEqual(a.compile_name_pattern("{0}", keylist, values), None)
+
+    def test_sphere_strings(self):
+        it = a.get_iterator(self.SPHERE_DATA, as_strings=True)
+        self.assertEqual(next(it), ("phi", "theta", "FILE"))
+        self.assertEqual(next(it), ("-180", "0", "-180/0.png"))
+
+    def test_selectors(self):
+        values = [-1.5, 0, 2, "x", "y"]
+        def selected(selector):
+            name, f = a.parse_selector(selector)
+            return (name, [v for v in values if f(v)])
+        self.assertEqual(selected("phi=-2:0"), ("phi", [-1.5, 0]))
+        self.assertEqual(selected("phi=1:"), ("phi", [2]))
+        self.assertEqual(selected("phi=:"), ("phi", values))
+        self.assertEqual(selected(" phi = 2,y,-1.5"), ("phi", [-1.5, 2, "y"]))
+        for bad in ("phi", "=1", "phi=1:2:3"):
+            with self.assertRaises(ValueError):
+                a.parse_selector(bad)
+
     def test_sphere_wrong_filetype(self):
         self.assertFalse(a.check_database(self.SPHERE_DATA, 
                          d.SPEC_D_CSV_FILENAME))
@@ -317,6 +418,119 @@ class Convert(unittest.TestCase):
         os.unlink(self.d_csv)
         os.unlink(self.a_json)
 
+    def test_convert_a_to_d_selected(self):
+        sh.copyfile(self.a_backup, self.a_json)
+        self.assertTrue(spec.convert_a_to_d(self.SPHERE_DATA, 
+                        [a.parse_selector("phi=-180:0")]))
+        self.assertTrue(d.check_database(self.SPHERE_DATA))
+        rows = list(d.get_iterator(self.SPHERE_DATA))
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[-1], ("0", "0", "0/0.png"))
+        os.unlink(self.d_csv)
+        os.unlink(self.a_json)
+
+    def test_convert_d_to_a(self):
+        sh.copyfile(self.d_backup, self.d_csv)
+        self.assertTrue(spec.convert_d_to_a(self.SPHERE_DATA))
+        self.assertTrue(a.check_database(self.SPHERE_DATA))
+        db = a.get_dictionary(self.SPHERE_DATA)
+        self.assertEqual(db[a.KEY_NAME_PATTERN], "{phi}/{theta}.png")
+        self.assertEqual(db[a.KEY_ARGUMENTS]["theta"][a.KEY_ARG_VALUES], [0])
+        rows = d.get_iterator(self.SPHERE_DATA)
+        self.assertEqual(next(rows), ("theta", "phi", "FILE"))
+        self.assertEqual(sorted([(r[1], r[0], r[2]) for r in rows]), 
+            sorted([r for r in a.get_iterator(self.SPHERE_DATA, 
+                                              as_strings=True)][1:]))
+        self.assertFalse(spec.convert_d_to_a(self.SPHERE_DATA))
+        os.unlink(self.a_json)
+        os.unlink(self.d_csv)
+
+    def test_convert_d_to_a_irregular(self):
+        with open(self.d_backup) as f:
+            lines = f.readlines()
+        grid = ["theta,phi,FILE\n"] + ["{0},{1},{1}/{0}.png\n".format(t, p)
+                                       for t in (0, 1) for p in (0, 90, 180)]
+        for csv_lines in (
+                # missing combination
+                grid[:-1],
+                # repeated and missing combinations
+                grid[:-1] + grid[1:2],
+                # files that are not a pattern
+                lines[:-1] + ["0,162,foo.png\n"],
+                # two FILE columns
+                [lines[0].strip() + ",FILE2\n"] + 
+                [l.strip() + ",x.png\n" for l in lines[1:]],
+                # empty values
+                lines[:-1] + ["0,,162/0.png\n"]):
+            with open(self.d_csv, "w") as f:
+                f.writelines(csv_lines)
+            self.assertFalse(spec.convert_d_to_a(self.SPHERE_DATA))
+            self.assertFalse(os.path.exists(self.a_json))
+
+        # another grid, with string and float values
+        with open(self.d_csv, "w") as f:
+            f.write("var,FILE,time\n")
+            for t in ("0.5", "1.5", "2.0"):
+                for v in ("rho", "u"):
+                    f.write("{0},{1}_{0}/{0}-{1}.png,{1}\n".format(v, t))
+        self.assertTrue(spec.convert_d_to_a(self.SPHERE_DATA))
+        db = a.get_dictionary(self.SPHERE_DATA)
+        self.assertEqual(db[a.KEY_NAME_PATTERN], 
+                         "{time}_{var}/{var}-{time}.png")
+        self.assertEqual(db[a.KEY_ARGUMENTS]["time"][a.KEY_ARG_VALUES], 
+                         [0.5, 1.5, 2.0])
+        self.assertEqual(db[a.KEY_ARGUMENTS]["var"][a.KEY_ARG_VALUES], 
+                         ["rho", "u"])
+        os.unlink(self.a_json)
+        os.unlink(self.d_csv)
+
+    def test_convert_d_to_a_same_values(self):
+        import itertools
+
+        # parameters with the same values, the first row all zeros, and
+        # more candidate patterns of the first row than MAX_NAME_PATTERNS
+        for names, pattern, values in (
+                ("abce", "{e}/{c}/{b}/{a}.png", range(0, 3)),
+                ("abcdef", "{f}{e}{d}_{c}{b}{a}_0.png", range(0, 2)),
+                ("ab", "{b}/{a}/{b}{a}{b}.png", range(0, 11))):
+            with open(self.d_csv, "w") as f:
+                f.write(",".join(names) + ",FILE\n")
+                for row in itertools.product(values, repeat=len(names)):
+                    f.write(",".join([str(v) for v in row]) + "," +
+                            pattern.format(**dict(zip(names, row))) + "\n")
+            self.assertTrue(spec.convert_d_to_a(self.SPHERE_DATA))
+            db = a.get_dictionary(self.SPHERE_DATA)
+            self.assertEqual(db[a.KEY_NAME_PATTERN], pattern)
+            self.assertEqual(
+                sorted([r[-1] for r in list(d.get_iterator(
+                    self.SPHERE_DATA))[1:]]),
+                sorted([r[-1] for r in list(a.get_iterator(
+                    self.SPHERE_DATA, as_strings=True))[1:]]))
+            os.unlink(self.a_json)
+
+            # a file that doesn't match is still found
+            with open(self.d_csv, "a") as f:
+                f.write("\n")
+            with open(self.d_csv) as f:
+                lines = f.readlines()
+            lines[-3] = lines[-3].replace(".png", ".jpg")
+            with open(self.d_csv, "w") as f:
+                f.writelines(lines[:-1])
+            self.assertFalse(spec.convert_d_to_a(self.SPHERE_DATA))
+            self.assertFalse(os.path.exists(self.a_json))
+        os.unlink(self.d_csv)
+
+    def test_a_as_d_iterator(self):
+        self.assertEqual(spec.get_a_as_d_iterator(self.SPHERE_DATA), None)
+        os.mkdir(os.path.join(self.SPHERE_DATA, "image"))
+        sh.copyfile(self.a_backup, os.path.join(self.SPHERE_DATA, "image",
+                                                a.SPEC_A_JSON_FILENAME))
+        rows = list(spec.get_a_as_d_iterator(self.SPHERE_DATA))
+        self.assertEqual(rows[0], ("phi", "theta", "FILE"))
+        self.assertEqual(rows[1], ("-180", "0", "image/-180/0.png"))
+        self.assertEqual(len(rows), 21)
+        sh.rmtree(os.path.join(self.SPHERE_DATA, "image"))
+
     def test_sqlite3(self):
         sh.copyfile(self.d_backup, self.d_csv)
         db = d.get_sqlite3(self.SPHERE_DATA)
@@ -522,6 +736,69 @@ class BackupD(unittest.TestCase):
             os.path.join(self.SPHERE_DATA, backup_fn), False))
         os.unlink(os.path.join(self.SPHERE_DATA, backup_fn))
 
+    def test_link_backup(self):
+        import hashlib
+        sh.copyfile(self.d_backup, self.d_csv)
+        with open(self.d_csv, "rb") as f:
+            digest = hashlib.md5(f.read()).hexdigest()
+        self.assertEqual(d.hash_file(self.d_csv), digest)
+        backup_fn = d.link_to_backup(self.SPHERE_DATA)
+        self.assertTrue(backup_fn.endswith("." + digest))
+        self.assertTrue(os.path.isfile(self.d_csv))
+        self.assertTrue(filecmp.cmp(self.d_backup,
+            os.path.join(self.SPHERE_DATA, backup_fn), False))
+        os.unlink(os.path.join(self.SPHERE_DATA, backup_fn))
+        os.unlink(self.d_csv)
+
+    def test_replace_failure(self):
+        sh.copyfile(self.d_backup, self.d_csv)
+        before = set(os.listdir(self.SPHERE_DATA))
+        def fail(row):
+            if row[1] == "0":
+                raise Exception("foo")
+            return (row[1],)
+        with self.assertRaises(Exception):
+            d.add_columns_by_row_data(self.SPHERE_DATA, ("foo",), fail)
+        # untouched, and no temporary files or backups
+        self.assertEqual(before, set(os.listdir(self.SPHERE_DATA)))
+        self.assertTrue(filecmp.cmp(self.d_backup, self.d_csv, False))
+
+        def write(f):
+            f.write("foo\n1\n")
+        backup_fn = d.replace_csv(self.SPHERE_DATA, write)
+        self.assertTrue(filecmp.cmp(self.d_backup,
+            os.path.join(self.SPHERE_DATA, backup_fn), False))
+        self.assertEqual(list(d.get_iterator(self.SPHERE_DATA)), 
+                         [("foo",), ("1",)])
+        self.assertEqual(len(os.listdir(self.SPHERE_DATA)), len(before) + 1)
+        os.unlink(os.path.join(self.SPHERE_DATA, backup_fn))
+        os.unlink(self.d_csv)
+
+    def test_replace_mode(self):
+        import stat
+
+        def mode(fn):
+            return stat.S_IMODE(os.stat(fn).st_mode)
+
+        # the permissions of the old CSV are kept
+        for permissions in (0o644, 0o640):
+            sh.copyfile(self.d_backup, self.d_csv)
+            os.chmod(self.d_csv, permissions)
+            d.add_column_by_row_data(self.SPHERE_DATA, "foo",
+                                     lambda row: row[1])
+            self.assertEqual(mode(self.d_csv), permissions)
+            os.unlink(self.d_csv)
+
+        # a new CSV has the permissions of a new file
+        umask = os.umask(0o022)
+        try:
+            d.replace_csv(self.SPHERE_DATA, lambda f: f.write("foo\n1\n"),
+                          "new.csv")
+        finally:
+            os.umask(umask)
+        self.assertEqual(mode(os.path.join(self.SPHERE_DATA, "new.csv")),
+                         0o644)
+
 class AddColumnD(unittest.TestCase):
     """
     Add column tests for Spec D.
@@ -696,6 +973,1300 @@ class AddColumnD(unittest.TestCase):
         self.assertTrue(reduce(lambda x, y: x + 1, new_db, 0) == 21)
         os.unlink(self.d_csv)
 
+    def test_row_functions(self):
+        sh.copyfile(self.d_backup, self.d_csv)
+        calls = []
+        def plus_one(row):
+            calls.append(row)
+            return (str(int(row[1]) + 1),)
+        def create_file(row):
+            fn = row[-1] + ".foo"
+            open(os.path.join(self.SPHERE_DATA, fn), "w").close()
+            return (fn,)
+        backup = d.add_columns_by_row_functions(self.SPHERE_DATA, 
+                (
+                    (("phi plus one",), plus_one),
+                    (("FILE foo",), create_file),
+                    (("phi plus two", "phi plus three"), 
+                     lambda x: (str(int(x[1]) + 2), str(int(x[1]) + 3)))
+                ))
+        backup_db = os.path.join(self.SPHERE_DATA, backup)
+        self.assertTrue(filecmp.cmp(backup_db, self.d_backup, False))
+        self.assertEqual(len(calls), 20)
+        new_db = d.get_iterator(self.SPHERE_DATA)
+        header = next(new_db)
+        self.assertEqual(header, ("theta","phi", "phi plus one", 
+                                  "phi plus two", "phi plus three",
+                                  "FILE", "FILE foo"))
+        self.assertTrue(reduce(
+                        lambda x, y: x and 
+                                     (int(y[1]) + 1 == int(y[2])) and
+                                     (int(y[1]) + 2 == int(y[3])) and
+                                     (int(y[1]) + 3 == int(y[4])) and
+                                     (y[5] + ".foo" == y[6]),
+                        new_db, True))
+        self.assertTrue(d.check_database(self.SPHERE_DATA))
+
+        with self.assertRaises(Exception):
+            d.add_columns_by_row_functions(self.SPHERE_DATA,
+                ((("a",), plus_one), (("a",), plus_one)))
+
+        # the new columns can not already exist, with or without a sidecar
+        before = set(os.listdir(self.SPHERE_DATA))
+        with open(self.d_csv, "rb") as f:
+            original = f.read()
+        for sidecar in (False, True):
+            for names in (("phi plus one",), ("FILE",)):
+                with self.assertRaises(Exception):
+                    d.add_columns_by_row_functions(self.SPHERE_DATA,
+                        ((names, plus_one),), sidecar=sidecar)
+        with self.assertRaises(Exception):
+            d.add_column_by_row_data(self.SPHERE_DATA, "theta",
+                                     lambda x: x[0])
+        self.assertEqual(before, set(os.listdir(self.SPHERE_DATA)))
+        with open(self.d_csv, "rb") as f:
+            self.assertEqual(f.read(), original)
+        os.unlink(self.d_csv)
+
+class SidecarD(unittest.TestCase):
+    """
+    Sidecar column tests for Spec D.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        # copy files to tmp
+        self.SOURCE_DATA = os.path.join(TEST_PATH, "sphere.cdb")
+        self.TEMP_PATH = temp.mkdtemp()
+        self.SPHERE_DATA = os.path.join(self.TEMP_PATH, "sphere.cdb")
+        sh.copytree(self.SOURCE_DATA, self.SPHERE_DATA)
+        self.SPHERE_TABLE = "sphere"
+        self.d_csv = os.path.join(self.SPHERE_DATA, d.SPEC_D_CSV_FILENAME)
+        self.d_backup = os.path.join(self.SPHERE_DATA, "csv.good")
+        sh.copyfile(self.d_csv, self.d_backup)
+
+        def create_file(row):
+            fn = row[-1] + ".foo"
+            open(os.path.join(self.SPHERE_DATA, fn), "w").close()
+            return (fn,)
+        self.create_file = create_file
+
+    def tearDown(self):
+        sh.rmtree(self.TEMP_PATH)
+
+    def test_sidecar(self):
+        files = d.add_sidecar_columns_by_row_data(self.SPHERE_DATA, 
+                ("phi plus one", "empty"),
+                lambda x: (str(int(x[1]) + 1), None))
+        self.assertEqual(len(files), 2)
+        d.add_sidecar_columns_by_row_data(self.SPHERE_DATA, ("FILE foo",),
+                                          self.create_file)
+        # the CSV is untouched
+        self.assertTrue(filecmp.cmp(self.d_backup, self.d_csv, False))
+        with self.assertRaises(Exception):
+            d.add_sidecar_columns_by_row_data(self.SPHERE_DATA, ("phi",),
+                                              lambda x: (x[1],))
+
+        new_db = d.get_iterator(self.SPHERE_DATA)
+        self.assertEqual(next(new_db), ("theta", "phi", "phi plus one", 
+                                        "empty", "FILE", "FILE foo"))
+        n = 0
+        for row in new_db:
+            self.assertEqual(int(row[1]) + 1, int(row[2]))
+            self.assertEqual(row[3], None)
+            self.assertEqual(row[4] + ".foo", row[5])
+            n = n + 1
+        self.assertEqual(n, 20)
+        raw_db = d.get_iterator(self.SPHERE_DATA, sidecar=False)
+        self.assertEqual(next(raw_db), ("theta", "phi", "FILE"))
+        self.assertTrue(d.check_database(self.SPHERE_DATA))
+
+        header, columns = d.load_columns(self.SPHERE_DATA, 
+                                         columns=("phi plus one", "phi"))
+        self.assertEqual(header, ("phi plus one", "phi"))
+        self.assertEqual([int(i) + 1 for i in columns[1]], 
+                         [int(i) for i in columns[0]])
+
+        # compact into a standard CSV
+        joined = list(d.get_iterator(self.SPHERE_DATA))
+        backup = d.compact(self.SPHERE_DATA)
+        self.assertTrue(filecmp.cmp(self.d_backup, 
+            os.path.join(self.SPHERE_DATA, backup), False))
+        self.assertFalse(os.path.exists(d.get_sidecar_path(self.SPHERE_DATA)))
+        self.assertEqual(joined, list(d.get_iterator(self.SPHERE_DATA)))
+        self.assertTrue(d.check_database(self.SPHERE_DATA))
+        self.assertEqual(d.compact(self.SPHERE_DATA), None)
+
+    def test_add_columns_folds_sidecar(self):
+        d.add_sidecar_columns_by_row_data(self.SPHERE_DATA, ("phi plus one",),
+                lambda x: (str(int(x[1]) + 1),))
+        db = d.get_sqlite3(self.SPHERE_DATA)
+        fetch = db.execute("SELECT COUNT(*) FROM %s WHERE \"phi plus one\" > 1"
+                           % self.SPHERE_TABLE).fetchone()
+        self.assertEqual(fetch[0], 9)
+        d.add_column_by_row_data(self.SPHERE_DATA, "phi plus two",
+                lambda x: str(int(x[2]) + 1))
+        self.assertEqual(d.get_sidecar_manifest(self.SPHERE_DATA), None)
+        new_db = d.get_iterator(self.SPHERE_DATA, sidecar=False)
+        self.assertEqual(next(new_db), ("theta", "phi", "phi plus one",
+                                        "phi plus two", "FILE"))
+        self.assertTrue(reduce(
+                        lambda x, y: x and int(y[1]) + 2 == int(y[3]),
+                        new_db, True))
+
+class CheckpointD(unittest.TestCase):
+    """
+    Checkpoint (journal) tests for adding columns to Spec D.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        # copy files to tmp
+        self.SOURCE_DATA = os.path.join(TEST_PATH, "sphere.cdb")
+        self.TEMP_PATH = temp.mkdtemp()
+        self.SPHERE_DATA = os.path.join(self.TEMP_PATH, "sphere.cdb")
+        sh.copytree(self.SOURCE_DATA, self.SPHERE_DATA)
+        self.d_csv = os.path.join(self.SPHERE_DATA, d.SPEC_D_CSV_FILENAME)
+        self.d_backup = os.path.join(self.SPHERE_DATA, "csv.good")
+        sh.copyfile(self.d_csv, self.d_backup)
+
+    def tearDown(self):
+        sh.rmtree(self.TEMP_PATH)
+
+    def interrupted(self, add, stop):
+        # run until the row *stop*, returning the rows that were calculated
+        class Interrupt(Exception):
+            pass
+        calculated = []
+        def row_function(row):
+            if len(calculated) == stop:
+                raise Interrupt()
+            calculated.append(row)
+            return (str(int(row[1]) + 1),)
+        with self.assertRaises(Interrupt):
+            add(self.SPHERE_DATA, ("phi plus one",), row_function,
+                checkpoint=4)
+        return calculated
+
+    def resumed(self, add):
+        calculated = []
+        def row_function(row):
+            calculated.append(row)
+            return (str(int(row[1]) + 1),)
+        add(self.SPHERE_DATA, ("phi plus one",), row_function, checkpoint=4)
+        return calculated
+
+    def test_resume(self):
+        journal = d.get_journal_path(self.SPHERE_DATA)
+        self.assertEqual(len(self.interrupted(d.add_columns_by_row_data, 
+                                              10)), 10)
+        self.assertTrue(os.path.isfile(journal))
+        self.assertTrue(filecmp.cmp(self.d_backup, self.d_csv, False))
+
+        # a partially written CSV and entry of a killed update
+        open(os.path.join(self.SPHERE_DATA, ".data.csv.killed.tmp"),
+             "w").close()
+        with open(journal, "a") as f:
+            f.write('[10, ["')
+
+        self.assertEqual(len(self.resumed(d.add_columns_by_row_data)), 10)
+        self.assertFalse(os.path.exists(journal))
+        self.assertEqual(
+            [fn for fn in os.listdir(self.SPHERE_DATA) if fn.endswith(".tmp")],
+            [])
+        new_db = d.get_iterator(self.SPHERE_DATA)
+        self.assertEqual(next(new_db), ("theta", "phi", "phi plus one",
+                                        "FILE"))
+        rows = list(new_db)
+        self.assertEqual(len(rows), 20)
+        self.assertTrue(reduce(
+                        lambda x, y: x and int(y[1]) + 1 == int(y[2]),
+                        rows, True))
+
+    def test_resume_sidecar(self):
+        self.interrupted(d.add_sidecar_columns_by_row_data, 7)
+        self.assertEqual(len(self.resumed(d.add_sidecar_columns_by_row_data)),
+                         13)
+        self.assertFalse(os.path.exists(d.get_journal_path(self.SPHERE_DATA)))
+        header, columns = d.load_columns(self.SPHERE_DATA)
+        self.assertEqual([int(v) + 1 for v in columns[1]],
+                         [int(v) for v in columns[2]])
+
+    def test_discard_journal(self):
+        self.interrupted(d.add_columns_by_row_data, 10)
+        # different columns do not resume
+        calculated = []
+        def row_function(row):
+            calculated.append(row)
+            return (row[0],)
+        d.add_columns_by_row_data(self.SPHERE_DATA, ("theta too",),
+                                  row_function, checkpoint=4)
+        self.assertEqual(len(calculated), 20)
+        self.assertFalse(os.path.exists(d.get_journal_path(self.SPHERE_DATA)))
+
+class CatalogD(unittest.TestCase):
+    """
+    Tests for the catalog of a Spec D database.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        # copy files to tmp
+        self.SOURCE_DATA = os.path.join(TEST_PATH, "sphere.cdb")
+        self.TEMP_PATH = temp.mkdtemp()
+        self.SPHERE_DATA = os.path.join(self.TEMP_PATH, "sphere.cdb")
+        sh.copytree(self.SOURCE_DATA, self.SPHERE_DATA)
+
+    def tearDown(self):
+        sh.rmtree(self.TEMP_PATH)
+
+    def test_catalog(self):
+        catalog = d.get_catalog(self.SPHERE_DATA)
+        self.assertEqual(catalog["rows"], 20)
+        self.assertEqual([c["name"] for c in catalog["columns"]],
+                         ["theta", "phi"])
+        theta, phi = catalog["columns"]
+        self.assertEqual((theta["type"], theta["values"], theta["counts"],
+                          theta["nulls"]), (d.TYPE_INTEGER, [0], [20], 0))
+        self.assertEqual(phi["values"], list(range(-180, 180, 18)))
+        self.assertEqual(phi["counts"], [1] * 20)
+        self.assertTrue(os.path.isfile(d.get_catalog_path(self.SPHERE_DATA)))
+
+        # a fresh catalog is reused without reading the rows
+        fn = os.path.join(self.SPHERE_DATA, d.SPEC_D_CSV_FILENAME)
+        stat = os.stat(fn)
+        with open(fn, "r") as f:
+            lines = f.readlines()
+        with open(fn, "w") as f:
+            f.write("".join(lines).replace("-180/", "-999/"))
+        os.utime(fn, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(d.get_catalog(self.SPHERE_DATA), catalog)
+
+        # and recomputed when the rows change
+        with open(fn, "w") as f:
+            f.write("".join(lines[:-1]) + "1.5,x,0.png\n,NaN,1.png\n")
+        catalog = d.get_catalog(self.SPHERE_DATA)
+        self.assertEqual(catalog["rows"], 21)
+        theta, phi = catalog["columns"]
+        self.assertEqual((theta["type"], theta["values"], theta["counts"],
+                          theta["nulls"]), (d.TYPE_FLOAT, [0.0, 1.5],
+                                            [19, 1], 1))
+        self.assertEqual(phi["type"], d.TYPE_STRING)
+        self.assertEqual(phi["values"][-2:], ["NaN", "x"])
+
+        # and when sidecar columns are added
+        d.add_sidecar_columns_by_row_data(self.SPHERE_DATA, ("one",),
+                                          lambda row: ("1",))
+        self.assertEqual(d.get_catalog(self.SPHERE_DATA)["columns"][-1],
+                         {"name": "one", "type": d.TYPE_INTEGER,
+                          "values": [1], "counts": [21], "nulls": 0})
+        self.assertEqual(d.get_catalog(self.TEMP_PATH), None)
+
+    def test_catalog_nan_strings(self):
+        # NaN is only null in a numeric column
+        fn = os.path.join(self.SPHERE_DATA, d.SPEC_D_CSV_FILENAME)
+        with open(fn, "w") as f:
+            f.write("x,y,FILE\nnan,nan,0.png\nnan,1,1.png\nabc,,2.png\n"
+                    ",2,3.png\n")
+        x, y = d.get_catalog(self.SPHERE_DATA)["columns"]
+        self.assertEqual(x, {"name": "x", "type": d.TYPE_STRING,
+                             "values": ["abc", "nan"], "counts": [1, 2],
+                             "nulls": 1})
+        self.assertEqual((y["type"], y["values"], y["counts"], y["nulls"]),
+                         (d.TYPE_FLOAT, [1.0, 2.0], [1, 1], 2))
+
+class WatchD(unittest.TestCase):
+    """
+    Tests for the cinema_lib.spec.d.watch module.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        # a database that is being appended to
+        self.TEMP_PATH = temp.mkdtemp()
+        self.DATA = os.path.join(self.TEMP_PATH, "growing.cdb")
+        os.mkdir(self.DATA)
+        self.CSV = os.path.join(self.DATA, d.SPEC_D_CSV_FILENAME)
+        self.append("time,FILE\n0,0.png\n1,1.png\n")
+        self.COLUMNS = [(("double",), lambda row: (str(int(row[0]) * 2),)),
+                        (("file",), lambda row: (row[-1],))]
+
+    def tearDown(self):
+        sh.rmtree(self.TEMP_PATH)
+
+    def append(self, text):
+        with open(self.CSV, "a") as f:
+            f.write(text)
+
+    def test_update(self):
+        from ..spec.d import watch
+
+        self.assertEqual(watch.update(self.DATA, self.COLUMNS), 2)
+        self.assertEqual(watch.update(self.DATA, self.COLUMNS), 0)
+        # an incomplete row is not processed
+        self.append("2,2.png\n3,3")
+        self.assertEqual(watch.update(self.DATA, self.COLUMNS, checkpoint=1),
+                         1)
+        rows = list(d.get_iterator(self.DATA))
+        self.assertEqual(rows, [("time", "double", "file", "FILE"),
+                                ("0", "0", "0.png", "0.png"),
+                                ("1", "2", "1.png", "1.png"),
+                                ("2", "4", "2.png", "2.png"),
+                                ("3", None, None, "3")])
+        self.append(".png\n4,4.png\n")
+        self.assertEqual(watch.update(self.DATA, self.COLUMNS), 2)
+        state = watch.get_watch_state(self.DATA)
+        self.assertEqual((state["rows"], state["offset"]),
+                         (5, os.path.getsize(self.CSV)))
+        self.assertEqual([c[d.SIDECAR_KEY_ROWS] for c in
+                          d.get_sidecar_manifest(self.DATA)
+                          [d.SIDECAR_KEY_COLUMNS]], [5, 5])
+
+        # values written after the last saved progress are discarded
+        with open(os.path.join(d.get_sidecar_path(self.DATA),
+                               state["files"][0]), "ab") as f:
+            f.write(d.sidecar_value("garbage"))
+        self.append("5,5.png\n")
+        self.assertEqual(watch.update(self.DATA, self.COLUMNS), 1)
+        self.assertEqual([r[1] for r in d.get_iterator(self.DATA)][1:],
+                         ["0", "2", "4", "6", "8", "10"])
+
+        with self.assertRaises(ValueError):
+            watch.update(self.DATA, self.COLUMNS[:1])
+        self.append("6\n")
+        with self.assertRaises(ValueError):
+            watch.update(self.DATA, self.COLUMNS)
+        with open(self.CSV, "w") as f:
+            f.write("time,FILE\n")
+        with self.assertRaises(ValueError):
+            watch.update(self.DATA, self.COLUMNS)
+
+    def test_watch(self):
+        from ..spec.d import watch
+        import threading
+
+        def grow():
+            for i in range(2, 6):
+                time.sleep(0.05)
+                self.append("{0},{0}.png\n".format(i))
+        import time
+        thread = threading.Thread(target=grow)
+        thread.start()
+        n = watch.watch(self.DATA, self.COLUMNS, interval=0.02, idle=0.5)
+        thread.join()
+        self.assertEqual(n, 6)
+        self.assertEqual([r[1] for r in d.get_iterator(self.DATA)][1:],
+                         ["0", "2", "4", "6", "8", "10"])
+
+class WriterD(unittest.TestCase):
+    """
+    Tests for d.Writer.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        self.TEMP_PATH = temp.mkdtemp()
+        self.DATA = os.path.join(self.TEMP_PATH, "written.cdb")
+        self.HEADER = ("time", "pressure", "name")
+
+    def tearDown(self):
+        sh.rmtree(self.TEMP_PATH)
+
+    def test_write(self):
+        with d.Writer(self.DATA, self.HEADER, buffer_size=16) as w:
+            w.write((0, None, "a"))
+            self.assertEqual(w.types, [d.TYPE_INTEGER, d.TYPE_EMPTY,
+                                       d.TYPE_STRING])
+            with self.assertRaises(ValueError):
+                w.write((0.5, "x", "a"))
+            self.assertEqual(w.types[1], d.TYPE_EMPTY)
+            self.assertEqual(w.write_rows([(1, 0.5, "nan"),
+                                           ("2", "1e3", "b c"),
+                                           [3, float("nan"), None]]), 3)
+            for row in ((4, 1, "d"), (4.5, 1.0, "d"), ("x", 1.0, "d"),
+                        (4, 1.0, 5), (4, 1.0, " 5"), (4, 1.0)):
+                with self.assertRaises(ValueError):
+                    w.write(row)
+            self.assertEqual(w.rows, 4)
+        self.assertEqual(list(d.get_iterator(self.DATA)),
+                         [self.HEADER, ("0", None, "a"), ("1", "0.5", "nan"),
+                          ("2", "1e3", "b c"), ("3", "nan", None)])
+        self.assertTrue(d.check_database(self.DATA))
+
+        for header in (None, ("a", "a"), ("a", "1"), (" a", "b"),
+                       ("FILE", "a"), ()):
+            with self.assertRaises(ValueError):
+                d.Writer(os.path.join(self.TEMP_PATH, "new.cdb"), header)
+
+    def test_append(self):
+        with d.Writer(self.DATA, self.HEADER) as w:
+            w.write((0, None, "a"))
+            w.flush()
+            self.assertEqual(len(list(d.get_iterator(self.DATA))), 2)
+            w.write((1, None, "b"))
+        with self.assertRaises(ValueError):
+            d.Writer(self.DATA, ("time", "name"))
+
+        # an incomplete row is removed, and the types are kept
+        with open(os.path.join(self.DATA, d.SPEC_D_CSV_FILENAME), "a") as f:
+            f.write("2,0.5,")
+        with d.Writer(self.DATA, self.HEADER) as w:
+            self.assertEqual(w.types, [d.TYPE_INTEGER, d.TYPE_EMPTY,
+                                       d.TYPE_STRING])
+            with self.assertRaises(ValueError):
+                w.write((2.5, 0.5, "c"))
+            w.write((2, 0.5, "c"))
+        self.assertEqual([r[0] for r in d.get_iterator(self.DATA)],
+                         ["time", "0", "1", "2"])
+        self.assertTrue(d.check_database(self.DATA))
+
+    def test_lock(self):
+        import threading
+
+        first = d.Writer(self.DATA, self.HEADER)
+        def append():
+            with d.Writer(self.DATA) as w:
+                w.write((1, 1.0, "second"))
+        thread = threading.Thread(target=append)
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        first.write((0, 0.5, "first"))
+        first.close()
+        thread.join()
+        self.assertEqual([r[2] for r in d.get_iterator(self.DATA)][1:],
+                         ["first", "second"])
+
+class TableD(unittest.TestCase):
+    """
+    Tests for the cinema_lib.spec.d.table module.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        # copy files to tmp
+        self.SOURCE_DATA = os.path.join(TEST_PATH, "sphere.cdb")
+        self.TEMP_PATH = temp.mkdtemp()
+        self.SPHERE_DATA = os.path.join(self.TEMP_PATH, "sphere.cdb")
+        sh.copytree(self.SOURCE_DATA, self.SPHERE_DATA)
+        self.SPHERE_TABLE = "sphere"
+
+    def tearDown(self):
+        sh.rmtree(self.TEMP_PATH)
+
+    def test_typed_column(self):
+        from ..spec.d import table
+        import numpy as np
+
+        self.assertEqual(table.typed_column(["1", "-2"]).dtype, np.int64)
+        c = table.typed_column(["1", None, "2.5"])
+        self.assertEqual(c.dtype, np.float64)
+        self.assertTrue(np.isnan(c[1]))
+        self.assertEqual(table.typed_column(["a", None]).dtype, object)
+
+    def test_where(self):
+        from ..spec.d import table
+
+        for expression, n in (("phi >= 0", 10),
+                              ("theta == 0 and (phi == -180 or phi == 162)", 
+                               2),
+                              ("-90 < phi <= 0", 5),
+                              ("phi not in (0, 90) and not theta != 0", 18),
+                              ("`FILE` == '0/0.png'", 1),
+                              ("phi % 90 == 0", 4),
+                              ("1 < 2", 20)):
+            mask = table.where(self.SPHERE_DATA, expression)
+            self.assertEqual(len(mask), 20)
+            self.assertEqual(mask.sum(), n)
+        for expression in ("phi >", "phi > psi", "phi.real > 0", "len(phi)",
+                           "FILE > 0", "phi + 1", "phi in phi"):
+            with self.assertRaises(ValueError):
+                table.where(self.SPHERE_DATA, expression)
+
+    def test_masked_columns(self):
+        from ..spec.d import table
+
+        mask = table.where(self.SPHERE_DATA, "phi >= 90")
+        calculated = []
+        def row_function(row):
+            calculated.append(row)
+            return (str(int(row[1]) + 1),)
+        d.add_columns_by_row_data(self.SPHERE_DATA, ("phi plus one",),
+                                  row_function, mask=mask)
+        self.assertEqual(len(calculated), 5)
+        rows = list(d.get_iterator(self.SPHERE_DATA))[1:]
+        self.assertEqual([r[2] for r in rows], 
+                         [None] * 15 + ["91", "109", "127", "145", "163"])
+
+        db = d.get_sqlite3(self.SPHERE_DATA, mask=mask)
+        fetch = db.execute("SELECT COUNT(*) FROM %s WHERE \"phi plus one\" > 1"
+                           % self.SPHERE_TABLE).fetchone()
+        self.assertEqual(fetch[0], 5)
+
+class NearestD(unittest.TestCase):
+    """
+    Tests for the cinema_lib.spec.d.nearest module.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        self.SPHERE_DATA = os.path.join(TEST_PATH, "sphere.cdb")
+
+    def test_sphere_index(self):
+        from ..spec.d import nearest
+
+        index = nearest.get_index(self.SPHERE_DATA)
+        self.assertEqual(index.columns, ("theta", "phi"))
+        self.assertEqual(len(index), 20)
+        self.assertEqual(index.nearest({"theta": 37.2, "phi": -150})[0], 2)
+        self.assertEqual(index.nearest((0, 1000))[0], 19)
+        self.assertEqual([r for r, dist in index.k_nearest((0, 0), 3)],
+                         [10, 9, 11])
+        self.assertEqual(len(index.k_nearest((0, 0), 50)), 20)
+
+        with self.assertRaises(ValueError):
+            index.nearest({"phi": 0})
+        with self.assertRaises(ValueError):
+            index.nearest((0, 0, 0))
+        with self.assertRaises(ValueError):
+            nearest.get_index(self.SPHERE_DATA, ("FILE",))
+        with self.assertRaises(ValueError):
+            nearest.get_index(self.SPHERE_DATA, ("psi",))
+        self.assertEqual(nearest.get_index(TEST_PATH), None)
+
+    def test_k_nearest(self):
+        from ..spec.d import nearest
+        import numpy as np
+
+        random = np.random.RandomState(0)
+        columns = [random.uniform(0, 10, 3000), random.uniform(-5, 5, 3000),
+                   random.randint(0, 3, 3000).astype(np.float64)]
+        columns[0][7] = np.nan
+        index = nearest.Index(("x", "y", "z"), columns, leaf_size=4)
+        self.assertEqual(len(index), 2999)
+        points = (np.column_stack(columns) - index.low) / index.scale
+        for q in random.uniform(-1, 11, (50, 3)).tolist():
+            dd = ((points - (np.array(q) - index.low) / index.scale) ** 2).\
+                 sum(axis=1)
+            dd[7] = np.inf
+            found = index.k_nearest(q, 5)
+            self.assertEqual([r for r, dist in found],
+                             np.argsort(dd, kind="stable")[:5].tolist())
+            self.assertAlmostEqual(found[0][1], dd.min() ** 0.5)
+
+    def test_benchmark(self):
+        from ..bench import nearest
+
+        results = nearest.benchmark(2000, 20)
+        self.assertEqual(results["mismatches"], 0)
+
+class AggregateD(unittest.TestCase):
+    """
+    Tests for the cinema_lib.spec.d.aggregate module.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        # a database with a few groups and null values
+        self.TEMP_PATH = temp.mkdtemp()
+        self.DATA = os.path.join(self.TEMP_PATH, "groups.cdb")
+        os.mkdir(self.DATA)
+        with open(os.path.join(self.DATA, d.SPEC_D_CSV_FILENAME), "w") as f:
+            f.write("time,phi,value,FILE\n")
+            for i in range(0, 300):
+                value = "" if i % 7 == 0 else "NaN" if i % 11 == 0 else \
+                        str(i % 13)
+                f.write("{0},{1},{2},{3}.png\n".format(i % 3, (i % 4) * 90,
+                                                      value, i))
+
+    def tearDown(self):
+        sh.rmtree(self.TEMP_PATH)
+
+    def expected(self, key, function):
+        values = [i % 13 for i in range(0, 300) if i % 3 == key and
+                  i % 7 != 0 and i % 11 != 0]
+        return function(values)
+
+    def test_aggregate(self):
+        from ..spec.d import aggregate
+
+        header, rows = aggregate.aggregate(self.DATA, ("time",),
+            aggregate.parse_aggregations(
+                "value:count,value:sum,value:mean,value:min,value:max,"
+                "value:variance,phi:count"))
+        self.assertEqual(header, ("time", "value count", "value sum",
+                                  "value mean", "value min", "value max",
+                                  "value variance", "phi count"))
+        self.assertEqual([r[0] for r in rows], ["0", "1", "2"])
+        for row in rows:
+            key = int(row[0])
+            self.assertEqual(row[1], self.expected(key, len))
+            self.assertEqual(row[2], self.expected(key, sum))
+            self.assertAlmostEqual(row[3],
+                                   self.expected(key, sum) / row[1])
+            self.assertEqual(row[4], self.expected(key, min))
+            self.assertEqual(row[5], self.expected(key, max))
+            mean = row[3]
+            self.assertAlmostEqual(row[6], self.expected(key,
+                lambda v: sum([(x - mean) ** 2 for x in v]) / len(v)))
+            self.assertEqual(row[7], 100)
+
+        # no groups, and groups of groups
+        header, rows = aggregate.aggregate(self.DATA, (),
+                                           (("value", "count"),))
+        self.assertEqual(rows, [(sum([self.expected(k, len)
+                                      for k in range(0, 3)]),)])
+        header, rows = aggregate.aggregate(self.DATA, ("time", "phi"),
+                                           (("value", "max"),))
+        self.assertEqual(len(rows), 12)
+
+        for text in ("value", "value:median", ":mean"):
+            with self.assertRaises(ValueError):
+                aggregate.parse_aggregations(text)
+        with self.assertRaises(ValueError):
+            aggregate.aggregate(self.DATA, ("theta",), (("value", "max"),))
+        with self.assertRaises(ValueError):
+            aggregate.aggregate(self.DATA, ("time",), (("FILE", "max"),))
+        self.assertEqual(aggregate.aggregate(self.TEMP_PATH, ("time",),
+                                             (("value", "max"),)), None)
+
+    def test_parallel(self):
+        from ..spec.d import aggregate
+
+        chunks = d.get_chunks(self.DATA, 4)
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(sum([len(list(d.get_chunk_iterator(self.DATA, c)))
+                              for c in chunks]), 300)
+
+        aggregations = aggregate.parse_aggregations(
+            "value:count,value:mean,value:min,value:stddev")
+        serial = aggregate.aggregate(self.DATA, ("phi",), aggregations)
+        parallel = aggregate.aggregate(self.DATA, ("phi",), aggregations,
+                                       processes=3)
+        self.assertEqual(serial[0], parallel[0])
+        self.assertEqual(sorted([r[0:3] for r in serial[1]]),
+                         sorted([r[0:3] for r in parallel[1]]))
+        for s, p in zip(sorted(serial[1]), sorted(parallel[1])):
+            self.assertAlmostEqual(s[3], p[3])
+            self.assertAlmostEqual(s[4], p[4])
+
+    def test_write_aggregate(self):
+        from ..spec.d import aggregate
+
+        output = os.path.join(self.DATA, "max.csv")
+        self.assertEqual(aggregate.write_aggregate(self.DATA, ("phi",),
+            (("value", "max"),), output), 4)
+        rows = list(d.get_iterator(self.DATA, "max.csv"))
+        self.assertEqual(rows, [("phi", "value max"), ("0", "12"),
+                                ("90", "12"), ("180", "12"), ("270", "12")])
+        self.assertTrue(d.check_database(self.DATA, "max.csv"))
+
+class MergeD(unittest.TestCase):
+    """
+    Tests for the cinema_lib.spec.d.merge module.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        # two shards of the sphere, sorted by phi, with the columns of the
+        # second swapped
+        self.SOURCE_DATA = os.path.join(TEST_PATH, "sphere.cdb")
+        self.TEMP_PATH = temp.mkdtemp()
+        self.SHARDS = [os.path.join(self.TEMP_PATH, "shard_{0}.cdb".format(i))
+                       for i in range(0, 2)]
+        rows = list(d.get_iterator(self.SOURCE_DATA))
+        for i, shard in enumerate(self.SHARDS):
+            sh.copytree(self.SOURCE_DATA, shard)
+            with open(os.path.join(shard, d.SPEC_D_CSV_FILENAME), "w") as f:
+                if i == 0:
+                    f.write("theta,phi,FILE\n")
+                    for row in rows[1::2]:
+                        f.write(",".join(row) + "\n")
+                else:
+                    f.write("phi,theta,FILE\n")
+                    for row in rows[2::2]:
+                        f.write(",".join((row[1], row[0], row[2])) + "\n")
+        self.OUTPUT = os.path.join(self.TEMP_PATH, "merged.cdb")
+
+    def tearDown(self):
+        sh.rmtree(self.TEMP_PATH)
+
+    def test_merge(self):
+        from ..spec.d import merge
+
+        self.assertEqual(merge.merge(self.OUTPUT, self.SHARDS, ("phi",)), 20)
+        rows = list(d.get_iterator(self.OUTPUT))
+        self.assertEqual(rows[0], ("theta", "phi", "FILE"))
+        self.assertEqual([int(r[1]) for r in rows[1:]],
+                         list(range(-180, 180, 18)))
+        self.assertEqual(rows[1][2], "shard_0.cdb/-180/0.png")
+        self.assertEqual(rows[2][2], "shard_1.cdb/-162/0.png")
+        for row in rows[1:]:
+            self.assertTrue(os.path.samefile(
+                os.path.join(self.OUTPUT, row[2]),
+                os.path.join(self.TEMP_PATH, row[2])))
+        self.assertTrue(d.check_database(self.OUTPUT))
+
+        # concatenated
+        output = os.path.join(self.TEMP_PATH, "concatenated.cdb")
+        self.assertEqual(merge.merge(output, self.SHARDS), 20)
+        rows = list(d.get_iterator(output))
+        self.assertEqual([int(r[1]) for r in rows[1:]],
+                         list(range(-180, 180, 36)) +
+                         list(range(-162, 180, 36)))
+
+    def test_merge_errors(self):
+        from ..spec.d import merge
+
+        with self.assertRaises(ValueError):
+            merge.merge(self.SHARDS[0], self.SHARDS)
+        with self.assertRaises(ValueError):
+            merge.merge(self.OUTPUT, self.SHARDS, ("psi",))
+        with self.assertRaises(ValueError):
+            merge.merge(self.OUTPUT, self.SHARDS, ("FILE", "phi"))
+        with self.assertRaises(ValueError):
+            merge.merge(self.OUTPUT, self.SHARDS + [self.TEMP_PATH])
+        self.assertFalse(os.path.exists(os.path.join(self.OUTPUT,
+                                                     d.SPEC_D_CSV_FILENAME)))
+
+        with open(os.path.join(self.SHARDS[1], d.SPEC_D_CSV_FILENAME),
+                  "w") as f:
+            f.write("phi,FILE\n0,0/0.png\n")
+        with self.assertRaises(ValueError):
+            merge.get_headers(self.SHARDS)
+
+    def test_merge_unsorted(self):
+        from ..spec.d import merge
+
+        # the links of a failed merge are removed, so they aren't reused
+        fn = os.path.join(self.SHARDS[1], d.SPEC_D_CSV_FILENAME)
+        with open(fn, "r") as f:
+            lines = f.readlines()
+        with open(fn, "w") as f:
+            f.write("".join(lines[:1] + lines[:0:-1]))
+        with self.assertRaises(ValueError):
+            merge.merge(self.OUTPUT, self.SHARDS, ("phi",))
+        self.assertFalse(os.path.exists(self.OUTPUT))
+
+        # in an existing output, only the new directories are removed
+        os.makedirs(os.path.join(self.OUTPUT, "shard_1.cdb"))
+        with self.assertRaises(ValueError):
+            merge.merge(self.OUTPUT, self.SHARDS, ("phi",))
+        self.assertEqual(os.listdir(self.OUTPUT), ["shard_1.cdb"])
+        self.assertEqual(os.listdir(os.path.join(self.OUTPUT,
+                                                 "shard_1.cdb")), [])
+
+        with open(fn, "w") as f:
+            f.write("".join(lines))
+        self.assertEqual(merge.merge(self.OUTPUT, self.SHARDS, ("phi",)), 20)
+
+class DiffD(unittest.TestCase):
+    """
+    Tests for the cinema_lib.spec.d.diff module.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        # a re-run of the sphere, reordered, with some changes
+        self.SOURCE_DATA = os.path.join(TEST_PATH, "sphere.cdb")
+        self.TEMP_PATH = temp.mkdtemp()
+        self.OLD = os.path.join(self.TEMP_PATH, "old.cdb")
+        self.NEW = os.path.join(self.TEMP_PATH, "new.cdb")
+        sh.copytree(self.SOURCE_DATA, self.OLD)
+        sh.copytree(self.SOURCE_DATA, self.NEW)
+        rows = list(d.get_iterator(self.SOURCE_DATA))
+        with open(os.path.join(self.NEW, d.SPEC_D_CSV_FILENAME), "w") as f:
+            f.write("phi,theta,FILE\n")
+            for row in reversed(rows[3:]):
+                f.write("{0},{1}.0,{2}\n".format(row[1], row[0], row[2]))
+            f.write("1000,0,-180/0.png\n")
+            f.write("-162,0,-180/0.png\n")
+        # the same path, with different contents
+        sh.copyfile(os.path.join(self.NEW, "-180", "0.png"),
+                    os.path.join(self.NEW, "0", "0.png"))
+
+    def tearDown(self):
+        sh.rmtree(self.TEMP_PATH)
+
+    def test_diff(self):
+        from ..spec.d import diff
+
+        result = diff.diff(self.OLD, self.NEW, ("theta", "phi"))
+        self.assertEqual(result["added"], [["0", "1000"]])
+        self.assertEqual(result["removed"], [["0", "-180"]])
+        self.assertEqual(result["changed"], [["0", "-162"]])
+        self.assertEqual(result["unchanged"], 18)
+        self.assertEqual(result["columns"], {"FILE": 1})
+        self.assertEqual((result["only_in_a"], result["only_in_b"]), ([], []))
+
+        result = diff.diff(self.OLD, self.NEW, ("phi", "theta"),
+                           compare_files=True)
+        self.assertEqual(result["changed"], [["0", "0.0"], ["-162", "0"]])
+        self.assertEqual(result["unchanged"], 17)
+        self.assertEqual(result["columns"], {"FILE": 2})
+
+        with self.assertRaises(ValueError):
+            diff.diff(self.OLD, self.NEW, ("psi",))
+        with self.assertRaises(ValueError):
+            diff.diff(self.OLD, self.NEW, ("theta",))
+        self.assertEqual(diff.diff(self.OLD, self.TEMP_PATH, ("phi",)), None)
+
+    def test_diff_keys(self):
+        from ..spec.d import diff
+
+        # integers that are the same as floats, and NaN keys
+        for path, rows in ((self.OLD, ("9007199254740992,1",
+                                       "9007199254740993,2", "nan,3",
+                                       "1e3,4", "0.1,5")),
+                           (self.NEW, ("9007199254740993.0,2",
+                                       "9007199254740992,1", "NaN,3",
+                                       "1000,4", "0.10,6"))):
+            with open(os.path.join(path, d.SPEC_D_CSV_FILENAME), "w") as f:
+                f.write("time,value\n" + "\n".join(rows) + "\n")
+        result = diff.diff(self.OLD, self.NEW, ("time",))
+        self.assertEqual((result["added"], result["removed"]), ([], []))
+        self.assertEqual(result["changed"], [["0.10"]])
+        self.assertEqual(result["unchanged"], 4)
+
+class StatsD(unittest.TestCase):
+    """
+    Tests for the cinema_lib.spec.d.stats module.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        # a database with integer, float, string, and empty columns
+        self.TEMP_PATH = temp.mkdtemp()
+        self.DATA = os.path.join(self.TEMP_PATH, "stats.cdb")
+        os.mkdir(self.DATA)
+        self.VALUES = [(i * 7919) % 5000 / 4.0 for i in range(0, 5000)]
+        with open(os.path.join(self.DATA, d.SPEC_D_CSV_FILENAME), "w") as f:
+            f.write("index,value,empty,FILE\n")
+            for i, v in enumerate(self.VALUES):
+                f.write("{0},{1},,{2}\n".format(i, "NaN" if i == 0 else v,
+                                               "" if i == 1 else
+                                               "{0}.png".format(i)))
+
+    def tearDown(self):
+        sh.rmtree(self.TEMP_PATH)
+
+    def test_sketch(self):
+        from ..spec.d import stats
+        import bisect
+
+        values = sorted(self.VALUES)
+        left = stats.QuantileSketch(seed=0)
+        right = stats.QuantileSketch(seed=1)
+        for v in self.VALUES[:2000]:
+            left.update(v)
+        for v in self.VALUES[2000:]:
+            right.update(v)
+        self.assertLess(left.size, 2000)
+        left.merge(right)
+        self.assertEqual(left.n, 5000)
+        qs = (0.0, 0.1, 0.5, 0.9, 1.0)
+        for q, v in zip(qs, left.quantiles(qs)):
+            self.assertLess(abs(bisect.bisect_left(values, v) / 5000.0 - q),
+                            0.02)
+        self.assertEqual(stats.QuantileSketch().quantiles((0.5,)), (None,))
+
+    def test_column_stats(self):
+        from ..spec.d import stats
+
+        serial = stats.get_column_stats(self.DATA)
+        self.assertEqual(serial["rows"], 5000)
+        self.assertEqual([(c["name"], c["type"], c["count"], c["nulls"])
+                          for c in serial["columns"]],
+                         [("index", d.TYPE_INTEGER, 5000, 0),
+                          ("value", d.TYPE_FLOAT, 4999, 1),
+                          ("empty", d.TYPE_EMPTY, 0, 5000),
+                          ("FILE", d.TYPE_STRING, 4999, 1)])
+        index = serial["columns"][0]
+        self.assertEqual((index["min"], index["max"]), (0, 4999))
+        self.assertAlmostEqual(index["mean"], 2499.5)
+        self.assertAlmostEqual(index["variance"], (5000 ** 2 - 1) / 12.0)
+        self.assertLess(abs(index["quantiles"]["0.5"] - 2500), 100)
+        self.assertFalse("mean" in serial["columns"][3])
+        json.dumps(serial)
+
+        parallel = stats.get_column_stats(self.DATA, processes=3)
+        self.assertEqual(parallel["rows"], 5000)
+        for s, p in zip(serial["columns"], parallel["columns"]):
+            for key in ("name", "type", "count", "nulls", "min", "max"):
+                self.assertEqual(s.get(key), p.get(key))
+            if "mean" in s:
+                self.assertAlmostEqual(s["mean"], p["mean"])
+                self.assertAlmostEqual(s["variance"], p["variance"])
+
+        self.assertEqual(stats.get_column_stats(self.TEMP_PATH), None)
+
+    def test_nan_strings(self):
+        from ..spec.d import stats
+
+        # NaN is only null in a numeric column, in any order of the rows
+        rows = ["nan,nan,{0}.png\n".format(i) for i in range(0, 500)] + \
+               ["abc,1,500.png\n", "x,2,501.png\n"]
+        fn = os.path.join(self.DATA, d.SPEC_D_CSV_FILENAME)
+        for order in (rows, rows[::-1]):
+            with open(fn, "w") as f:
+                f.write("text,number,FILE\n" + "".join(order))
+            for processes in (None, 3):
+                result = stats.get_column_stats(self.DATA,
+                                                processes=processes)
+                self.assertEqual(result["rows"], 502)
+                self.assertEqual([(c["type"], c["count"], c["nulls"])
+                                  for c in result["columns"][:2]],
+                                 [(d.TYPE_STRING, 502, 0),
+                                  (d.TYPE_INTEGER, 2, 500)])
+
+class ProfileTests(unittest.TestCase):
+    """
+    Tests for the cinema_lib.profile module.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        self.TEMP_PATH = temp.mkdtemp()
+        self.DATA = os.path.join(self.TEMP_PATH, "profiled.cdb")
+        with d.Writer(self.DATA, ("index", "FILE")) as w:
+            w.write_rows([(i, "{0}.png".format(i)) for i in range(0, 10)])
+
+    def tearDown(self):
+        sh.rmtree(self.TEMP_PATH)
+
+    def test_stages(self):
+        from .. import profile
+        import time
+
+        def decode(fn):
+            time.sleep(0.002)
+            return fn
+
+        def row_function(row):
+            with profile.get_profile().stage(profile.STAGE_DECODE):
+                decode(row[1])
+            return (row[0],)
+
+        self.assertEqual(profile.get_profile(), None)
+        with profile.profiling() as p:
+            self.assertEqual(profile.get_profile(), p)
+            d.add_columns_by_row_data(self.DATA, ("copy",), row_function)
+        self.assertEqual(profile.get_profile(), None)
+
+        summary = p.summary()
+        json.dumps(summary)
+        self.assertEqual(summary["rows"], 10)
+        self.assertEqual(len(p.times[profile.STAGE_DECODE]), 10)
+        stages = summary["stages"]
+        self.assertGreaterEqual(stages[profile.STAGE_DECODE]["p50"], 0.002)
+        # compute does not include the decoding in it
+        self.assertLess(stages[profile.STAGE_COMPUTE]["total"],
+                        stages[profile.STAGE_DECODE]["total"])
+        self.assertEqual(stages[profile.STAGE_ENCODE]["max"], 0.0)
+        self.assertAlmostEqual(sum([s["fraction"] for s in stages.values()]),
+                               1.0)
+        self.assertEqual(len(profile.format_summary(summary).split("\n")),
+                         len(profile.STAGES) + 2)
+        self.assertEqual([r[1] for r in d.get_iterator(self.DATA)][1:],
+                         [str(i) for i in range(0, 10)])
+
+    def test_image_functions(self):
+        from .. import profile
+        from .. import commands
+
+        if len(commands.missing_requirements(commands.GROUP_IMAGE)) > 0:
+            log.info("Unable to run test: image requirements missing.")
+            return
+        from skimage import io
+
+        imread = io.imread
+        with profile.profiling() as p:
+            self.assertNotEqual(io.imread, imread)
+            with p.stage(profile.STAGE_COMPUTE):
+                io.imread(os.path.join(os.path.dirname(__file__), "data",
+                                       "sphere.cdb", "0", "0.png"))
+        self.assertEqual(io.imread, imread)
+        self.assertGreater(p.totals[profile.STAGE_DECODE], 0.0)
+
+    def test_trace(self):
+        from .. import profile
+        from .. import trace
+        import threading
+        import collections
+
+        def row_function(row):
+            # decode in another thread
+            def decode():
+                with profile.get_profile().stage(profile.STAGE_DECODE):
+                    pass
+            thread = threading.Thread(target=decode, name="decoder")
+            thread.start()
+            thread.join()
+            return (row[0],)
+
+        with profile.profiling(trace.Trace()) as t:
+            d.add_columns_by_row_data(self.DATA, ("copy",), row_function)
+        self.assertEqual(t.rows, 10)
+        # parse is one more, for the end of the rows
+        self.assertEqual(collections.Counter([s[0] for s in t.spans]),
+                         {"parse": 11, "compute": 10, "decode": 10,
+                          "write": 10})
+        self.assertGreater(len(set([s[4] for s in t.spans])), 1)
+        self.assertTrue("decoder" in t.threads.values())
+
+        fn = os.path.join(self.TEMP_PATH, "trace.json")
+        t.write(fn)
+        with open(fn, "r") as f:
+            events = json.load(f)
+        spans = [e for e in events["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual(len(spans), 41)
+        self.assertTrue(all([e["ts"] >= 0 and e["dur"] >= 0 for e in spans]))
+        self.assertEqual(len([e for e in events["traceEvents"]
+                              if e["name"] == "thread_name"]),
+                         len(t.threads))
+
+        # only the most recent spans are kept
+        t = trace.Trace(capacity=5)
+        for i in range(0, 8):
+            t.span(str(i), t.start + i, 1.0)
+        self.assertEqual([s[0] for s in t.spans], ["3", "4", "5", "6", "7"])
+        self.assertEqual(t.get_events()["otherData"],
+                         {"recorded": 8, "dropped": 3})
+
+class ProgressTests(unittest.TestCase):
+    """
+    Tests for the cinema_lib.progress module.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        self.TEMP_PATH = temp.mkdtemp()
+        self.DATA = os.path.join(self.TEMP_PATH, "progress.cdb")
+        with d.Writer(self.DATA, ("index", "value")) as w:
+            w.write_rows([(i, i * 0.5) for i in range(0, 1000)])
+
+    def tearDown(self):
+        from .. import progress
+
+        progress.set_enabled(None)
+        sh.rmtree(self.TEMP_PATH)
+
+    def test_count_rows(self):
+        from .. import progress
+
+        fn = os.path.join(self.DATA, d.SPEC_D_CSV_FILENAME)
+        self.assertEqual(progress.count_rows(fn), 1000)
+        self.assertEqual(progress.count_rows(fn, 7), 1000)
+        with open(fn, "a") as f:
+            f.write("1000,0.5")
+        self.assertEqual(progress.count_rows(fn), 1001)
+        with open(fn, "w") as f:
+            f.write("index,value")
+        self.assertEqual(progress.count_rows(fn), 0)
+
+    def test_progress(self):
+        from .. import progress
+        import io
+
+        stream = io.StringIO()
+        p = progress.Progress("Testing", 100, 1000000, stream, interval=0)
+        self.assertEqual(list(p.iterate(range(0, 100))), list(range(0, 100)))
+        lines = stream.getvalue().split("\n")
+        self.assertEqual(lines[-1], "")
+        self.assertTrue(lines[0].startswith("Testing: 1/100 rows (1.0%), "))
+        self.assertTrue("MB/s, ETA " in lines[0])
+        self.assertTrue(lines[-2].startswith("Testing: 100/100 rows"))
+
+        # short passes are silent
+        stream = io.StringIO()
+        p = progress.Progress("Testing", None, stream=stream)
+        for i in range(0, 100):
+            p.update()
+        p.close()
+        self.assertEqual(p.count, 100)
+        self.assertEqual(stream.getvalue(), "")
+        self.assertTrue(p.format().startswith("Testing: 100 rows, "))
+
+        rows = iter(range(0, 10))
+        progress.set_enabled(False)
+        self.assertIs(progress.iterate(rows, "Testing", lambda: 1 / 0), rows)
+        progress.set_enabled(True)
+        self.assertEqual(list(progress.iterate(rows, "Testing",
+                                               lambda: 10)),
+                         list(range(0, 10)))
+        self.assertTrue(d.check_database(self.DATA))
+
+class BenchTests(unittest.TestCase):
+    """
+    Tests for the cinema_lib.bench.generate and cinema_lib.bench.suite
+    modules.
+    """
+
+    def setUp(self):
+        if unittest_verbosity() > 1:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=log.DEBUG, datefmt='%I:%M:%S')
+        else:
+            log.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                            level=60, datefmt='%I:%M:%S')
+
+        self.TEMP_PATH = temp.mkdtemp()
+
+    def tearDown(self):
+        sh.rmtree(self.TEMP_PATH)
+
+    def test_generate(self):
+        from ..bench import generate
+
+        fn = os.path.join(self.TEMP_PATH, "1.cdb")
+        header = generate.generate_d(fn, 500, 6, quoted=0.5, seed=3)
+        self.assertEqual(header, ("i0", "f1", "s2", "i3", "f4", "s5"))
+        self.assertTrue(d.check_database(fn))
+        rows = list(d.get_iterator(fn))
+        self.assertEqual(len(rows), 501)
+        self.assertEqual(set([tuple(d.typecheck(r)) for r in rows[1:]]),
+                         set([(d.TYPE_INTEGER, d.TYPE_FLOAT,
+                               d.TYPE_STRING) * 2]))
+        self.assertTrue(any(["," in r[2] or "\"" in r[2] for r in rows[1:]]))
+
+        # the same seed generates the same database
+        other = os.path.join(self.TEMP_PATH, "2.cdb")
+        generate.generate_d(other, 500, 6, quoted=0.5, seed=3)
+        self.assertTrue(filecmp.cmp(
+            os.path.join(fn, d.SPEC_D_CSV_FILENAME),
+            os.path.join(other, d.SPEC_D_CSV_FILENAME), shallow=False))
+        with self.assertRaises(ValueError):
+            generate.generate_d(other)
+        with self.assertRaises(ValueError):
+            generate.generate_d(os.path.join(self.TEMP_PATH, "3.cdb"),
+                                types=["BOOLEAN"])
+
+    def test_generate_images(self):
+        from ..bench import generate
+        from .. import commands
+
+        if len(commands.missing_requirements(commands.GROUP_IMAGE)) > 0:
+            log.info("Unable to run test: image requirements missing.")
+            return
+
+        fn = os.path.join(self.TEMP_PATH, "images.cdb")
+        header = generate.generate_d(fn, 10, 1, n_images=3,
+                                     image_shape=(8, 4))
+        self.assertEqual(header, ("i0", "FILE"))
+        self.assertTrue(d.check_database(fn))
+        rows = list(d.get_iterator(fn))[1:]
+        self.assertEqual([r[1] for r in rows[:4]],
+                         ["images/0.png", "images/1.png", "images/2.png",
+                          "images/0.png"])
+
+        fn = os.path.join(self.TEMP_PATH, "a.cdb")
+        self.assertEqual(generate.generate_a(fn, (2, 3, 2), (4, 4), 1), 12)
+        self.assertTrue(a.check_database(fn))
+        self.assertTrue(spec.convert_a_to_d(fn))
+        self.assertTrue(d.check_database(fn))
+        self.assertEqual(len(list(d.get_iterator(fn))), 13)
+
+    def test_suite(self):
+        from ..bench import suite
+
+        results = suite.benchmark(self.TEMP_PATH, 1, 100, 3, shape=(2, 2),
+                                  n_images=0)
+        self.assertEqual(set(results["results"].keys()),
+                         set(["d.get_iterator", "d.check_database quick",
+                              "d.check_database", "d.get_sqlite3",
+                              "d.get_sqlite3_to_csv",
+                              "spec.convert_a_to_d"]))
+        self.assertEqual(results["results"]["d.get_iterator"]["rows"], 100)
+        self.assertEqual(results["results"]["spec.convert_a_to_d"]["rows"],
+                         4)
+        self.assertEqual(json.loads(json.dumps(results)), results)
+
+        comparison = suite.compare(results, results)
+        self.assertEqual(len(comparison), 6)
+        self.assertFalse(any([c["regression"] for c in comparison.values()]))
+        slower = json.loads(json.dumps(results))
+        slower["results"]["d.get_iterator"]["min"] *= 2
+        self.assertTrue(suite.compare(results, slower)["d.get_iterator"]
+                        ["regression"])
+
 class ImageTests(unittest.TestCase):
     """
     Image tests.
@@ -1197,6 +2768,47 @@ class ImageTests(unittest.TestCase):
 
         os.unlink(self.d_csv)
 
+    def test_describe(self):
+        try:
+            from .. import image
+        except Exception as e:
+            log.info("Unable to run test: " + str(e))
+            return
+       
+        from .. import image
+        from skimage import io
+        from ..image import d as d_image
+        import numpy as np
+
+        sh.copyfile(self.d_backup, self.d_csv)
+
+        self.assertFalse(d_image.file_add_describe_columns(self.SPHERE_DATA,
+            2, "describe"))
+
+        d_db = d.get_iterator(self.SPHERE_DATA)
+        self.assertTrue(reduce(lambda x, y: x + 1, d_db, 0) == 21)
+        d_db = d.get_iterator(self.SPHERE_DATA)
+        header = next(d_db)
+        self.assertEqual(header[:5], ("theta", "phi", "describe mean 0",
+            "describe mean 1", "describe mean 2"))
+        self.assertEqual(header[-2:], ("describe mode 2", "FILE"))
+        self.assertEqual(len(header), 3 + 18)
+
+        for row in d_db:
+            im = io.imread(os.path.join(self.SPHERE_DATA, row[-1]))
+            for c in range(0, 3):
+                channel = im[:,:,c]
+                values, counts = np.unique(channel, return_counts=True)
+                expected = (np.mean(channel), np.std(channel), 
+                            np.amin(channel), np.amax(channel),
+                            np.median(channel), values[np.argmax(counts)])
+                for s in range(0, 6):
+                    self.assertAlmostEqual(float(row[2 + s*3 + c]), 
+                                           float(expected[s]), places=6)
+        self.assertTrue(d.check_database(self.SPHERE_DATA))
+
+        os.unlink(self.d_csv)
+
 class OCVTests(unittest.TestCase):
     """
     OpenCV tests.
@@ -2149,3 +3761,511 @@ class CommandLineTests(unittest.TestCase):
         # swap back
         sys.argv = old_argv
 
+
+    def test_lazy_imports(self):
+        from ..bench import startup
+
+        for arguments in (['-i', '-d', self.SPHERE_DATA],
+                          ['-t', '-q', '-d', self.SPHERE_DATA], []):
+            modules = startup.imported_modules(arguments)
+            self.assertTrue("cinema_lib.cl" in modules)
+            self.assertFalse("skimage" in modules)
+            self.assertFalse("cv2" in modules)
+            self.assertFalse("cinema_lib.image" in modules)
+            self.assertFalse("cinema_lib.cv" in modules)
+
+    def test_image_command(self):
+        from .. import cl
+        from .. import commands
+        import sys
+
+        if len(commands.missing_requirements(commands.GROUP_IMAGE)) > 0:
+            log.info("Unable to run test: image requirements missing.")
+            return
+
+        temp_path = temp.mkdtemp()
+        sphere = os.path.join(temp_path, "sphere.cdb")
+        sh.copytree(self.SPHERE_DATA, sphere)
+
+        # set arguments
+        arguments = [self.PYTHON_COMMAND, '-d', sphere, '--image-firstq', '2']
+        old_argv = sys.argv
+        sys.argv = arguments 
+        exit_value = -1
+        # run command line
+        try:
+            cl.main()
+        except SystemExit as e:
+            exit_value = e
+        # assert we exited
+        self.assertTrue(int(str(exit_value)) == 0)
+        # swap back
+        sys.argv = old_argv
+
+        self.assertEqual(next(d.get_iterator(sphere)), ("theta", "phi",
+            "image first quartile 0", "image first quartile 1",
+            "image first quartile 2", "FILE"))
+        sh.rmtree(temp_path)
+
+    def test_multiple_commands(self):
+        from .. import cl
+        from .. import commands
+        import sys
+
+        if len(commands.available()) < len(commands.COMMANDS):
+            log.info("Unable to run test: image or cv requirements missing.")
+            return
+
+        temp_path = temp.mkdtemp()
+        sphere = os.path.join(temp_path, "sphere.cdb")
+        sh.copytree(self.SPHERE_DATA, sphere)
+        with open(os.path.join(sphere, d.SPEC_D_CSV_FILENAME), "rb") as f:
+            original = f.read()
+
+        # set arguments
+        old_argv = sys.argv
+        for arguments, code in (
+                (['-d', sphere, '--image-mean', '2', '--cv-canny', '2', 
+                  '--image-unique', '2'], 0),
+                (['-d', sphere, '--image-mean', '2', '--cv-canny', '2',
+                  '--label', 'foo'], cl.ERROR_CODES.LABEL_WITH_MULTIPLE_COMMANDS),
+                (['--image-mean', '2', '--cv-canny', '2'],
+                  cl.ERROR_CODES.NO_INPUT_DATABASE_FOR_IMAGE_COMMAND)):
+            sys.argv = [self.PYTHON_COMMAND] + arguments
+            exit_value = -1
+            # run command line
+            try:
+                cl.main()
+            except SystemExit as e:
+                exit_value = e
+            # assert we exited
+            self.assertEqual(int(str(exit_value)), code)
+        # swap back
+        sys.argv = old_argv
+
+        # one backup, with all of the new columns
+        backups = [i for i in os.listdir(sphere) if 
+                   i.startswith(d.SPEC_D_CSV_FILENAME + ".")]
+        self.assertEqual(len(backups), 1)
+        with open(os.path.join(sphere, backups[0]), "rb") as f:
+            self.assertEqual(f.read(), original)
+        self.assertEqual(next(d.get_iterator(sphere)), ("theta", "phi",
+            "image mean 0", "image mean 1", "image mean 2", 
+            "image unique count", "FILE", "FILEcv canny"))
+        self.assertTrue(d.check_database(sphere))
+        sh.rmtree(temp_path)
+
+    def test_describe_command(self):
+        from .. import cl
+        from .. import commands
+
+        if len(commands.missing_requirements(commands.GROUP_IMAGE)) > 0:
+            log.info("Unable to run test: image requirements missing.")
+            return
+
+        temp_path = temp.mkdtemp()
+        for i, runs in enumerate(([['--image-mean', '2', '--image-describe',
+                                    '2']],
+                                  [['--image-mean', '2'],
+                                   ['--image-describe', '5']])):
+            sphere = os.path.join(temp_path, "sphere{0}.cdb".format(i))
+            sh.copytree(self.SPHERE_DATA, sphere)
+            for arguments in runs:
+                exit_value = -1
+                try:
+                    cl.main(['-d', sphere] + arguments)
+                except SystemExit as e:
+                    exit_value = e
+                self.assertEqual(int(str(exit_value)), 0)
+            header = next(d.get_iterator(sphere))
+            self.assertEqual(header[2:6], ("image mean 0", "image mean 1",
+                "image mean 2", "image describe mean 0"))
+            self.assertEqual(len(header), 3 + 3 + 18)
+            self.assertTrue(d.check_database(sphere))
+        sh.rmtree(temp_path)
+
+    def test_spec_a_commands(self):
+        from .. import cl
+        from .. import commands
+        import sys
+
+        if len(commands.missing_requirements(commands.GROUP_IMAGE)) > 0:
+            log.info("Unable to run test: image requirements missing.")
+            return
+
+        temp_path = temp.mkdtemp()
+        sphere = os.path.join(temp_path, "sphere.cdb")
+        sh.copytree(self.SPHERE_DATA, sphere)
+        os.unlink(os.path.join(sphere, d.SPEC_D_CSV_FILENAME))
+
+        # set arguments
+        old_argv = sys.argv
+        for arguments, code in (
+                (['-a', sphere, '--image-mean', '2', '--sidecar'],
+                  cl.ERROR_CODES.SIDECAR_WITH_SPEC_A),
+                (['-a', sphere, '--image-mean', '2', '--select', 
+                  'phi=-36:36'], 0),
+                (['-a', sphere, '--image-mean', '2'],
+                  cl.ERROR_CODES.SPEC_D_EXISTS_IN_SPEC_A)):
+            sys.argv = [self.PYTHON_COMMAND] + arguments
+            exit_value = -1
+            # run command line
+            try:
+                cl.main()
+            except SystemExit as e:
+                exit_value = e
+            # assert we exited
+            self.assertEqual(int(str(exit_value)), code)
+        # swap back
+        sys.argv = old_argv
+
+        # the selected rows, with the new columns
+        rows = list(d.get_iterator(sphere))
+        self.assertEqual(rows[0], ("phi", "theta", "image mean 0", 
+            "image mean 1", "image mean 2", "FILE"))
+        self.assertEqual([r[0] for r in rows[1:]], 
+                         ["-36", "-18", "0", "18", "36"])
+        self.assertEqual([r[-1] for r in rows[1:]], 
+                         ["-36/0.png", "-18/0.png", "0/0.png", "18/0.png",
+                          "36/0.png"])
+        self.assertTrue(reduce(lambda x, y: x and float(y[2]) > 0, 
+                               rows[1:], True))
+        self.assertTrue(d.check_database(sphere))
+        sh.rmtree(temp_path)
+
+    def test_where(self):
+        from .. import cl
+        from .. import commands
+        import sys
+
+        if len(commands.missing_requirements(commands.GROUP_IMAGE)) > 0:
+            log.info("Unable to run test: image requirements missing.")
+            return
+
+        temp_path = temp.mkdtemp()
+        sphere = os.path.join(temp_path, "sphere.cdb")
+        sh.copytree(self.SPHERE_DATA, sphere)
+
+        # set arguments
+        old_argv = sys.argv
+        for arguments, code in (
+                (['-d', sphere, '--image-mean', '2', '--where', 'phi >'],
+                  cl.ERROR_CODES.INVALID_WHERE),
+                (['-a', sphere, '--image-mean', '2', '--where', 'phi > 0'],
+                  cl.ERROR_CODES.INVALID_WHERE),
+                (['-d', sphere, '--image-mean', '2', '--where', 
+                  'phi < -90 or phi > 90'], 0)):
+            sys.argv = [self.PYTHON_COMMAND] + arguments
+            exit_value = -1
+            # run command line
+            try:
+                cl.main()
+            except SystemExit as e:
+                exit_value = e
+            # assert we exited
+            self.assertEqual(int(str(exit_value)), code)
+        # swap back
+        sys.argv = old_argv
+
+        # only the selected rows have values
+        rows = list(d.get_iterator(sphere))[1:]
+        self.assertEqual([r[1] for r in rows if r[2] is not None],
+                         ["-180", "-162", "-144", "-126", "-108",
+                          "108", "126", "144", "162"])
+        sh.rmtree(temp_path)
+
+    def test_watch(self):
+        from .. import cl
+        from .. import commands
+        from ..spec.d import watch
+
+        if len(commands.missing_requirements(commands.GROUP_IMAGE)) > 0:
+            log.info("Unable to run test: image requirements missing.")
+            return
+
+        temp_path = temp.mkdtemp()
+        sphere = os.path.join(temp_path, "sphere.cdb")
+        sh.copytree(self.SPHERE_DATA, sphere)
+
+        for arguments, code in (
+                (['-d', sphere, '--watch'], cl.ERROR_CODES.WATCH_FAILED),
+                (['-a', sphere, '--image-mean', '2', '--watch'],
+                  cl.ERROR_CODES.WATCH_FAILED),
+                (['-d', sphere, '--image-mean', '2', '--where', 'phi > 0',
+                  '--watch'], cl.ERROR_CODES.WATCH_FAILED),
+                (['-d', sphere, '--image-mean', '2', '--watch',
+                  '--watch-interval', '0.05', '--watch-idle', '0.1'], 0)):
+            exit_value = -1
+            try:
+                cl.main(arguments)
+            except SystemExit as e:
+                exit_value = e
+            self.assertEqual(int(str(exit_value)), code)
+
+        rows = list(d.get_iterator(sphere))
+        self.assertEqual(rows[0][2], "image mean 0")
+        self.assertTrue(all([r[2] is not None for r in rows[1:]]))
+        self.assertEqual(watch.get_watch_state(sphere)["rows"],
+                         len(rows) - 1)
+
+        # resume watching, with the same N, after rows are appended
+        with open(os.path.join(sphere, d.SPEC_D_CSV_FILENAME), "a") as f:
+            f.write("0,-162,-162/0.png\n0,-144,-144/0.png\n")
+        exit_value = -1
+        try:
+            cl.main(['-d', sphere, '--image-mean', '2', '--watch',
+                     '--watch-interval', '0.05', '--watch-idle', '0.1'])
+        except SystemExit as e:
+            exit_value = e
+        self.assertEqual(int(str(exit_value)), 0)
+        resumed = list(d.get_iterator(sphere))
+        self.assertEqual(len(resumed), len(rows) + 2)
+        self.assertEqual(resumed[-2][2:5], rows[2][2:5])
+        self.assertEqual(resumed[-1][2:5], rows[3][2:5])
+        self.assertFalse(any(["nan" in r[2:5] for r in resumed[1:]]))
+        self.assertEqual(watch.get_watch_state(sphere)["rows"],
+                         len(resumed) - 1)
+        self.assertTrue(d.check_database(sphere))
+        sh.rmtree(temp_path)
+
+    def test_profile(self):
+        from .. import cl
+        from .. import commands
+
+        if len(commands.missing_requirements(commands.GROUP_IMAGE)) > 0:
+            log.info("Unable to run test: image requirements missing.")
+            return
+
+        temp_path = temp.mkdtemp()
+        sphere = os.path.join(temp_path, "sphere.cdb")
+        sh.copytree(self.SPHERE_DATA, sphere)
+        output = os.path.join(temp_path, "profile.json")
+
+        exit_value = -1
+        try:
+            cl.main(['-d', sphere, '--image-mean', '2', '--profile-json',
+                     output])
+        except SystemExit as e:
+            exit_value = e
+        self.assertEqual(int(str(exit_value)), 0)
+        with open(output, "r") as f:
+            summary = json.load(f)
+        self.assertEqual(summary["rows"], 20)
+        self.assertGreater(summary["stages"]["decode"]["total"], 0)
+        self.assertEqual(next(d.get_iterator(sphere))[2], "image mean 0")
+        sh.rmtree(temp_path)
+
+    def test_trace(self):
+        from .. import cl
+        from .. import commands
+
+        if len(commands.missing_requirements(commands.GROUP_IMAGE)) > 0:
+            log.info("Unable to run test: image requirements missing.")
+            return
+
+        temp_path = temp.mkdtemp()
+        for n in ("a.cdb", "b.cdb"):
+            sh.copytree(self.SPHERE_DATA, os.path.join(temp_path, n))
+        output = os.path.join(temp_path, "trace.json")
+
+        for arguments, names in (
+                (['-d', os.path.join(temp_path, "a.cdb"), '--image-mean', '2',
+                  '--trace', output],
+                 {"parse", "decode", "compute", "write"}),
+                (['--batch', os.path.join(temp_path, "*.cdb"), '-t', '-q',
+                  '--jobs', '1', '--trace', output],
+                 {os.path.join(temp_path, "a.cdb"),
+                  os.path.join(temp_path, "b.cdb")})):
+            exit_value = -1
+            try:
+                cl.main(arguments)
+            except SystemExit as e:
+                exit_value = e
+            self.assertEqual(int(str(exit_value)), 0)
+            with open(output, "r") as f:
+                events = json.load(f)["traceEvents"]
+            self.assertEqual(set([e["name"] for e in events
+                                  if e["ph"] == "X"]), names)
+        sh.rmtree(temp_path)
+
+    def test_aggregate(self):
+        from .. import cl
+        import sys
+
+        temp_path = temp.mkdtemp()
+        sphere = os.path.join(temp_path, "sphere.cdb")
+        sh.copytree(self.SPHERE_DATA, sphere)
+        output = os.path.join(temp_path, "theta.csv")
+
+        # set arguments
+        old_argv = sys.argv
+        for arguments, code in (
+                (['-d', sphere, '--agg', 'phi:median'],
+                  cl.ERROR_CODES.AGGREGATION_FAILED),
+                (['-d', sphere, '--groupby', 'psi', '--agg', 'phi:max'],
+                  cl.ERROR_CODES.AGGREGATION_FAILED),
+                (['-a', sphere, '--agg', 'phi:max'],
+                  cl.ERROR_CODES.NO_INPUT_DATABASE_FOR_AGGREGATION),
+                (['-d', sphere, '--groupby', 'theta', '--agg', 
+                  'phi:min,phi:max', '-o', output], 0)):
+            sys.argv = [self.PYTHON_COMMAND] + arguments
+            exit_value = -1
+            # run command line
+            try:
+                cl.main()
+            except SystemExit as e:
+                exit_value = e
+            # assert we exited
+            self.assertEqual(int(str(exit_value)), code)
+        # swap back
+        sys.argv = old_argv
+
+        self.assertEqual(list(d.get_iterator(temp_path, "theta.csv")),
+                         [("theta", "phi min", "phi max"),
+                          ("0", "-180", "162")])
+        sh.rmtree(temp_path)
+
+    def test_column_stats(self):
+        from .. import cl
+        import sys
+
+        temp_path = temp.mkdtemp()
+        output = os.path.join(temp_path, "stats.json")
+
+        # set arguments
+        old_argv = sys.argv
+        for arguments, code in (
+                (['-a', self.SPHERE_DATA, '--column-stats'],
+                  cl.ERROR_CODES.NO_INPUT_DATABASE_FOR_COLUMN_STATS),
+                (['-d', temp_path, '--column-stats'],
+                  cl.ERROR_CODES.COLUMN_STATS_FAILED),
+                (['-d', self.SPHERE_DATA, '--column-stats', '-o', output], 
+                  0)):
+            sys.argv = [self.PYTHON_COMMAND] + arguments
+            exit_value = -1
+            # run command line
+            try:
+                cl.main()
+            except SystemExit as e:
+                exit_value = e
+            # assert we exited
+            self.assertEqual(int(str(exit_value)), code)
+        # swap back
+        sys.argv = old_argv
+
+        with open(output, "r") as f:
+            result = json.load(f)
+        self.assertEqual(result["rows"], 20)
+        self.assertEqual([c["name"] for c in result["columns"]],
+                         ["theta", "phi", "FILE"])
+        self.assertEqual(result["columns"][1]["min"], -180)
+        sh.rmtree(temp_path)
+
+    def test_batch(self):
+        from .. import cl
+
+        temp_path = temp.mkdtemp()
+        for name in ("a.cdb", "b.cdb", "c.cdb"):
+            sh.copytree(self.SPHERE_DATA, os.path.join(temp_path, name))
+        pattern = os.path.join(temp_path, "*.cdb")
+
+        for arguments, code in (
+                (['--batch', pattern, '-t', '-q', '--jobs', '2'], 0),
+                (['--batch', os.path.join(temp_path, "*.none"), '-t'],
+                  cl.ERROR_CODES.NO_DATABASES_FOR_BATCH),
+                (['--batch', pattern, '-t', '-d', self.SPHERE_DATA],
+                  cl.ERROR_CODES.INPUT_DATABASE_WITH_BATCH)):
+            exit_value = -1
+            try:
+                cl.main(arguments)
+            except SystemExit as e:
+                exit_value = e
+            self.assertEqual(int(str(exit_value)), code)
+
+        # one database fails validation
+        with open(os.path.join(temp_path, "b.cdb", d.SPEC_D_CSV_FILENAME),
+                  "w") as f:
+            f.write("x,FILE\n1\n")
+        results = cl.run_batch(sorted([os.path.join(temp_path, n)
+                                       for n in ("a.cdb", "b.cdb", "c.cdb")]),
+                               ['-t', '-q'], 2)
+        self.assertEqual([(os.path.basename(p), code) 
+                          for p, code, seconds in results],
+                         [("a.cdb", 0),
+                          ("b.cdb", cl.ERROR_CODES.SPEC_D_VALIDATION_FAILED),
+                          ("c.cdb", 0)])
+        exit_value = -1
+        try:
+            cl.main(['--batch', pattern, '-t', '-q', '--jobs', '1'])
+        except SystemExit as e:
+            exit_value = e
+        self.assertEqual(int(str(exit_value)), 
+                         cl.ERROR_CODES.SPEC_D_VALIDATION_FAILED)
+        sh.rmtree(temp_path)
+
+    def test_merge(self):
+        from .. import cl
+
+        temp_path = temp.mkdtemp()
+        shards = [os.path.join(temp_path, "a.cdb"),
+                  os.path.join(temp_path, "b.cdb")]
+        for shard in shards:
+            sh.copytree(self.SPHERE_DATA, shard)
+        output = os.path.join(temp_path, "merged.cdb")
+
+        for arguments, code in (
+                (['--merge', output], cl.ERROR_CODES.MERGE_FAILED),
+                (['--merge', output] + shards + ['--sort-by', 'psi'],
+                  cl.ERROR_CODES.MERGE_FAILED),
+                (['--merge', output] + shards + ['--sort-by', 'phi'], 0),
+                (['--merge', output] + shards, cl.ERROR_CODES.MERGE_FAILED)):
+            exit_value = -1
+            try:
+                cl.main(arguments)
+            except SystemExit as e:
+                exit_value = e
+            self.assertEqual(int(str(exit_value)), code)
+
+        rows = list(d.get_iterator(output))
+        self.assertEqual(len(rows), 41)
+        self.assertEqual(rows[1:3], [("0", "-180", "a.cdb/-180/0.png"),
+                                     ("0", "-180", "b.cdb/-180/0.png")])
+        sh.rmtree(temp_path)
+
+    def test_diff(self):
+        from .. import cl
+
+        temp_path = temp.mkdtemp()
+        other = os.path.join(temp_path, "other.cdb")
+        sh.copytree(self.SPHERE_DATA, other)
+        output = os.path.join(temp_path, "diff.json")
+
+        for arguments, code in (
+                (['--diff', self.SPHERE_DATA, other],
+                  cl.ERROR_CODES.DIFF_FAILED),
+                (['--diff', self.SPHERE_DATA, other, '--key', 'psi'],
+                  cl.ERROR_CODES.DIFF_FAILED),
+                (['--diff', self.SPHERE_DATA, other, '--key', 'theta,phi',
+                  '--compare-files', '-o', output], 0)):
+            exit_value = -1
+            try:
+                cl.main(arguments)
+            except SystemExit as e:
+                exit_value = e
+            self.assertEqual(int(str(exit_value)), code)
+        with open(output, "r") as f:
+            self.assertEqual(json.load(f)["unchanged"], 20)
+
+        with open(os.path.join(other, d.SPEC_D_CSV_FILENAME), "a") as f:
+            f.write("0,1000,0/0.png\n")
+        exit_value = -1
+        try:
+            cl.main(['--diff', self.SPHERE_DATA, other, '--key', 'theta,phi',
+                     '-o', output])
+        except SystemExit as e:
+            exit_value = e
+        self.assertEqual(int(str(exit_value)), 
+                         cl.ERROR_CODES.DATABASES_DIFFER)
+        with open(output, "r") as f:
+            self.assertEqual(json.load(f)["added"], [["0", "1000"]])
+        sh.rmtree(temp_path)
@@ -0,0 +1,146 @@
+"""
+Tracing of the stages of the image and computer vision commands over
+time, to see concurrency and stalls. A Trace is a Profile (see
+cinema_lib.profile) that also records a span for each stage, with the
+process and thread that ran it, in an in-memory ring buffer, so only the
+most recent spans are kept. It is written as a Chrome trace (the Trace
+Event Format JSON), which can be opened in chrome://tracing or Perfetto.
+
+    with profile.profiling(trace.Trace()) as t:
+        d.add_columns_by_row_functions(db_path, columns)
+    t.write("cinema.trace.json")
+"""
+
+from . import profile
+
+import collections
+import json
+import os
+import threading
+import time
+
+# the number of spans that are kept
+CAPACITY = 1 << 20
+
+# the id of the current thread, the native id of Python 3.8 or later
+get_thread_id = getattr(threading, "get_native_id", threading.get_ident)
+
+class Trace(profile.Profile):
+    """
+    A Profile that records the spans of the stages.
+
+    attributes:
+        start : number
+            the time.perf_counter when the Trace was created, the origin
+            of the events
+        spans : collections.deque
+            the most recent spans, as (name, start seconds, duration
+            seconds, process id, thread id) tuples, where the start is
+            time.perf_counter
+        recorded : integer
+            the number of spans that have been recorded, including the
+            spans that are no longer in the ring buffer
+        threads : dictionary
+            the names of the threads, by (process id, thread id)
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        """
+        Create a Trace.
+
+        arguments:
+            capacity : integer = CAPACITY
+                the maximum number of spans that are kept
+        """
+
+        super().__init__()
+        self.start = time.perf_counter()
+        self.spans = collections.deque(maxlen=capacity)
+        self.recorded = 0
+        self.threads = {}
+        self.__pid = os.getpid()
+        self.__local = threading.local()
+
+    def begin(self, stage):
+        if not hasattr(self.__local, "stack"):
+            self.__local.stack = []
+            self.__local.tid = get_thread_id()
+            self.threads[(self.__pid, self.__local.tid)] = \
+                threading.current_thread().name
+        self.__local.stack.append((stage, time.perf_counter()))
+        super().begin(stage)
+
+    def end(self):
+        super().end()
+        stage, start = self.__local.stack.pop()
+        self.span(stage, start, time.perf_counter() - start, self.__pid,
+                  self.__local.tid)
+
+    def span(self, name, start, duration, pid=None, tid=None):
+        """
+        Record a span.
+
+        arguments:
+            name : string
+                the name of the span, i.e., a stage
+            start : number
+                the start in seconds, as time.perf_counter
+            duration : number
+                the duration in seconds
+            pid : integer = None
+                the process id, or this process if None
+            tid : integer = None
+                the thread id, or the process id if None
+        """
+
+        if pid is None:
+            pid = self.__pid
+        self.spans.append((name, start, duration, pid,
+                           pid if tid is None else tid))
+        self.recorded += 1
+
+    def get_events(self):
+        """
+        Return the spans as a Chrome trace.
+
+        returns:
+            a dictionary of the Trace Event Format, with a complete ("X")
+            event per span, in microseconds since the Trace was created,
+            and metadata ("M") events naming the processes and threads
+        """
+
+        events = []
+        names = dict(self.threads)
+        for name, start, duration, pid, tid in list(self.spans):
+            events.append({"name": name, "cat": "cinema", "ph": "X",
+                           "ts": (start - self.start) * 1e6,
+                           "dur": duration * 1e6, "pid": pid, "tid": tid})
+            if (pid, tid) not in names:
+                names[(pid, tid)] = "process {0}".format(pid) \
+                                    if pid == tid else "thread {0}".format(tid)
+        for pid in sorted(set([pid for pid, tid in names])):
+            events.append({"name": "process_name", "ph": "M", "pid": pid,
+                           "tid": pid, "args": {"name": "cinema {0}".format(
+                           pid)}})
+        for (pid, tid), name in sorted(names.items()):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid,
+                           "tid": tid, "args": {"name": name}})
+        return {"traceEvents": events,
+                "displayTimeUnit": "ms",
+                "otherData": {"recorded": self.recorded,
+                              "dropped": self.recorded - len(self.spans)}}
+
+    def write(self, path):
+        """
+        Write the spans as a Chrome trace JSON file (see get_events).
+
+        arguments:
+            path : string
+                the path of the file
+
+        side effects:
+            writes path
+        """
+
+        with open(path, "w") as f:
+            json.dump(self.get_events(), f)